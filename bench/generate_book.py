@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Generates a synthetic GnuCash sqlite book for benchmarks. The schema is taken
+from test/Inputs/minimal.sql. The output only depends on the options and the
+seed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+SCHEMA = Path(__file__).resolve().parent.parent / "test" / "Inputs" / "minimal.sql"
+
+DATE_FORMATS = {
+    "gc2": "%Y%m%d%H%M%S",
+    "gc3": "%Y-%m-%d %H:%M:%S",
+}
+
+# Rows per executemany() call.
+_CHUNK = 50000
+# Denominators of share quantities and prices.
+_SHARE_DENOM = 10000
+_PRICE_DENOM = 10000
+
+
+@dataclass(slots=True)
+class BookSpec:
+    accounts: int = 50
+    depth: int = 2
+    transactions: int = 5000
+    splits_per_transaction: int = 2
+    securities: int = 10
+    prices: int = 250
+    years: int = 10
+    # Fraction of transactions that buy or sell securities.
+    trade_ratio: float = 0.1
+    seed: int = 1
+    date_format: str = "gc2"
+
+
+@dataclass(slots=True)
+class _Security:
+    commodity: str
+    account: str
+    # Price in 1/_PRICE_DENOM of the currency, random walk over time.
+    price: int
+    shares: int = 0
+
+
+@dataclass(slots=True)
+class _Generator:
+    rng: random.Random
+    accounts: list[tuple[Any, ...]] = field(default_factory=list)
+
+    def guid(self) -> str:
+        return f"{self.rng.getrandbits(128):032x}"
+
+    def add_account(
+        self, name: str, type: str, parent: str, commodity: str, scu: int = 100
+    ) -> str:
+        guid = self.guid()
+        self.accounts.append(
+            (guid, name, type, commodity, scu, 0, parent, "", "", 0, 0)
+        )
+        return guid
+
+    def add_tree(
+        self, parent: str, prefix: str, type: str, leaves: int, levels: int, cur: str
+    ) -> list[str]:
+        """Add `leaves` accounts `levels` levels below `parent`."""
+        if levels <= 1:
+            return [
+                self.add_account(f"{prefix}{i}", type, parent, cur)
+                for i in range(leaves)
+            ]
+        fanout = max(2, math.ceil(leaves ** (1 / levels)))
+        groups = min(fanout, leaves)
+        result = []
+        for g in range(groups):
+            count = leaves // groups + (g < leaves % groups)
+            child = self.add_account(f"{prefix}{g}", type, parent, cur)
+            result += self.add_tree(
+                child, f"{prefix}{g}.", type, count, levels - 1, cur
+            )
+        return result
+
+
+def _chunks(rows: Iterator[tuple[Any, ...]]) -> Iterator[list[tuple[Any, ...]]]:
+    chunk: list[tuple[Any, ...]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= _CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(filename: str, spec: BookSpec) -> None:
+    if os.path.exists(filename):
+        os.remove(filename)
+    # Reproducible test data, not security sensitive.
+    rng = random.Random(spec.seed)  # noqa: S311
+    gen = _Generator(rng)
+    date_format = DATE_FORMATS[spec.date_format]
+    end = datetime(2024, 12, 31, 10, 59, tzinfo=UTC)
+    start = end - timedelta(days=365 * spec.years)
+    span = int((end - start).total_seconds())
+
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(SCHEMA.read_text(encoding="utf-8"))
+    c = connection.cursor()
+    c.execute("SELECT root_account_guid FROM books")
+    (root,) = c.fetchone()
+
+    currency = gen.guid()
+    commodities = [
+        (currency, "CURRENCY", "USD", "US Dollar", "840", 100, 0, "currency", "")
+    ]
+
+    # Account tree: the leaves of the bank, income and expense trees take
+    # part in regular transactions.
+    leaves = max(spec.accounts, 3)
+    assets = gen.add_account("Assets", "ASSET", root, currency)
+    income = gen.add_account("Income", "INCOME", root, currency)
+    expenses = gen.add_account("Expenses", "EXPENSE", root, currency)
+    levels = max(spec.depth - 1, 1)
+    banks = gen.add_tree(
+        assets, "Bank ", "BANK", max(leaves // 10, 1), levels, currency
+    )
+    incomes = gen.add_tree(
+        income, "Income ", "INCOME", max(leaves // 5, 1), levels, currency
+    )
+    spendings = gen.add_tree(
+        expenses,
+        "Expense ",
+        "EXPENSE",
+        max(leaves - len(banks) - len(incomes), 1),
+        levels,
+        currency,
+    )
+    commissions = gen.add_account("Commissions", "EXPENSE", expenses, currency)
+
+    securities: list[_Security] = []
+    if spec.securities > 0:
+        brokerage = gen.add_account("Brokerage", "ASSET", assets, currency)
+        for i in range(spec.securities):
+            commodity = gen.guid()
+            mnemonic = f"SEC{i:04d}"
+            commodities.append(
+                (
+                    commodity,
+                    "NASDAQ",
+                    mnemonic,
+                    f"Security {i}",
+                    "",
+                    _SHARE_DENOM,
+                    0,
+                    "",
+                    "",
+                )
+            )
+            account = gen.add_account(
+                mnemonic, "STOCK", brokerage, commodity, _SHARE_DENOM
+            )
+            price = rng.randint(10, 500) * _PRICE_DENOM
+            securities.append(_Security(commodity, account, price))
+
+    c.executemany(
+        "INSERT INTO commodities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", commodities
+    )
+    c.executemany(
+        "INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        gen.accounts,
+    )
+
+    def walk(security: _Security) -> int:
+        step = 1 + rng.uniform(-0.02, 0.02)
+        security.price = max(int(security.price * step), _PRICE_DENOM // 100)
+        return security.price
+
+    def price_rows() -> Iterator[tuple[Any, ...]]:
+        for security in securities:
+            walker = _Security(security.commodity, security.account, security.price)
+            for i in range(spec.prices):
+                date = start + timedelta(seconds=span * i // max(spec.prices, 1))
+                yield (
+                    gen.guid(),
+                    security.commodity,
+                    currency,
+                    date.strftime(date_format),
+                    "user:price",
+                    "last",
+                    walk(walker),
+                    _PRICE_DENOM,
+                )
+
+    for chunk in _chunks(price_rows()):
+        c.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", chunk)
+
+    splits: list[tuple[Any, ...]] = []
+
+    def split(tx: str, account: str, value: int, quantity: int, denom: int) -> None:
+        splits.append(
+            (
+                gen.guid(),
+                tx,
+                account,
+                "",
+                "",
+                "n",
+                None,
+                value,
+                100,
+                quantity,
+                denom,
+                None,
+            )
+        )
+
+    def trade(tx: str) -> str:
+        security = rng.choice(securities)
+        bank = rng.choice(banks)
+        price = walk(security)
+        if security.shares > 0 and rng.random() < 0.4:
+            shares = rng.randint(1, security.shares // _SHARE_DENOM or 1)
+            shares = min(shares * _SHARE_DENOM, security.shares)
+            value = shares * price // (_SHARE_DENOM * _PRICE_DENOM // 100)
+            split(tx, security.account, -value, -shares, _SHARE_DENOM)
+            split(tx, bank, value, value, 100)
+            security.shares -= shares
+            return "Sell"
+        shares = rng.randint(1, 100) * _SHARE_DENOM
+        value = max(shares * price // (_SHARE_DENOM * _PRICE_DENOM // 100), 1)
+        fee = rng.randint(100, 1000)
+        split(tx, security.account, value, shares, _SHARE_DENOM)
+        split(tx, commissions, fee, fee, 100)
+        split(tx, bank, -value - fee, -value - fee, 100)
+        security.shares += shares
+        return "Buy"
+
+    def transfer(tx: str) -> str:
+        bank = rng.choice(banks)
+        total = 0
+        is_income = rng.random() < 0.3
+        for _ in range(max(spec.splits_per_transaction - 1, 1)):
+            amount = rng.randint(1, 100000)
+            if is_income:
+                split(tx, rng.choice(incomes), -amount, -amount, 100)
+                total -= amount
+            else:
+                split(tx, rng.choice(spendings), amount, amount, 100)
+                total += amount
+        split(tx, bank, -total, -total, 100)
+        return "Salary" if is_income else "Expense"
+
+    offsets = sorted(rng.randrange(span) for _ in range(spec.transactions))
+    entered = end.strftime(date_format)
+    transactions: list[tuple[Any, ...]] = []
+    for i, offset in enumerate(offsets):
+        tx = gen.guid()
+        if securities and rng.random() < spec.trade_ratio:
+            description = trade(tx)
+        else:
+            description = transfer(tx)
+        date = (start + timedelta(seconds=offset)).strftime(date_format)
+        transactions.append((tx, currency, str(i), date, entered, description))
+        if len(splits) >= _CHUNK:
+            c.executemany(
+                "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", transactions
+            )
+            c.executemany(
+                "INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                splits,
+            )
+            transactions.clear()
+            splits.clear()
+    c.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", transactions)
+    c.executemany(
+        "INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", splits
+    )
+    connection.commit()
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output")
+    defaults = BookSpec()
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        default=defaults.accounts,
+        help="number of bank/income/expense leaf accounts",
+    )
+    parser.add_argument(
+        "--depth", type=int, default=defaults.depth, help="account tree depth"
+    )
+    parser.add_argument("--transactions", type=int, default=defaults.transactions)
+    parser.add_argument(
+        "--splits-per-transaction",
+        type=int,
+        default=defaults.splits_per_transaction,
+        help="splits of regular (non-trade) transactions",
+    )
+    parser.add_argument("--securities", type=int, default=defaults.securities)
+    parser.add_argument(
+        "--prices",
+        type=int,
+        default=defaults.prices,
+        help="length of the price history per security",
+    )
+    parser.add_argument("--years", type=int, default=defaults.years)
+    parser.add_argument("--trade-ratio", type=float, default=defaults.trade_ratio)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--date-format", choices=sorted(DATE_FORMATS), default=defaults.date_format
+    )
+    args = parser.parse_args()
+    if args.splits_per_transaction < 2:
+        sys.stderr.write("Error: need at least 2 splits per transaction\n")
+        sys.exit(1)
+
+    generate(
+        args.output,
+        BookSpec(
+            accounts=args.accounts,
+            depth=args.depth,
+            transactions=args.transactions,
+            splits_per_transaction=args.splits_per_transaction,
+            securities=args.securities,
+            prices=args.prices,
+            years=args.years,
+            trade_ratio=args.trade_ratio,
+            seed=args.seed,
+            date_format=args.date_format,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
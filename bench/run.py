@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmarks loading, ledger export and the stock report on generated books.
+Each phase runs in its own process so its wall time and peak RSS can be
+measured in isolation. Results are printed and appended to bench_output.txt.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from generate_book import BookSpec, generate
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The load, export and report phases bypass the snapshot cache, "snapshot"
+# measures a load from an up to date snapshot (the "cache" phase before it
+# builds one from scratch).
+_LOAD = "import sys, gnucash; gnucash.read_file(sys.argv[1], snapshot=False)"
+_LOAD_COMPACT = (
+    "import sys, gnucash; gnucash.read_file(sys.argv[1], "
+    "projection=gnucash.Projection(compact=True), snapshot=False)"
+)
+_LOAD_PARALLEL = (
+    "import sys, gnucash; gnucash.read_file(sys.argv[1], parallel=True, snapshot=False)"
+)
+_LOAD_SNAPSHOT = "import sys, gnucash; gnucash.read_file(sys.argv[1], snapshot=True)"
+
+PHASES = {
+    "load": ["-c", _LOAD],
+    "compact": ["-c", _LOAD_COMPACT],
+    "parallel": ["-c", _LOAD_PARALLEL],
+    "cache": ["-c", _LOAD_SNAPSHOT],
+    "snapshot": ["-c", _LOAD_SNAPSHOT],
+    "export": [str(ROOT / "gnucash2ledger.py")],
+    "report": [str(ROOT / "stockreport.py")],
+}
+
+_SUFFIXES = {"k": 1000, "m": 1000000}
+
+
+@dataclass(slots=True, frozen=True)
+class Result:
+    splits: int
+    phase: str
+    wall: float
+    # Peak resident set size in KiB.
+    max_rss: int
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.splits / self.wall if self.wall > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.splits:>10} {self.phase:<8} {self.wall:9.3f}s "
+            f"{self.max_rss / 1024:9.1f}MiB {self.rows_per_second:12.0f} splits/s"
+        )
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text and text[-1] in _SUFFIXES:
+        return int(text[:-1]) * _SUFFIXES[text[-1]]
+    return int(text)
+
+
+def book_spec(splits: int, seed: int) -> BookSpec:
+    """Return a book with about `splits` splits. Regular transactions have 3
+    splits, trades 2 or 3."""
+    spec = BookSpec(seed=seed, splits_per_transaction=3)
+    spec.transactions = max(splits // spec.splits_per_transaction, 1)
+    spec.accounts = max(50, min(splits // 200, 5000))
+    spec.depth = 3
+    spec.securities = max(10, min(splits // 10000, 500))
+    return spec
+
+
+def ensure_book(data_dir: Path, splits: int, seed: int) -> Path:
+    path = data_dir / f"book-{splits}-s{seed}.gnucash"
+    if not path.exists():
+        data_dir.mkdir(parents=True, exist_ok=True)
+        sys.stdout.write(f"Generating {path}...\n")
+        sys.stdout.flush()
+        tmp = path.with_suffix(".tmp")
+        generate(str(tmp), book_spec(splits, seed))
+        tmp.rename(path)
+    return path
+
+
+def count_splits(book: Path) -> int:
+    with sqlite3.connect(f"file:{book}?mode=ro", uri=True) as connection:
+        (count,) = connection.execute("SELECT COUNT(*) FROM splits").fetchone()
+    return int(count)
+
+
+def run_phase(phase: str, book: Path, splits: int) -> Result:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    if phase == "cache":
+        Path(f"{book}.snapshot").unlink(missing_ok=True)
+    begin = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, *PHASES[phase], str(book)],
+        stdout=subprocess.DEVNULL,
+        env=env,
+    )
+    # wait4() reports the resource usage of this child alone.
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - begin
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        sys.stderr.write(f"Error: {phase} failed with code {process.returncode}\n")
+        sys.exit(1)
+    return Result(splits, phase, wall, rusage.ru_maxrss)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        default="10k,1m,10m",
+        help="comma separated split counts, k/m suffixes allowed",
+    )
+    parser.add_argument(
+        "--phases", default=",".join(PHASES), help="comma separated phases"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", type=Path, default=ROOT / "bench_data")
+    parser.add_argument("--output", type=Path, default=ROOT / "bench_output.txt")
+    args = parser.parse_args()
+
+    phases = args.phases.split(",")
+    for phase in phases:
+        if phase not in PHASES:
+            parser.error(f"unknown phase '{phase}'")
+
+    now = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S")
+    header = f"# {now} python {platform.python_version()} {platform.machine()}\n"
+    sys.stdout.write(header)
+    with args.output.open("a", encoding="utf-8") as out:
+        out.write(header)
+        for size in args.sizes.split(","):
+            book = ensure_book(args.data_dir, parse_size(size), args.seed)
+            splits = count_splits(book)
+            for phase in phases:
+                line = f"{run_phase(phase, book, splits)}\n"
+                sys.stdout.write(line)
+                sys.stdout.flush()
+                out.write(line)
+                out.flush()
+
+
+if __name__ == "__main__":
+    main()
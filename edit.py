@@ -1,76 +1,182 @@
 #!/usr/bin/env python
 """
-Tool to change gnucash files. Currently this can move all transactions
-involving 1 account to another account.
+Tool to change gnucash files. Currently this can move the splits of one
+account, or a subset of them, to another account and undo such moves.
 """
 
 from __future__ import annotations
 
+import argparse
 import codecs
 import sys
+from datetime import UTC, datetime
+from decimal import Decimal, InvalidOperation
+from sqlite3 import Connection
 from sys import exit, stderr
 
 import gnucash
-from gnucashutil import full_acc_name
 
 
-def main() -> None:
-    out = codecs.getwriter("UTF-8")(sys.stdout)
-    if len(sys.argv) < 3:
-        stderr.write(f"Invocation: {sys.argv[0]} gnucash_filename COMMAND\n")
-        stderr.write("  Commands:\n")
-        stderr.write("     accountlist         List account names+numbers\n")
+def _date(text: str) -> datetime:
+    when = datetime.fromisoformat(text)
+    return when if when.tzinfo is not None else when.replace(tzinfo=UTC)
+
+
+def _amount(text: str) -> Decimal:
+    # Decimal, not float: bounds like 1.1 must match split values exactly.
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(text) from None
+    if not amount.is_finite():
+        raise ValueError(text)
+    return amount
+
+
+def accountlist(conn: Connection, _args: argparse.Namespace) -> None:
+    out = codecs.getwriter("UTF-8")(sys.stdout.buffer)
+    data = gnucash.read_accounts(conn)
+    for account in data.accounts.values():
+        if account.type is None or account.type == "ROOT":
+            continue
+        if str(account.commodity) == "template":
+            continue
+        guid = gnucash.guid_hex(account.guid)
+        out.write(f"{guid} - {gnucash.account_path(data, account, 3)}\n")
+
+
+def switchacc(conn: Connection, args: argparse.Namespace) -> None:
+    # Only the account tree is loaded; the splits are selected in SQL.
+    data = gnucash.read_accounts(conn)
+    fromaccount = gnucash.lookup_account(data, args.old)
+    if fromaccount is None:
+        stderr.write(f"There is no account '{args.old}'\n")
+        exit(1)
+    toaccount = gnucash.lookup_account(data, args.new)
+    if toaccount is None:
+        stderr.write(f"There is no account '{args.new}'\n")
+        exit(1)
+    if fromaccount.commodity is not toaccount.commodity and not args.force:
         stderr.write(
-            "     switchacc old new   "
-            "Move all transactions from <old> to <new> account (specified as GUID)"
+            "Account commodities don't match up, this would go wrong "
+            "(use --force to move anyway)\n"
         )
         exit(1)
-
-    conn = gnucash.open_file(sys.argv[1], writable=True)
-    data = gnucash.read_data(conn)
-
-    command = sys.argv[2]
-
-    if command == "accountlist":
-        for account in data.accounts.values():
-            if account.type is None or account.type == "ROOT":
-                continue
-            if str(account.commodity) == "template":
-                continue
-            out.write(f"{account.guid} - {full_acc_name(account, 3)}\n")
-    elif command == "switchacc":
-        # TODO: Introduce some syntax to only select a subset of transactions
-        # (or splits)
-
-        # In a list of transactions switch account #1 to account #2
-        fromguid = sys.argv[3]
-        toguid = sys.argv[4]
-        fromaccount = data.accounts.get(fromguid)
-        toaccount = data.accounts.get(toguid)
-        if fromaccount is None:
-            stderr.write(f"There is no account '{fromguid}'")
+    counterpart = None
+    if args.counterpart is not None:
+        account = gnucash.lookup_account(data, args.counterpart)
+        if account is None:
+            stderr.write(f"There is no account '{args.counterpart}'\n")
             exit(1)
-        if toaccount is None:
-            stderr.write(f"There is no account '{toguid}'")
+        counterpart = account.guid
+    predicate = gnucash.SplitFilter(
+        start_date=args.start,
+        end_date=args.end,
+        description=args.description,
+        memo=args.memo,
+        min_value=args.min_amount,
+        max_value=args.max_amount,
+        counterpart_guid=counterpart,
+    )
+
+    if args.dry_run:
+        count, total = gnucash.count_splits(conn, fromaccount.guid, predicate)
+        stderr.write(f"Would move {count} splits with a total value of {total:.2f}\n")
+        return
+    description = (
+        f"{gnucash.account_path(data, fromaccount)} -> "
+        f"{gnucash.account_path(data, toaccount)}"
+    )
+    with gnucash.batch(conn):
+        entry = gnucash.start_journal(conn, description)
+        moved = gnucash.move_splits(
+            conn, fromaccount.guid, toaccount.guid, predicate, journal=entry
+        )
+        if moved == 0:
+            gnucash.undo_journal(conn, entry)
+    if moved == 0:
+        stderr.write("No splits selected\n")
+        return
+    stderr.write(f"Moved {moved} splits (journal entry {entry})\n")
+
+
+def journal(conn: Connection, _args: argparse.Namespace) -> None:
+    for entry in gnucash.journal_entries(conn):
+        sys.stdout.write(
+            f"{entry.id} {entry.date:%Y-%m-%d %H:%M:%S} {entry.splits} splits "
+            f"{entry.description}\n"
+        )
+
+
+def undo(conn: Connection, args: argparse.Namespace) -> None:
+    entries = gnucash.journal_entries(conn)
+    if args.entry is None:
+        if not entries:
+            stderr.write("The journal is empty\n")
             exit(1)
-        if fromaccount.commodity != toaccount.commodity:
-            # TODO: maybe introduce an override switch, we could still do this if
-            # the user really really wants it...
-            stderr.write("Account commodities don't match up, this would go wrong")
+        entry = entries[-1].id
+    else:
+        entry = args.entry
+        if all(e.id != entry for e in entries):
+            stderr.write(f"There is no journal entry {entry}\n")
             exit(1)
+    with gnucash.batch(conn):
+        moved = gnucash.undo_journal(conn, entry)
+    stderr.write(f"Moved {moved} splits back (journal entry {entry})\n")
 
-        for transaction in data.transactions.values():
-            for split in transaction.splits:
-                if split.account == fromaccount:
-                    stderr.write(
-                        f"Found split {split.guid} in transaction "
-                        f"'{transaction.description}'\n"
-                    )
-                    gnucash.change_split_account(
-                        conn, split.guid, fromaccount.guid, toaccount.guid
-                    )
-    else:
-        stderr.write(f"Unknown command {command}\n")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("gnucash_file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("accountlist", help="list account names and GUIDs")
+
+    switch = commands.add_parser(
+        "switchacc",
+        help="move splits from account OLD to account NEW",
+        description="Move the splits of account OLD selected by the options "
+        "to account NEW. Accounts are given by GUID or full path. The moves "
+        "are recorded in a journal and can be reverted with 'undo'.",
+    )
+    switch.add_argument("old")
+    switch.add_argument("new")
+    switch.add_argument("--start", type=_date, help="post date on or after")
+    switch.add_argument("--end", type=_date, help="post date before")
+    switch.add_argument(
+        "--description", metavar="REGEX", help="transaction description matches"
+    )
+    switch.add_argument("--memo", metavar="REGEX", help="split memo matches")
+    switch.add_argument("--min-amount", type=_amount, help="split value at least")
+    switch.add_argument("--max-amount", type=_amount, help="split value at most")
+    switch.add_argument(
+        "--counterpart",
+        metavar="ACCOUNT",
+        help="the transaction has a split in this account",
+    )
+    switch.add_argument(
+        "--dry-run", action="store_true", help="only report what would be moved"
+    )
+    switch.add_argument(
+        "--force", action="store_true", help="move even if the commodities differ"
+    )
+
+    commands.add_parser("journal", help="list the moves that can be undone")
+    undo_parser = commands.add_parser("undo", help="revert a journal entry")
+    undo_parser.add_argument(
+        "entry", type=int, nargs="?", help="journal entry (default: the latest)"
+    )
+    args = parser.parse_args()
+
+    run = {
+        "accountlist": accountlist,
+        "switchacc": switchacc,
+        "journal": journal,
+        "undo": undo,
+    }[args.command]
+    with gnucash.open_file(
+        args.gnucash_file, writable=args.command != "accountlist"
+    ) as conn:
+        run(conn, args)
 
 
 if __name__ == "__main__":
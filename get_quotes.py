@@ -6,16 +6,21 @@ file in the current directory.
 
 from __future__ import annotations
 
+import argparse
 import json
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import UTC, date, datetime
+from datetime import UTC, datetime
 
 import requests
+import requests.adapters
 
 import gnucash
-from gnucash import Commodity, GnuCashData, Price
+from gnucash import Commodity, GnuCashData, NewPrice
+from gnucash.prices import build_price_index
 
 
 @dataclass(slots=True, frozen=True)
@@ -27,61 +32,137 @@ class Data:
     time: datetime
 
 
-def get_data_polygon(symbols: list[str]) -> dict[str, Data]:
-    with open("polygon_key.txt", encoding="utf-8") as fp:
-        auth_key = fp.read().strip()
-    assert len(auth_key) == 32
+POLYGON_URL = "https://api.polygon.io"
 
-    session = requests.Session()
-    session.headers = {"Authorization": f"Bearer {auth_key}"}
-    result: dict[str, Data] = {}
-    base_url = "https://api.polygon.io"
-    for symbol in symbols:
-        url = f"{base_url}/v2/aggs/ticker/{symbol}/prev"
-        response = session.get(url)
-        if (
-            not response.ok
-            and "exceeded the maximum requests per minute" in response.text
-        ):
-            print("Throttling for request limits")
-            time.sleep(60)
-            response = session.get(url)
+
+class QuoteError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Thread-safe rate limiter handing out `rate` tokens per `period`
+    seconds, with bursts of up to `rate` tokens."""
+
+    def __init__(self, rate: float, period: float = 60.0) -> None:
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last) * self.fill_rate
+                )
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+class QuoteFetcher:
+    """Fetches previous-day quotes from polygon.io on a thread pool sharing
+    one pooled session. Requests are throttled to `requests_per_minute` and
+    throttled or failed requests are retried with exponential backoff."""
+
+    def __init__(
+        self,
+        auth_key: str,
+        base_url: str = POLYGON_URL,
+        requests_per_minute: float = 5,
+        jobs: int = 4,
+        max_retries: int = 5,
+        backoff: float = 15.0,
+    ) -> None:
+        self.base_url = base_url
+        self.jobs = jobs
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(requests_per_minute)
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {auth_key}"
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=jobs)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _get(self, url: str) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.get(url, timeout=30)
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                continue
+            throttled = (
+                response.status_code == 429
+                or "exceeded the maximum requests per minute" in response.text
+            )
+            if response.ok or attempt == self.max_retries:
+                return response
+            if not throttled and response.status_code < 500:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = self.backoff * 2**attempt
+            sys.stdout.write(f"Throttling for request limits ({delay:.0f}s)\n")
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def fetch(self, symbol: str) -> Data:
+        response = self._get(f"{self.base_url}/v2/aggs/ticker/{symbol}/prev")
         if not response.ok:
-            print(f"Request failed for {symbol}")
-            print(response.text)
-            sys.exit(1)
+            raise QuoteError(f"Request failed for {symbol}\n{response.text}")
         data = json.loads(response.text)
         assert data["status"] == "OK"
         assert data["ticker"] == symbol
         if "results" not in data:
-            print(f"No results for {symbol}")
-            sys.exit(1)
+            raise QuoteError(f"No results for {symbol}")
         prices = data["results"][0]
-        datum = Data(
+        return Data(
             close=prices["c"],
             high=prices["h"],
             low=prices["l"],
             open=prices["o"],
             time=datetime.fromtimestamp(prices["t"] / 1000, tz=UTC),
         )
-        result[symbol] = datum
 
-    return result
+    def fetch_all(
+        self, symbols: list[str]
+    ) -> tuple[dict[str, Data], dict[str, Exception]]:
+        """Fetch the quotes of `symbols`. Returns the quotes and the errors
+        by symbol; a symbol that fails does not stop the others."""
+        quotes: dict[str, Data] = {}
+        errors: dict[str, Exception] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {
+                executor.submit(self.fetch, symbol): symbol for symbol in symbols
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    quotes[symbol] = future.result()
+                except Exception as e:
+                    errors[symbol] = e
+        return quotes, errors
 
 
-def get_price_on_day(prices: list[Price], day: date) -> Price | None:
-    for p in prices:
-        if p.date.date() == day:
-            return p
-    return None
-
-
-def get_latest_date(prices: list[Price]) -> date | None:
-    latest: date | None = None
-    for p in prices:
-        if latest is None or p.date.date() > latest:
-            latest = p.date.date()
-    return latest
+def read_auth_key(filename: str = "polygon_key.txt") -> str:
+    with open(filename, encoding="utf-8") as fp:
+        auth_key = fp.read().strip()
+    assert len(auth_key) == 32
+    return auth_key
 
 
 def get_currency(gnucashdata: GnuCashData, mnemonic: str) -> Commodity | None:
@@ -92,12 +173,29 @@ def get_currency(gnucashdata: GnuCashData, mnemonic: str) -> Commodity | None:
 
 
 def main() -> None:
-    if len(sys.argv) == 1:
-        sys.stderr.write(f"Invocation: {sys.argv[0]} gnucash_filename\n")
-        sys.exit(1)
-    dbfile = sys.argv[1]
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("gnucash_file")
+    parser.add_argument("--key-file", default="polygon_key.txt")
+    parser.add_argument("--base-url", default=POLYGON_URL)
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="concurrent requests")
+    parser.add_argument(
+        "--rate", type=float, default=5, help="maximum requests per minute"
+    )
+    parser.add_argument(
+        "--backoff", type=float, default=15.0, help="initial retry delay (seconds)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each load phase to stderr",
+    )
+    args = parser.parse_args()
+    dbfile = args.gnucash_file
     gcconn = gnucash.open_file(dbfile, writable=True)
-    gcdata = gnucash.read_data(gcconn)
+    stats = gnucash.LoadStats() if args.profile else None
+    gcdata = gnucash.read_data(gcconn, stats=stats)
+    if stats is not None:
+        sys.stderr.write(str(stats))
 
     # Gather list of symbols that we want to fetch from yahoo.
     commodities = gcdata.commodities.values()
@@ -118,40 +216,73 @@ def main() -> None:
         print("No commodities with quote_source == 'yahoo' found")
         sys.exit(0)
 
+    prices = build_price_index(gcdata)
+
+    fetch_symbols = []
     for symbol in symbols:
         commodity = comms[symbol]
-        latest = get_latest_date(commodity.prices)
-        if latest is not None:
-            delta = datetime.now(tz=UTC).date() - latest
+        latest_price = prices.latest(commodity, currency_usd)
+        if latest_price is not None:
+            delta = datetime.now(tz=UTC).date() - latest_price.date.date()
             if delta.days <= 3:
                 print(f"Data for {symbol} is new")
                 continue
-
         print(f"Getting quotes for: {symbol}")
-        sym_data = get_data_polygon([symbol])[symbol]
+        fetch_symbols.append(symbol)
+
+    if not fetch_symbols:
+        # Nothing to fetch, so the key file is not needed.
+        print("All quotes are up to date")
+        return
+
+    fetcher = QuoteFetcher(
+        read_auth_key(args.key_file),
+        base_url=args.base_url,
+        requests_per_minute=args.rate,
+        jobs=args.jobs,
+        backoff=args.backoff,
+    )
+    try:
+        quotes, errors = fetcher.fetch_all(fetch_symbols)
+    finally:
+        fetcher.close()
+
+    new_prices = []
+    for symbol in fetch_symbols:
+        if symbol not in quotes:
+            continue
+        commodity = comms[symbol]
+        sym_data = quotes[symbol]
         price = sym_data.close
         time = sym_data.time
         day = sym_data.time.date()
 
-        prev_data = get_price_on_day(commodity.prices, day)
+        prev_data = prices.on_day(commodity, currency_usd, day)
         if prev_data is not None:
             print(f"{symbol}: Skipping (already have data for {day})")
         else:
             print(f"{symbol}: {price} on {day}")
-            value_num = int(price * 10000)
-            value_denom = 10000
-            source = "Finance::Quote"  # Only some known strings accepted here
-            gnucash.add_price(
-                gcconn,
-                commodity.guid,
-                currency_usd.guid,
-                time,
-                source=source,
-                type="last",
-                value_num=value_num,
-                value_denom=value_denom,
+            new_prices.append(
+                NewPrice(
+                    commodity_guid=commodity.guid,
+                    currency_guid=currency_usd.guid,
+                    date=time,
+                    source="Finance::Quote",  # Only some known strings accepted here
+                    type="last",
+                    value_num=int(price * 10000),
+                    value_denom=10000,
+                )
             )
 
+    with gnucash.batch(gcconn):
+        gnucash.add_prices(gcconn, new_prices)
+
+    if errors:
+        for symbol in fetch_symbols:
+            if symbol in errors:
+                print(f"{symbol}: Failed: {errors[symbol]}")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
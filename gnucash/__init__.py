@@ -1,14 +1,25 @@
 from __future__ import annotations
 
 import math
+import queue
+import re
 import sqlite3
+import threading
+import time
 import uuid
+from collections.abc import Callable, Collection, Iterable, Iterator
+from contextlib import closing, contextmanager
 from dataclasses import dataclass, field
 from datetime import UTC, datetime
-from sqlite3 import Connection
-from typing import TypeAlias, TypeVar
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+from sqlite3 import Connection, Cursor
+from typing import Any, Literal, TypeAlias, TypeVar
 
-GUID: TypeAlias = str
+# Hex string as stored by GnuCash, or its 16 raw bytes in books loaded with
+# Projection(compact=True). See guid_hex().
+GUID: TypeAlias = str | bytes
 
 _INVALID_DATETIME = datetime.max.replace(tzinfo=UTC)
 
@@ -17,19 +28,25 @@ _GuidObjT = TypeVar(
 )
 
 
+@lru_cache(maxsize=65536)
+def _from_epoch(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, UTC)
+
+
 def _guid_hash(self: _GuidObjT) -> int:
     return hash(self.guid)
 
 
 def _guid_eq(self: _GuidObjT, other: object) -> bool:
     other_guid = getattr(other, "guid", None)
-    assert isinstance(other_guid, str)
+    # GUIDs are bytes in books loaded with Projection(compact=True).
+    assert isinstance(other_guid, str | bytes)
     return self.guid == other_guid
 
 
 @dataclass(slots=True)
 class Account:
-    guid: str
+    guid: GUID
     name: str = ""
     parent: Account | None = None
     childs: list[Account] = field(default_factory=list)
@@ -53,7 +70,7 @@ class Account:
 
 @dataclass(slots=True)
 class Commodity:
-    guid: str
+    guid: GUID
     fullname: str = ""
     mnemonic: str = ""
     namespace: str = ""
@@ -69,28 +86,66 @@ class Commodity:
     __eq__ = _guid_eq
 
 
-@dataclass(slots=True)
+# The __init__ keeps post_date as the name of the argument for the
+# _post_date field behind the post_date property.
+@dataclass(slots=True, init=False)
 class Transaction:
-    guid: str
+    guid: GUID
     _currency: Commodity | None = None
     num: str = ""
-    post_date: datetime = _INVALID_DATETIME
+    # datetime or seconds since epoch (see Projection.lazy_dates)
+    _post_date: datetime | int = _INVALID_DATETIME
     description: str = ""
     splits: list[Split] = field(default_factory=list)
 
+    def __init__(
+        self,
+        guid: GUID,
+        _currency: Commodity | None = None,
+        num: str = "",
+        post_date: datetime | int = _INVALID_DATETIME,
+        description: str = "",
+        splits: list[Split] | None = None,
+    ) -> None:
+        self.guid = guid
+        self._currency = _currency
+        self.num = num
+        self._post_date = post_date
+        self.description = description
+        self.splits = [] if splits is None else splits
+
     @property
     def currency(self) -> Commodity:
         currency = self._currency
         assert currency is not None
         return currency
 
+    @property
+    def post_date(self) -> datetime:
+        post_date = self._post_date
+        if isinstance(post_date, int):
+            post_date = _from_epoch(post_date)
+            self._post_date = post_date
+        return post_date
+
+    @post_date.setter
+    def post_date(self, post_date: datetime) -> None:
+        self._post_date = post_date
+
+    @property
+    def post_date_epoch(self) -> int:
+        post_date = self._post_date
+        if isinstance(post_date, int):
+            return post_date
+        return int(post_date.timestamp())
+
     __hash__ = _guid_hash
     __eq__ = _guid_eq
 
 
 @dataclass(slots=True)
 class Split:
-    guid: str
+    guid: GUID
     _transaction: Transaction | None = None
     _account: Account | None = None
     value_num: int = 0
@@ -117,16 +172,36 @@ class Split:
     __eq__ = _guid_eq
 
 
-@dataclass(slots=True)
+# As for Transaction, the __init__ takes date for the _date field.
+@dataclass(slots=True, init=False)
 class Price:
-    guid: str
+    guid: GUID
     _commodity: Commodity | None = None
     _currency: Commodity | None = None
-    date: datetime = _INVALID_DATETIME
+    # datetime or seconds since epoch (see Projection.lazy_dates)
+    _date: datetime | int = _INVALID_DATETIME
     value_num: int = 0
     value_denom: int = 0
     value: float = float("nan")
 
+    def __init__(
+        self,
+        guid: GUID,
+        _commodity: Commodity | None = None,
+        _currency: Commodity | None = None,
+        date: datetime | int = _INVALID_DATETIME,
+        value_num: int = 0,
+        value_denom: int = 0,
+        value: float = float("nan"),
+    ) -> None:
+        self.guid = guid
+        self._commodity = _commodity
+        self._currency = _currency
+        self._date = date
+        self.value_num = value_num
+        self.value_denom = value_denom
+        self.value = value
+
     @property
     def commodity(self) -> Commodity:
         commodity = self._commodity
@@ -139,6 +214,25 @@ class Price:
         assert currency is not None
         return currency
 
+    @property
+    def date(self) -> datetime:
+        date = self._date
+        if isinstance(date, int):
+            date = _from_epoch(date)
+            self._date = date
+        return date
+
+    @date.setter
+    def date(self, date: datetime) -> None:
+        self._date = date
+
+    @property
+    def date_epoch(self) -> int:
+        date = self._date
+        if isinstance(date, int):
+            return date
+        return int(date.timestamp())
+
     __hash__ = _guid_hash
     __eq__ = _guid_eq
 
@@ -150,6 +244,184 @@ class GnuCashData:
     transactions: dict[GUID, Transaction] = field(default_factory=dict)
     splits: dict[GUID, Split] = field(default_factory=dict)
     prices: dict[GUID, Price] = field(default_factory=dict)
+    # Lazily built caches, see account_path() and find_account().
+    _account_names: dict[GUID, tuple[str, ...]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    _account_paths: dict[int, dict[GUID, str]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    _accounts_by_path: dict[str, Account] | None = field(
+        default=None, repr=False, compare=False
+    )
+    # GUIDs are bytes, see Projection.compact.
+    _compact: bool = field(default=False, repr=False, compare=False)
+    # Per-table checksums of GUID prefix chunks, see gnucash.refresh.
+    _fingerprints: dict[str, dict[str, tuple[int, int]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    # State of the book file they were taken from, a gnucash.snapshot
+    # SnapshotKey.
+    _fingerprints_key: object = field(default=None, repr=False, compare=False)
+
+
+@dataclass(slots=True, frozen=True)
+class LoadFilter:
+    """Restricts the rows read_data() loads; unset fields do not filter.
+
+    A transaction is loaded when one of its splits is in a matching account
+    and its post_date lies in [start_date, end_date). All splits of a loaded
+    transaction are loaded so counterpart accounts remain visible. The
+    commodity and account tables are always loaded completely, so accounts
+    outside the filter only see splits of loaded transactions. Prices are
+    restricted by commodity namespace and date range.
+    """
+
+    account_types: Collection[str] | None = None
+    # Accounts below (and including) these accounts match.
+    account_subtrees: Collection[GUID] | None = None
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+    commodity_namespaces: Collection[str] | None = None
+
+
+# Optional text columns that a Projection can skip.
+_SKIPPABLE_COLUMNS = (
+    "Account.description",
+    "Commodity.fullname",
+    "Transaction.num",
+    "Transaction.description",
+    "Split.memo",
+)
+
+
+@dataclass(slots=True, frozen=True)
+class Projection:
+    """Selects which optional columns read_data() fills in.
+
+    Columns named in `skip` (see _SKIPPABLE_COLUMNS) are not read from the
+    database and keep their dataclass default. `amounts` chooses whether
+    Split and Price objects get "float" values, "fraction" num/denom pairs
+    or "both". With `lazy_dates` transaction and price dates are stored as
+    seconds since epoch and only turned into datetime objects on access.
+
+    `compact` reduces the memory per object of large books: GUIDs become 16
+    raw bytes instead of 32 character strings (in the objects and as keys
+    of the GnuCashData dicts), and repeated strings like account types,
+    memos and descriptions share a single string object.
+    """
+
+    skip: Collection[str] = ()
+    amounts: Literal["both", "float", "fraction"] = "both"
+    lazy_dates: bool = False
+    compact: bool = False
+
+    def column(self, name: str, column: str) -> str:
+        if name in self.skip:
+            return "''"
+        return column
+
+
+LEAN_PROJECTION = Projection(skip=_SKIPPABLE_COLUMNS, amounts="float", lazy_dates=True)
+
+
+def guid_hex(guid: GUID) -> str:
+    """Return `guid` as the hex string GnuCash stores, e.g. to pass the GUID
+    of an object of a compact book to SQL."""
+    return guid if isinstance(guid, str) else guid.hex()
+
+
+def _unhex(value: str | None) -> bytes | None:
+    return None if value is None else bytes.fromhex(value)
+
+
+def _guid_sql(column: str, compact: bool) -> str:
+    return f"unhex({column})" if compact else column
+
+
+def _prepare_compact(connection: Connection) -> None:
+    # unhex() is built into sqlite 3.41 and later.
+    if sqlite3.sqlite_version_info < (3, 41, 0):
+        connection.create_function("unhex", 1, _unhex, deterministic=True)
+
+
+def _string_table(projection: Projection) -> dict[str, str] | None:
+    """Return the table used to share repeated strings, None if disabled."""
+    return {} if projection.compact else None
+
+
+@dataclass(slots=True)
+class PhaseStats:
+    name: str
+    seconds: float = 0.0
+    # Rows read from the phase's table.
+    rows: int = 0
+    # Account/Commodity/Transaction/Split/Price objects created.
+    allocations: int = 0
+
+
+@dataclass(slots=True)
+class LoadStats:
+    """Per-phase timings of a load, filled in by read_data(). `timer` returns
+    the current time in seconds and may be replaced by a custom clock;
+    `on_phase` is called with each phase as soon as it is finished."""
+
+    phases: list[PhaseStats] = field(default_factory=list)
+    timer: Callable[[], float] = time.perf_counter
+    on_phase: Callable[[PhaseStats], None] | None = None
+
+    @property
+    def seconds(self) -> float:
+        return sum(phase.seconds for phase in self.phases)
+
+    def __str__(self) -> str:
+        lines = [f"{'phase':<13} {'seconds':>9} {'rows':>10} {'objects':>10}"]
+        for phase in self.phases:
+            lines.append(
+                f"{phase.name:<13} {phase.seconds:9.3f} {phase.rows:10} "
+                f"{phase.allocations:10}"
+            )
+        rows = sum(phase.rows for phase in self.phases)
+        allocations = sum(phase.allocations for phase in self.phases)
+        lines.append(f"{'total':<13} {self.seconds:9.3f} {rows:10} {allocations:10}")
+        return "\n".join(lines) + "\n"
+
+
+def _object_count(data: GnuCashData) -> int:
+    return (
+        len(data.accounts)
+        + len(data.commodities)
+        + len(data.transactions)
+        + len(data.splits)
+        + len(data.prices)
+    )
+
+
+@contextmanager
+def _phase(
+    stats: LoadStats | None,
+    data: GnuCashData,
+    name: str,
+    table: dict[GUID, Any] | None = None,
+) -> Iterator[PhaseStats]:
+    """Time the enclosed block as phase `name` of `stats`. Rows are counted
+    as new entries of `table`; every row has a unique GUID, so this needs no
+    counting in the read loops."""
+    phase = PhaseStats(name)
+    if stats is None:
+        yield phase
+        return
+    objects = _object_count(data)
+    rows = 0 if table is None else len(table)
+    start = stats.timer()
+    yield phase
+    phase.seconds = stats.timer() - start
+    phase.allocations = _object_count(data) - objects
+    if table is not None:
+        phase.rows = len(table) - rows
+    stats.phases.append(phase)
+    if stats.on_phase is not None:
+        stats.on_phase(phase)
 
 
 def _get_data_cached(
@@ -183,30 +455,302 @@ def get_price(data: GnuCashData, guid: GUID) -> Price:
     return _get_data_cached(data.prices, Price, guid)
 
 
+def _account_names(data: GnuCashData, account: Account) -> tuple[str, ...]:
+    names = data._account_names.get(account.guid)
+    if names is None:
+        parent = account.parent
+        if parent is None:
+            names = ()
+        else:
+            names = (*_account_names(data, parent), account.name)
+        data._account_names[account.guid] = names
+    return names
+
+
+def account_path(data: GnuCashData, account: Account, maxdepth: int = 1000) -> str:
+    """Return the colon separated names of `account` and its parents
+    (excluding the root account), limited to the last `maxdepth` names.
+    Results are cached in `data` until invalidate_account_paths()."""
+    paths = data._account_paths.get(maxdepth)
+    if paths is None:
+        paths = {}
+        data._account_paths[maxdepth] = paths
+    path = paths.get(account.guid)
+    if path is None:
+        names = _account_names(data, account)
+        path = ":".join(names[-maxdepth:]) if maxdepth > 0 else ""
+        paths[account.guid] = path
+    return path
+
+
+def find_account(data: GnuCashData, path: str) -> Account | None:
+    """Return the account with the full account_path() `path`."""
+    accounts_by_path = data._accounts_by_path
+    if accounts_by_path is None:
+        accounts_by_path = {}
+        for account in data.accounts.values():
+            accounts_by_path.setdefault(account_path(data, account), account)
+        data._accounts_by_path = accounts_by_path
+    return accounts_by_path.get(path)
+
+
+def lookup_account(data: GnuCashData, text: str) -> Account | None:
+    """Return the account with the GUID or the full account_path() `text`,
+    as accepted on the command line."""
+    guid: GUID = text
+    if data._compact:
+        try:
+            guid = bytes.fromhex(text)
+        except ValueError:
+            pass
+    account = data.accounts.get(guid)
+    if account is not None:
+        return account
+    return find_account(data, text)
+
+
+def invalidate_account_paths(data: GnuCashData) -> None:
+    """Drop cached account paths; must be called when accounts are added,
+    renamed or moved."""
+    data._account_names.clear()
+    data._account_paths.clear()
+    data._accounts_by_path = None
+
+
 def open_file(filename: str, writable: bool = False) -> Connection:
     if writable:
         return sqlite3.connect(filename)
     return sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
 
 
-def _parse_time(time_str: str) -> datetime:
-    try:
-        # try gnucash 3 format
-        return datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=UTC)
-    except ValueError:
-        return datetime.strptime(time_str, "%Y%m%d%H%M%S").replace(tzinfo=UTC)
+_TIME_FORMAT_GC3 = "%Y-%m-%d %H:%M:%S"
+_TIME_FORMAT_GC2 = "%Y%m%d%H%M%S"
+
+
+def _time_format(c: Cursor, table: str, column: str) -> str | None:
+    """Return the strftime format used for `column` in `table`, or None if
+    the table mixes the gnucash 2 and gnucash 3 formats."""
+    min_length, max_length = c.execute(
+        f"SELECT min(length({column})), max(length({column})) FROM {table}"
+    ).fetchone()
+    if max_length == len("YYYYmmddHHMMSS"):
+        return _TIME_FORMAT_GC2
+    if min_length is None or min_length != len("YYYYmmddHHMMSS"):
+        return _TIME_FORMAT_GC3
+    return None
+
+
+def _epoch_sql(column: str, time_format: str | None) -> str:
+    """Return an SQL expression converting the time string `column` to
+    seconds since epoch, so rows need no strptime() on the Python side."""
+    parts = [
+        f"substr({column},{start},{length})"
+        for start, length in ((1, 4), (5, 2), (7, 2), (9, 2), (11, 2), (13, 2))
+    ]
+    gc2_column = (
+        f"{parts[0]}||'-'||{parts[1]}||'-'||{parts[2]}||' '||"
+        f"{parts[3]}||':'||{parts[4]}||':'||{parts[5]}"
+    )
+    if time_format == _TIME_FORMAT_GC2:
+        column = gc2_column
+    elif time_format is None:
+        column = f"CASE WHEN length({column}) = 14 THEN {gc2_column} ELSE {column} END"
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+def _order_sql(column: str, time_format: str | None) -> str:
+    """Return an SQL expression to sort by the time string `column`."""
+    if time_format is None:
+        return _epoch_sql(column, None)
+    return column
+
+
+def _decode_time(epoch: int | None, lazy: bool) -> datetime | int:
+    if epoch is None:
+        return _INVALID_DATETIME
+    if lazy:
+        return epoch
+    return _from_epoch(epoch)
+
+
+def _placeholders(values: Collection[Any]) -> str:
+    return ",".join("?" * len(values))
+
+
+def _account_condition(filter: LoadFilter) -> tuple[list[str], list[Any]]:
+    conds: list[str] = []
+    params: list[Any] = []
+    if filter.account_types is not None:
+        conds.append(f"account_type IN ({_placeholders(filter.account_types)})")
+        params.extend(filter.account_types)
+    if filter.account_subtrees is not None:
+        conds.append(
+            "guid IN (WITH RECURSIVE subtree(guid) AS ("
+            "SELECT guid FROM accounts WHERE guid IN "
+            f"({_placeholders(filter.account_subtrees)}) "
+            "UNION SELECT accounts.guid FROM accounts "
+            "JOIN subtree ON accounts.parent_guid = subtree.guid) "
+            "SELECT guid FROM subtree)"
+        )
+        params.extend(guid_hex(guid) for guid in filter.account_subtrees)
+    if filter.commodity_namespaces is not None:
+        conds.append(
+            "commodity_guid IN (SELECT guid FROM commodities WHERE namespace IN "
+            f"({_placeholders(filter.commodity_namespaces)}))"
+        )
+        params.extend(filter.commodity_namespaces)
+    return conds, params
+
+
+def _date_condition(
+    start_date: datetime | None,
+    end_date: datetime | None,
+    column: str,
+    time_format: str | None,
+) -> tuple[list[str], list[Any]]:
+    conds: list[str] = []
+    params: list[Any] = []
+    for op, bound in ((">=", start_date), ("<", end_date)):
+        if bound is None:
+            continue
+        if time_format is None:
+            # Mixed formats cannot be compared as strings.
+            conds.append(f"{_epoch_sql(column, None)} {op} ?")
+            params.append(int(bound.timestamp()))
+        else:
+            conds.append(f"{column} {op} ?")
+            params.append(bound.astimezone(UTC).strftime(time_format))
+    return conds, params
 
 
-def read_data(connection: Connection) -> GnuCashData:
-    c = connection.cursor()
+def _where(conds: list[str]) -> str:
+    if not conds:
+        return ""
+    return " WHERE " + " AND ".join(conds)
 
-    data = GnuCashData()
-    for row in c.execute(
-        "SELECT guid, namespace, mnemonic, fullname, "
-        "fraction, quote_flag, quote_source "
-        "FROM commodities"
-    ):
+
+def _transaction_where(
+    filter: LoadFilter | None, time_format: str | None
+) -> tuple[str, list[Any]]:
+    """Return the WHERE clause and parameters selecting transactions."""
+    if filter is None:
+        return "", []
+    conds, params = _date_condition(
+        filter.start_date, filter.end_date, "post_date", time_format
+    )
+    acc_conds, acc_params = _account_condition(filter)
+    if acc_conds:
+        conds.append(
+            "guid IN (SELECT tx_guid FROM splits WHERE account_guid IN "
+            f"(SELECT guid FROM accounts{_where(acc_conds)}))"
+        )
+        params.extend(acc_params)
+    return _where(conds), params
+
+
+def _price_where(
+    filter: LoadFilter | None, time_format: str | None
+) -> tuple[str, list[Any]]:
+    """Return the WHERE clause and parameters selecting prices."""
+    if filter is None:
+        return "", []
+    conds, params = _date_condition(
+        filter.start_date, filter.end_date, "date", time_format
+    )
+    if filter.commodity_namespaces is not None:
+        conds.append(
+            "commodity_guid IN (SELECT guid FROM commodities WHERE namespace IN "
+            f"({_placeholders(filter.commodity_namespaces)}))"
+        )
+        params.extend(filter.commodity_namespaces)
+    return _where(conds), params
+
+
+class _FilterMirror:
+    """Python mirror of the conditions read_data() puts into SQL, for
+    backends that filter while decoding (XML books, snapshots)."""
+
+    def __init__(self, filter: LoadFilter | None) -> None:
+        self.filter = filter
+        self.start: int | None = None
+        self.end: int | None = None
+        self.namespaces: Collection[str] | None = None
+        self.roots: set[str] | None = None
+        # Whether transactions are restricted by the accounts of their splits.
+        self.accounts = False
+        self._matches: dict[GUID, bool] = {}
+        if filter is None:
+            return
+        if filter.start_date is not None:
+            self.start = int(filter.start_date.timestamp())
+        if filter.end_date is not None:
+            self.end = int(filter.end_date.timestamp())
+        self.namespaces = filter.commodity_namespaces
+        if filter.account_subtrees is not None:
+            self.roots = {guid_hex(guid) for guid in filter.account_subtrees}
+        self.accounts = (
+            filter.account_types is not None
+            or filter.account_subtrees is not None
+            or filter.commodity_namespaces is not None
+        )
+
+    def in_range(self, epoch: int | None) -> bool:
+        if epoch is None:
+            return self.start is None and self.end is None
+        if self.start is not None and epoch < self.start:
+            return False
+        return self.end is None or epoch < self.end
+
+    def account_matches(self, account: Account) -> bool:
+        match = self._matches.get(account.guid)
+        if match is not None:
+            return match
+        filter = self.filter
+        assert filter is not None
+        match = True
+        if filter.account_types is not None:
+            match = account.type in filter.account_types
+        if match and self.namespaces is not None:
+            commodity = account._commodity
+            match = commodity is not None and commodity.namespace in self.namespaces
+        if match and self.roots is not None:
+            node: Account | None = account
+            while node is not None and guid_hex(node.guid) not in self.roots:
+                node = node.parent
+            match = node is not None
+        self._matches[account.guid] = match
+        return match
+
+    def price_matches(self, commodity: Commodity) -> bool:
+        return self.namespaces is None or commodity.namespace in self.namespaces
+
+
+def _check_projection(projection: Projection | None) -> Projection:
+    if projection is None:
+        return Projection()
+    for name in projection.skip:
+        if name not in _SKIPPABLE_COLUMNS:
+            raise ValueError(f"Cannot skip column '{name}'")
+    return projection
+
+
+def _commodities_sql(projection: Projection, where: str = "") -> str:
+    p = projection.column
+    return (
+        f"SELECT {_guid_sql('guid', projection.compact)}, namespace, mnemonic, "
+        f"{p('Commodity.fullname', 'fullname')}, "
+        f"fraction, quote_flag, quote_source FROM commodities{where}"
+    )
+
+
+def _read_commodities(
+    rows: Iterable[Any], data: GnuCashData, strings: dict[str, str] | None
+) -> None:
+    for row in rows:
         guid, namespace, mnemonic, fullname, fraction, quote_flag, quote_source = row
+        if strings is not None:
+            namespace = strings.setdefault(namespace, namespace)
+            quote_source = strings.setdefault(quote_source, quote_source)
         comm = get_commodity(data, guid)
         comm.namespace = namespace
         comm.mnemonic = mnemonic
@@ -215,11 +759,22 @@ def read_data(connection: Connection) -> GnuCashData:
         comm.quote_source = quote_source
         comm.precision = int(math.log10(fraction))
 
-    for row in c.execute(
-        "SELECT guid, name, account_type, commodity_guid, "
-        "commodity_scu, non_std_scu, parent_guid, code, "
-        "description FROM accounts"
-    ):
+
+def _accounts_sql(projection: Projection, where: str = "") -> str:
+    p = projection.column
+    g = projection.compact
+    return (
+        f"SELECT {_guid_sql('guid', g)}, name, account_type, "
+        f"{_guid_sql('commodity_guid', g)}, commodity_scu, non_std_scu, "
+        f"{_guid_sql('parent_guid', g)}, code, "
+        f"{p('Account.description', 'description')} FROM accounts{where}"
+    )
+
+
+def _read_accounts(
+    rows: Iterable[Any], data: GnuCashData, strings: dict[str, str] | None
+) -> None:
+    for row in rows:
         (
             guid,
             name,
@@ -231,6 +786,8 @@ def read_data(connection: Connection) -> GnuCashData:
             _code,
             description,
         ) = row
+        if strings is not None:
+            account_type = strings.setdefault(account_type, account_type)
         if commodity_guid:
             commodity = get_commodity(data, commodity_guid)
         else:
@@ -248,21 +805,76 @@ def read_data(connection: Connection) -> GnuCashData:
         if parent is not None:
             parent.childs.append(acc)
 
-    for row in c.execute(
-        "SELECT guid, currency_guid, num, post_date, description FROM transactions"
-    ):
+
+def _read_account_tree(
+    c: Cursor,
+    data: GnuCashData,
+    projection: Projection,
+    strings: dict[str, str] | None,
+    stats: LoadStats | None,
+) -> None:
+    if projection.compact:
+        _prepare_compact(c.connection)
+        data._compact = True
+    with _phase(stats, data, "commodities", data.commodities):
+        _read_commodities(c.execute(_commodities_sql(projection)), data, strings)
+    with _phase(stats, data, "accounts", data.accounts):
+        _read_accounts(c.execute(_accounts_sql(projection)), data, strings)
+
+
+def _transactions_sql(
+    projection: Projection, where: str, time_format: str | None
+) -> str:
+    p = projection.column
+    g = projection.compact
+    return (
+        f"SELECT {_guid_sql('guid', g)}, {_guid_sql('currency_guid', g)}, "
+        f"{p('Transaction.num', 'num')}, "
+        f"{_epoch_sql('post_date', time_format)}, "
+        f"{p('Transaction.description', 'description')} "
+        f"FROM transactions{where}"
+    )
+
+
+def _read_transactions(
+    rows: Iterable[Any],
+    data: GnuCashData,
+    projection: Projection,
+    strings: dict[str, str] | None,
+) -> None:
+    lazy_dates = projection.lazy_dates
+    for row in rows:
         guid, currency_guid, num, post_date, description = row
+        if strings is not None:
+            num = strings.setdefault(num, num)
+            description = strings.setdefault(description, description)
         trans = get_transaction(data, guid)
         trans._currency = get_commodity(data, currency_guid)
         trans.num = num
-        trans.post_date = _parse_time(post_date)
+        trans._post_date = _decode_time(post_date, lazy_dates)
         trans.description = description
 
-    for row in c.execute(
-        "SELECT guid, tx_guid, account_guid, memo, "
+
+def _splits_sql(projection: Projection, where: str) -> str:
+    p = projection.column
+    g = projection.compact
+    return (
+        f"SELECT {_guid_sql('guid', g)}, {_guid_sql('tx_guid', g)}, "
+        f"{_guid_sql('account_guid', g)}, {p('Split.memo', 'memo')}, "
         "value_num, value_denom, quantity_num, "
-        "quantity_denom FROM splits"
-    ):
+        f"quantity_denom FROM splits{where}"
+    )
+
+
+def _read_splits(
+    rows: Iterable[Any],
+    data: GnuCashData,
+    projection: Projection,
+    strings: dict[str, str] | None,
+) -> None:
+    keep_float = projection.amounts != "fraction"
+    keep_fraction = projection.amounts != "float"
+    for row in rows:
         (
             guid,
             tx_guid,
@@ -278,90 +890,663 @@ def read_data(connection: Connection) -> GnuCashData:
         split._transaction.splits.append(split)
         split._account = get_account(data, account_guid)
         split._account.splits.append(split)
-        split.value_num = int(value_num)
-        split.value_denom = int(value_denom)
-        split.value = float(value_num) / float(value_denom)
-        split.quantity_num = int(quantity_num)
-        split.quantity_denom = int(quantity_denom)
-        split.quantity = float(quantity_num) / float(quantity_denom)
+        if keep_fraction:
+            split.value_num = int(value_num)
+            split.value_denom = int(value_denom)
+            split.quantity_num = int(quantity_num)
+            split.quantity_denom = int(quantity_denom)
+        if keep_float:
+            split.value = float(value_num) / float(value_denom)
+            split.quantity = float(quantity_num) / float(quantity_denom)
+        if strings is not None:
+            memo = strings.setdefault(memo, memo)
         split.memo = memo
 
-    for row in c.execute(
-        "SELECT guid, commodity_guid, currency_guid, date, "
-        "value_num, value_denom FROM prices"
-    ):
+
+def _prices_sql(projection: Projection, where: str, time_format: str | None) -> str:
+    g = projection.compact
+    return (
+        f"SELECT {_guid_sql('guid', g)}, {_guid_sql('commodity_guid', g)}, "
+        f"{_guid_sql('currency_guid', g)}, "
+        f"{_epoch_sql('date', time_format)}, "
+        f"value_num, value_denom FROM prices{where}"
+    )
+
+
+def _read_prices(
+    rows: Iterable[Any], data: GnuCashData, projection: Projection
+) -> None:
+    keep_float = projection.amounts != "fraction"
+    keep_fraction = projection.amounts != "float"
+    lazy_dates = projection.lazy_dates
+    for row in rows:
         guid, commodity_guid, currency_guid, date, value_num, value_denom = row
         price = get_price(data, guid)
         price._commodity = get_commodity(data, commodity_guid)
         price._commodity.prices.append(price)
         price._currency = get_commodity(data, currency_guid)
-        price.date = _parse_time(date)
-        price.value_num = int(value_num)
-        price.value_denom = int(value_denom)
-        if int(value_denom) == 0:
-            price.value = 0.0
-        else:
-            price.value = float(value_num) / float(value_denom)
+        price._date = _decode_time(date, lazy_dates)
+        if keep_fraction:
+            price.value_num = int(value_num)
+            price.value_denom = int(value_denom)
+        if keep_float:
+            if int(value_denom) == 0:
+                price.value = 0.0
+            else:
+                price.value = float(value_num) / float(value_denom)
+
+
+# Rows handed from a fetch thread to the loading thread at a time.
+_FETCH_CHUNK = 4096
+# Chunks a fetch thread reads ahead of the loading thread at most.
+_FETCH_AHEAD = 8
+
+
+class _Fetch:
+    """Run a query on a separate read-only connection in a background thread.
+    sqlite releases the GIL while it steps through a table, so the scan runs
+    concurrently with the linking done on the loading thread. The thread
+    reads at most _FETCH_AHEAD chunks ahead, so memory stays bounded when
+    linking is slower than the scan."""
+
+    def __init__(
+        self, path: str, sql: str, params: list[Any], projection: Projection
+    ) -> None:
+        self._queue: queue.Queue[list[Any] | BaseException | None] = queue.Queue(
+            maxsize=_FETCH_AHEAD
+        )
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(path, sql, params, projection), daemon=True
+        )
+        self._thread.start()
+
+    def _run(
+        self, path: str, sql: str, params: list[Any], projection: Projection
+    ) -> None:
+        try:
+            with closing(open_file(path)) as connection:
+                if projection.compact:
+                    _prepare_compact(connection)
+                cursor = connection.execute(sql, params)
+                while rows := cursor.fetchmany(_FETCH_CHUNK):
+                    if not self._put(rows):
+                        return
+        except BaseException as e:
+            # Re-raised on the loading thread.
+            self._put(e)
+        self._put(None)
+
+    def _put(self, item: list[Any] | BaseException | None) -> bool:
+        """Wait for room in the queue; False once the fetch was closed."""
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def rows(self) -> Iterator[Any]:
+        while (rows := self._queue.get()) is not None:
+            if isinstance(rows, BaseException):
+                raise rows
+            yield from rows
+        self._thread.join()
+
+    def close(self) -> None:
+        """Stop the thread if the rows were not read to the end."""
+        self._closed.set()
+
+
+def _database_path(connection: Connection) -> str | None:
+    """Return the file of the main database, None if it is in memory."""
+    for _seq, name, path in connection.execute("PRAGMA database_list"):
+        if name == "main":
+            return str(path) or None
+    return None
+
+
+def read_data(
+    connection: Connection,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+    parallel: bool = False,
+) -> GnuCashData:
+    """Load the book. If `stats` is given, the time, rows and objects created
+    of each load phase are appended to it.
+
+    With `parallel`, the transactions, splits and prices tables are read
+    concurrently on separate read-only connections while the rows are linked
+    on the calling thread; these connections only see committed data. Books
+    in memory are always read sequentially. It is off by default since it
+    measured slower on a single core: 1.21s instead of 1.04s for a book with
+    100k splits."""
+    projection = _check_projection(projection)
+    data = GnuCashData()
+    c = connection.cursor()
+    with _phase(stats, data, "schema"):
+        tx_format = _time_format(c, "transactions", "post_date")
+        price_format = _time_format(c, "prices", "date")
+        tx_where, tx_params = _transaction_where(filter, tx_format)
+        price_where, price_params = _price_where(filter, price_format)
+        split_where = ""
+        if tx_where:
+            split_where = f" WHERE tx_guid IN (SELECT guid FROM transactions{tx_where})"
+        queries = {
+            "transactions": (
+                _transactions_sql(projection, tx_where, tx_format),
+                tx_params,
+            ),
+            "splits": (_splits_sql(projection, split_where), tx_params),
+            "prices": (
+                _prices_sql(projection, price_where, price_format),
+                price_params,
+            ),
+        }
+        path = _database_path(connection) if parallel else None
+        fetches = {
+            table: _Fetch(path, sql, params, projection)
+            for table, (sql, params) in queries.items()
+            if path is not None
+        }
+
+    def rows(table: str) -> Iterable[Any]:
+        fetch = fetches.get(table)
+        if fetch is not None:
+            return fetch.rows()
+        sql, params = queries[table]
+        return c.execute(sql, params)
+
+    strings = _string_table(projection)
+    try:
+        _read_account_tree(c, data, projection, strings, stats)
+
+        # Link the tables in a fixed order so the result does not depend on
+        # `parallel`.
+        with _phase(stats, data, "transactions", data.transactions):
+            _read_transactions(rows("transactions"), data, projection, strings)
+        with _phase(stats, data, "splits", data.splits):
+            _read_splits(rows("splits"), data, projection, strings)
+        with _phase(stats, data, "prices", data.prices):
+            _read_prices(rows("prices"), data, projection)
+    finally:
+        for fetch in fetches.values():
+            fetch.close()
 
     # Sort price lists for each commodity
-    for commodity in data.commodities.values():
-        prices = commodity.prices
-        prices.sort(key=lambda price: price.date)
+    with _phase(stats, data, "sort") as phase:
+        for commodity in data.commodities.values():
+            prices = commodity.prices
+            prices.sort(key=lambda price: price.date_epoch)
+        phase.rows = len(data.prices)
+
+    return data
+
 
+def read_accounts(
+    connection: Connection,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+) -> GnuCashData:
+    """Read only the commodities and the account tree. This is the starting
+    point for the iter_prices() and iter_transactions() generators."""
+    projection = _check_projection(projection)
+    data = GnuCashData()
+    strings = _string_table(projection)
+    _read_account_tree(connection.cursor(), data, projection, strings, stats)
     return data
 
 
-def read_file(filename: str) -> GnuCashData:
+def iter_prices(
+    connection: Connection, data: GnuCashData, filter: LoadFilter | None = None
+) -> Iterator[Price]:
+    """Yield prices ordered by date. The prices are linked to the commodities
+    in `data` but neither stored in `data` nor added to Commodity.prices."""
+    c = connection.cursor()
+    price_format = _time_format(c, "prices", "date")
+    price_where, price_params = _price_where(filter, price_format)
+    g = data._compact
+    for row in c.execute(
+        f"SELECT {_guid_sql('guid', g)}, {_guid_sql('commodity_guid', g)}, "
+        f"{_guid_sql('currency_guid', g)}, "
+        f"{_epoch_sql('date', price_format)}, "
+        f"value_num, value_denom FROM prices{price_where} "
+        f"ORDER BY {_order_sql('date', price_format)}, rowid",
+        price_params,
+    ):
+        guid, commodity_guid, currency_guid, date, value_num, value_denom = row
+        price = Price(
+            guid=guid,
+            _commodity=get_commodity(data, commodity_guid),
+            _currency=get_commodity(data, currency_guid),
+            date=_decode_time(date, lazy=False),
+            value_num=int(value_num),
+            value_denom=int(value_denom),
+        )
+        if price.value_denom == 0:
+            price.value = 0.0
+        else:
+            price.value = float(value_num) / float(value_denom)
+        yield price
+
+
+def iter_transactions(
+    connection: Connection, data: GnuCashData, filter: LoadFilter | None = None
+) -> Iterator[Transaction]:
+    """Yield transactions with their splits ordered by post_date. Splits are
+    joined to their transaction in SQL and linked to the accounts in `data`.
+    Nothing is stored in `data` or added to Account.splits, so memory use
+    does not grow with the size of the book."""
+    c = connection.cursor()
+    tx_format = _time_format(c, "transactions", "post_date")
+    tx_where, tx_params = _transaction_where(filter, tx_format)
+    if tx_where:
+        tx_where = f" WHERE t.guid IN (SELECT guid FROM transactions{tx_where})"
+    trans: Transaction | None = None
+    g = data._compact
+    for row in c.execute(
+        f"SELECT {_guid_sql('t.guid', g)}, {_guid_sql('t.currency_guid', g)}, "
+        f"t.num, {_epoch_sql('t.post_date', tx_format)}, t.description, "
+        f"{_guid_sql('s.guid', g)}, {_guid_sql('s.account_guid', g)}, "
+        "s.memo, s.value_num, s.value_denom, "
+        "s.quantity_num, s.quantity_denom "
+        "FROM transactions t LEFT JOIN splits s ON s.tx_guid = t.guid"
+        f"{tx_where} ORDER BY {_order_sql('t.post_date', tx_format)}, "
+        "t.rowid, s.rowid",
+        tx_params,
+    ):
+        (
+            tx_guid,
+            currency_guid,
+            num,
+            post_date,
+            description,
+            guid,
+            account_guid,
+            memo,
+            value_num,
+            value_denom,
+            quantity_num,
+            quantity_denom,
+        ) = row
+        if trans is None or trans.guid != tx_guid:
+            if trans is not None:
+                yield trans
+            trans = Transaction(
+                guid=tx_guid,
+                _currency=get_commodity(data, currency_guid),
+                num=num,
+                post_date=_decode_time(post_date, lazy=False),
+                description=description,
+            )
+        if guid is None:
+            continue
+        trans.splits.append(
+            Split(
+                guid=guid,
+                _transaction=trans,
+                _account=get_account(data, account_guid),
+                value_num=int(value_num),
+                value_denom=int(value_denom),
+                value=float(value_num) / float(value_denom),
+                quantity_num=int(quantity_num),
+                quantity_denom=int(quantity_denom),
+                quantity=float(quantity_num) / float(quantity_denom),
+                memo=memo,
+            )
+        )
+    if trans is not None:
+        yield trans
+
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def read_file(
+    filename: str,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+    parallel: bool = False,
+    snapshot: bool = False,
+) -> GnuCashData:
+    """Load the sqlite or XML book `filename`; the backend is chosen by
+    looking at the file header. `parallel` only applies to sqlite books, see
+    read_data(). With `snapshot`, sqlite books are loaded from their
+    snapshot sidecar file, which is (re)built when it is missing or the book
+    changed; see gnucash.snapshot."""
+    with open(filename, "rb") as f:
+        header = f.read(len(_SQLITE_HEADER))
+    if header != _SQLITE_HEADER:
+        from gnucash.xml import GZIP_MAGIC, read_xml
+
+        if header.startswith((GZIP_MAGIC, b"<?xml", b"<gnc-v2")):
+            return read_xml(filename, filter, projection, stats)
+    elif snapshot:
+        from gnucash.snapshot import read_cached
+
+        return read_cached(filename, filter, projection, stats, parallel)
     with open_file(filename) as conn:
-        return read_data(conn)
+        return read_data(conn, filter, projection, stats, parallel)
 
 
 # Functions to change data
 
 
+@contextmanager
+def batch(connection: Connection) -> Iterator[Connection]:
+    """Run the writes of the with-block in a single database transaction:
+    commit when the block completes and roll back if it raises. Use with
+    add_prices(), move_splits() and the commit=False variants of the
+    single-row functions."""
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
 def change_split_account(
     connection: Connection,
     split_guid: GUID,
     oldaccount_guid: GUID,
     newaccount_guid: GUID,
+    commit: bool = True,
 ) -> None:
     connection.execute(
         "UPDATE splits SET account_guid=? WHERE guid=? AND account_guid=?",
-        (newaccount_guid, split_guid, oldaccount_guid),
+        (guid_hex(newaccount_guid), guid_hex(split_guid), guid_hex(oldaccount_guid)),
     )
-    connection.commit()
+    if commit:
+        connection.commit()
+
+
+@dataclass(slots=True, frozen=True)
+class SplitFilter:
+    """Selects splits for move_splits(); unset fields do not filter. Dates
+    refer to the post_date of the split's transaction. `description` and
+    `memo` are regular expressions searched in the transaction description
+    and the split memo. `min_value` and `max_value` bound the (signed) value
+    of the split, both inclusive. `counterpart_guid` selects splits whose
+    transaction also has a split in that account."""
+
+    split_guids: Collection[GUID] | None = None
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+    description: str | None = None
+    memo: str | None = None
+    min_value: Decimal | Fraction | int | None = None
+    max_value: Decimal | Fraction | int | None = None
+    counterpart_guid: GUID | None = None
+
+
+# Stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite versions.
+_MAX_PARAMS = 900
+
+
+@lru_cache(maxsize=64)
+def _compile(pattern: str) -> re.Pattern[str]:
+    return re.compile(pattern)
+
+
+def _regexp(pattern: str, value: str | None) -> bool:
+    return value is not None and _compile(pattern).search(value) is not None
+
+
+def _prepare_regexp(connection: Connection) -> None:
+    # sqlite implements the REGEXP operator with a regexp() function, which
+    # it does not provide itself.
+    connection.create_function("regexp", 2, _regexp, deterministic=True)
+
+
+def _split_selections(
+    c: Cursor, from_account_guid: GUID, predicate: SplitFilter | None
+) -> Iterator[tuple[str, list[Any]]]:
+    """Yield WHERE clauses and parameters that together select the splits of
+    `from_account_guid` matching `predicate`. There is more than one clause
+    if the split GUIDs do not fit into a single statement."""
+    conds = ["account_guid=?"]
+    params: list[Any] = [guid_hex(from_account_guid)]
+    if predicate is None:
+        yield _where(conds), params
+        return
+    tx_conds, tx_params = _date_condition(
+        predicate.start_date,
+        predicate.end_date,
+        "post_date",
+        _time_format(c, "transactions", "post_date"),
+    )
+    if predicate.description is not None:
+        tx_conds.append("description REGEXP ?")
+        tx_params.append(predicate.description)
+    if tx_conds:
+        conds.append(f"tx_guid IN (SELECT guid FROM transactions{_where(tx_conds)})")
+        params.extend(tx_params)
+    if predicate.memo is not None:
+        conds.append("memo REGEXP ?")
+        params.append(predicate.memo)
+    # Compare value_num/value_denom with the bound n/d as value_num * d and
+    # n * value_denom, in integers; both denominators are positive.
+    if predicate.min_value is not None:
+        conds.append("value_num * ? >= ? * value_denom")
+        params.extend(reversed(predicate.min_value.as_integer_ratio()))
+    if predicate.max_value is not None:
+        conds.append("value_num * ? <= ? * value_denom")
+        params.extend(reversed(predicate.max_value.as_integer_ratio()))
+    if predicate.counterpart_guid is not None:
+        conds.append("tx_guid IN (SELECT tx_guid FROM splits WHERE account_guid=?)")
+        params.append(guid_hex(predicate.counterpart_guid))
+    if predicate.description is not None or predicate.memo is not None:
+        _prepare_regexp(c.connection)
+    if predicate.split_guids is None:
+        yield _where(conds), params
+        return
+    guids = [guid_hex(guid) for guid in predicate.split_guids]
+    for i in range(0, len(guids), _MAX_PARAMS):
+        chunk = guids[i : i + _MAX_PARAMS]
+        yield (
+            _where([*conds, f"guid IN ({_placeholders(chunk)})"]),
+            [*params, *chunk],
+        )
+
+
+def count_splits(
+    connection: Connection,
+    from_account_guid: GUID,
+    predicate: SplitFilter | None = None,
+) -> tuple[int, float]:
+    """Return the number and the total value of the splits move_splits()
+    would move, without changing anything."""
+    c = connection.cursor()
+    count = 0
+    total = 0.0
+    for where, params in _split_selections(c, from_account_guid, predicate):
+        rows, value = c.execute(
+            f"SELECT count(*), total(CAST(value_num AS REAL) / value_denom) "
+            f"FROM splits{where}",
+            params,
+        ).fetchone()
+        count += rows
+        total += value
+    return count, total
+
+
+def move_splits(
+    connection: Connection,
+    from_account_guid: GUID,
+    to_account_guid: GUID,
+    predicate: SplitFilter | None = None,
+    journal: int | None = None,
+) -> int:
+    """Move the splits of account `from_account_guid` selected by `predicate`
+    to `to_account_guid` with a set-based UPDATE. If `journal` is given (see
+    start_journal()), the moves are recorded in that journal entry so they
+    can be reverted with undo_journal(). Does not commit, see batch().
+    Returns the number of moved splits."""
+    c = connection.cursor()
+    moved = 0
+    for where, params in _split_selections(c, from_account_guid, predicate):
+        if journal is not None:
+            c.execute(
+                "INSERT INTO pygnucash_journal_splits"
+                "(entry, split_guid, old_account_guid, new_account_guid) "
+                f"SELECT ?, guid, account_guid, ? FROM splits{where}",
+                [journal, guid_hex(to_account_guid), *params],
+            )
+        c.execute(
+            f"UPDATE splits SET account_guid=?{where}",
+            [guid_hex(to_account_guid), *params],
+        )
+        moved += c.rowcount
+    return moved
+
+
+# The journal lives in tables of its own, which GnuCash ignores.
+_JOURNAL_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS pygnucash_journal("
+    "id INTEGER PRIMARY KEY, date TEXT NOT NULL, description TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS pygnucash_journal_splits("
+    "entry INTEGER NOT NULL REFERENCES pygnucash_journal(id), "
+    "split_guid TEXT NOT NULL, old_account_guid TEXT NOT NULL, "
+    "new_account_guid TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS pygnucash_journal_splits_entry "
+    "ON pygnucash_journal_splits(entry)",
+)
+
+
+@dataclass(slots=True, frozen=True)
+class JournalEntry:
+    id: int
+    date: datetime
+    description: str
+    splits: int
+
+
+def start_journal(connection: Connection, description: str) -> int:
+    """Create a journal entry for the following move_splits() calls and
+    return its id. Does not commit, see batch()."""
+    for statement in _JOURNAL_SCHEMA:
+        connection.execute(statement)
+    c = connection.execute(
+        "INSERT INTO pygnucash_journal(date, description) VALUES (?, ?)",
+        (_print_time(datetime.now(UTC)), description),
+    )
+    assert c.lastrowid is not None
+    return c.lastrowid
+
+
+def journal_entries(connection: Connection) -> list[JournalEntry]:
+    """Return the journal entries that can be undone, oldest first."""
+    c = connection.cursor()
+    if not c.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='pygnucash_journal'"
+    ).fetchone():
+        return []
+    return [
+        JournalEntry(
+            id=id,
+            date=datetime.strptime(date, _TIME_FORMAT_GC3).replace(tzinfo=UTC),
+            description=description,
+            splits=splits,
+        )
+        for id, date, description, splits in c.execute(
+            "SELECT j.id, j.date, j.description, "
+            "(SELECT count(*) FROM pygnucash_journal_splits s "
+            "WHERE s.entry = j.id) "
+            "FROM pygnucash_journal j ORDER BY j.id"
+        )
+    ]
+
+
+def undo_journal(connection: Connection, entry: int) -> int:
+    """Move the splits recorded in journal entry `entry` back to their old
+    accounts and delete the entry. Splits that were moved again or deleted
+    since are left alone. Does not commit, see batch(). Returns the number
+    of splits moved back."""
+    c = connection.cursor()
+    c.execute(
+        "UPDATE splits SET account_guid = j.old_account_guid "
+        "FROM pygnucash_journal_splits j "
+        "WHERE j.entry = ? AND splits.guid = j.split_guid "
+        "AND splits.account_guid = j.new_account_guid",
+        (entry,),
+    )
+    moved = c.rowcount
+    c.execute("DELETE FROM pygnucash_journal_splits WHERE entry = ?", (entry,))
+    c.execute("DELETE FROM pygnucash_journal WHERE id = ?", (entry,))
+    return moved
 
 
 def _print_time(time: datetime) -> str:
     return time.strftime("%Y-%m-%d %H:%M:%S")
 
 
+@dataclass(slots=True, frozen=True)
+class NewPrice:
+    """A price to be inserted with add_prices()."""
+
+    commodity_guid: GUID
+    currency_guid: GUID
+    date: datetime
+    source: str
+    type: str
+    value_num: int
+    value_denom: int
+
+
+def add_prices(connection: Connection, prices: Iterable[NewPrice]) -> list[GUID]:
+    """Insert `prices` with a single executemany(). Does not commit, see
+    batch(). Returns the GUIDs of the new prices."""
+    guids: list[GUID] = []
+    rows = []
+    for price in prices:
+        guid = uuid.uuid4().hex
+        guids.append(guid)
+        rows.append(
+            (
+                guid,
+                guid_hex(price.commodity_guid),
+                guid_hex(price.currency_guid),
+                _print_time(price.date),
+                price.source,
+                price.type,
+                price.value_num,
+                price.value_denom,
+            )
+        )
+    connection.executemany(
+        "INSERT INTO prices(guid, commodity_guid, "
+        "currency_guid, date, source, type, value_num, "
+        "value_denom) VALUES (?,?,?,?,?,?,?,?)",
+        rows,
+    )
+    return guids
+
+
 def add_price(
     connection: Connection,
     commodity_guid: GUID,
     currency_guid: GUID,
     date: datetime,
-    source: GUID,
+    source: str,
     type: str,
     value_num: int,
     value_denom: int,
+    commit: bool = True,
 ) -> GUID:
-    guid = uuid.uuid4().hex
-    date_f = _print_time(date)
-    connection.execute(
-        "INSERT INTO prices(guid, commodity_guid, "
-        "currency_guid, date, source, type, value_num, "
-        "value_denom) VALUES (?,?,?,?,?,?,?,?)",
-        (
-            guid,
-            commodity_guid,
-            currency_guid,
-            date_f,
-            source,
-            type,
-            value_num,
-            value_denom,
-        ),
+    price = NewPrice(
+        commodity_guid=commodity_guid,
+        currency_guid=currency_guid,
+        date=date,
+        source=source,
+        type=type,
+        value_num=value_num,
+        value_denom=value_denom,
     )
-    connection.commit()
+    (guid,) = add_prices(connection, [price])
+    if commit:
+        connection.commit()
     return guid
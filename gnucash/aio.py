@@ -0,0 +1,206 @@
+"""
+asyncio counterparts of the loading and writing functions. Every
+AsyncConnection owns a single worker thread; the sqlite connection is
+created, used and closed on that thread only, so the event loop never
+blocks on sqlite. Iterators fetch their rows in chunks and return to the
+event loop between chunks.
+
+Cancelling a call (directly or through asyncio.timeout()) interrupts the
+sqlite statement it is running, see sqlite3.Connection.interrupt(); calls
+that did not start yet are dropped. Writes run in their own database
+transaction and are rolled back when they are interrupted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from collections.abc import AsyncIterator, Callable, Generator, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from sqlite3 import Connection
+from types import TracebackType
+from typing import Concatenate, ParamSpec, Self, TypeVar
+
+from gnucash import (
+    GUID,
+    GnuCashData,
+    LoadFilter,
+    LoadStats,
+    NewPrice,
+    Price,
+    Projection,
+    Transaction,
+    add_prices,
+    batch,
+    iter_prices,
+    iter_transactions,
+    open_file,
+    read_accounts,
+    read_data,
+)
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+# Objects handed from the worker thread to the event loop at a time.
+CHUNK_SIZE = 1000
+
+
+class AsyncConnection:
+    """A sqlite connection used from asyncio; see aopen_file()."""
+
+    def __init__(self, executor: ThreadPoolExecutor, connection: Connection) -> None:
+        self._executor = executor
+        self._connection = connection
+        # The call running on the worker thread, so that cancelling a call
+        # never interrupts the next one.
+        self._running: object = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    async def run(
+        self,
+        fn: Callable[Concatenate[Connection, _P], _T],
+        *args: _P.args,
+        **kwargs: _P.kwargs,
+    ) -> _T:
+        """Call fn(connection, *args, **kwargs) on the worker thread."""
+        if self._closed:
+            raise ValueError("connection is closed")
+        token = object()
+
+        def job() -> _T:
+            with self._lock:
+                self._running = token
+            try:
+                return fn(self._connection, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running = None
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, job)
+        except asyncio.CancelledError:
+            with self._lock:
+                if self._running is token:
+                    self._connection.interrupt()
+            raise
+
+    def _submit(self, fn: Callable[[], object]) -> None:
+        """Run `fn` on the worker thread after the queued calls without
+        waiting for it."""
+        if not self._closed:
+            self._executor.submit(fn)
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        try:
+            await self.run(Connection.close)
+        finally:
+            self._closed = True
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+
+async def aopen_file(filename: str, writable: bool = False) -> AsyncConnection:
+    """Open `filename` like open_file() on a new worker thread."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gnucash-aio")
+    loop = asyncio.get_running_loop()
+    try:
+        connection = await loop.run_in_executor(
+            executor, functools.partial(open_file, filename, writable)
+        )
+    except BaseException:
+        executor.shutdown(wait=False)
+        raise
+    return AsyncConnection(executor, connection)
+
+
+async def aread_data(
+    connection: AsyncConnection,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+) -> GnuCashData:
+    """See read_data()."""
+    return await connection.run(read_data, filter, projection, stats)
+
+
+async def aread_accounts(
+    connection: AsyncConnection,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+) -> GnuCashData:
+    """See read_accounts()."""
+    return await connection.run(read_accounts, projection, stats)
+
+
+def _take(_connection: Connection, iterator: Iterator[_T], count: int) -> list[_T]:
+    return list(islice(iterator, count))
+
+
+async def _aiter(
+    connection: AsyncConnection,
+    start: Callable[[Connection], Iterator[_T]],
+    chunk_size: int,
+) -> AsyncIterator[_T]:
+    # The generator runs its cursor on the worker thread only.
+    iterator = await connection.run(start)
+    try:
+        while items := await connection.run(_take, iterator, chunk_size):
+            for item in items:
+                yield item
+    finally:
+        if isinstance(iterator, Generator):
+            connection._submit(iterator.close)
+
+
+def aiter_transactions(
+    connection: AsyncConnection,
+    data: GnuCashData,
+    filter: LoadFilter | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncIterator[Transaction]:
+    """See iter_transactions(); `data` comes from aread_accounts()."""
+    return _aiter(
+        connection,
+        lambda c: iter_transactions(c, data, filter),
+        chunk_size,
+    )
+
+
+def aiter_prices(
+    connection: AsyncConnection,
+    data: GnuCashData,
+    filter: LoadFilter | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncIterator[Price]:
+    """See iter_prices(); `data` comes from aread_accounts()."""
+    return _aiter(connection, lambda c: iter_prices(c, data, filter), chunk_size)
+
+
+def _add_prices_committed(connection: Connection, prices: list[NewPrice]) -> list[GUID]:
+    with batch(connection):
+        return add_prices(connection, prices)
+
+
+async def aadd_prices(
+    connection: AsyncConnection, prices: Iterable[NewPrice]
+) -> list[GUID]:
+    """Insert `prices` like add_prices() and commit. A cancelled call
+    inserts none of the prices, unless the commit already happened."""
+    return await connection.run(_add_prices_committed, list(prices))
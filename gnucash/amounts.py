@@ -0,0 +1,64 @@
+"""
+Exact amounts as integers in units of 10**-precision of a commodity. GnuCash
+stores amounts as num/denom with decimal denominators, so they convert to
+plain ints and can be summed at integer speed without float drift. Amounts
+that are not representable at the chosen precision fall back to Fraction.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from fractions import Fraction
+from typing import TypeAlias
+
+from gnucash import GnuCashData, Split
+
+Amount: TypeAlias = int | Fraction
+
+
+def to_fixed(num: int, denom: int, precision: int) -> Amount:
+    """Return num/denom in units of 10**-precision."""
+    scaled: int = num * 10**precision
+    units, remainder = divmod(scaled, denom)
+    if remainder == 0:
+        return units
+    return Fraction(scaled, denom)
+
+
+def to_float(amount: Amount, precision: int) -> float:
+    """Convert an amount in units of 10**-precision back to a float."""
+    return float(Fraction(amount) / 10**precision)
+
+
+def sum_fixed(fractions: Iterable[tuple[int, int]], precision: int) -> Amount:
+    """Sum num/denom pairs exactly. Numerators are added per denominator so
+    the conversion to fixed point happens once per distinct denominator."""
+    by_denom: dict[int, int] = {}
+    for num, denom in fractions:
+        by_denom[denom] = by_denom.get(denom, 0) + num
+    total: Amount = 0
+    for denom, num in by_denom.items():
+        total += to_fixed(num, denom, precision)
+    return total
+
+
+def split_value(split: Split, precision: int) -> Amount:
+    return to_fixed(split.value_num, split.value_denom, precision)
+
+
+def split_quantity(split: Split, precision: int) -> Amount:
+    return to_fixed(split.quantity_num, split.quantity_denom, precision)
+
+
+def sum_values(splits: Iterable[Split], precision: int) -> Amount:
+    return sum_fixed(((s.value_num, s.value_denom) for s in splits), precision)
+
+
+def sum_quantities(splits: Iterable[Split], precision: int) -> Amount:
+    return sum_fixed(((s.quantity_num, s.quantity_denom) for s in splits), precision)
+
+
+def book_precision(data: GnuCashData) -> int:
+    """Return the largest commodity precision in `data`; all decimal amounts
+    of the book are exact integers at this precision."""
+    return max((c.precision for c in data.commodities.values()), default=2)
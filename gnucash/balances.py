@@ -0,0 +1,147 @@
+"""
+Balance index answering "balance of an account (or account subtree) at a
+point in time" with a binary search over per-account prefix sums.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from heapq import merge
+from operator import itemgetter
+from typing import Literal
+
+from gnucash import GUID, Account, GnuCashData
+from gnucash.amounts import Amount, book_precision, split_quantity, split_value
+
+Column = Literal["quantity", "value"]
+
+
+@dataclass(slots=True)
+class BalanceSeries:
+    """Running balance of an account. Entry `i` holds the balance after all
+    splits posted at or before `dates[i]` (seconds since epoch, UTC)."""
+
+    dates: list[int] = field(default_factory=list)
+    quantities: list[Amount] = field(default_factory=list)
+    values: list[Amount] = field(default_factory=list)
+
+    def at(self, epoch: int, column: Column = "quantity") -> Amount:
+        i = bisect_right(self.dates, epoch)
+        if i == 0:
+            return 0
+        return self.quantities[i - 1] if column == "quantity" else self.values[i - 1]
+
+    def deltas(self) -> Iterator[tuple[int, Amount, Amount]]:
+        quantity: Amount = 0
+        value: Amount = 0
+        for date, q, v in zip(self.dates, self.quantities, self.values, strict=True):
+            yield date, q - quantity, v - value
+            quantity = q
+            value = v
+
+
+def _cumulate(entries: Iterable[tuple[int, Amount, Amount]]) -> BalanceSeries:
+    """Build a BalanceSeries from date-sorted (date, quantity, value) deltas.
+    Entries with the same date are collapsed."""
+    series = BalanceSeries()
+    dates = series.dates
+    quantities = series.quantities
+    values = series.values
+    quantity: Amount = 0
+    value: Amount = 0
+    for date, q, v in entries:
+        quantity += q
+        value += v
+        if dates and dates[-1] == date:
+            quantities[-1] = quantity
+            values[-1] = value
+        else:
+            dates.append(date)
+            quantities.append(quantity)
+            values.append(value)
+    return series
+
+
+@dataclass(slots=True)
+class BalanceIndex:
+    """Balances in units of 10**-precision (see gnucash.amounts). Quantities
+    are in the account commodity, values in the transaction currency. Subtree
+    balances add up the accounts as is; they are only meaningful when the
+    subtree uses a single commodity."""
+
+    precision: int
+    accounts: dict[GUID, BalanceSeries] = field(default_factory=dict)
+    _subtrees: dict[GUID, BalanceSeries] = field(default_factory=dict)
+
+    def series(self, account: Account, subtree: bool = False) -> BalanceSeries:
+        if not subtree or not account.childs:
+            return self.accounts.get(account.guid) or BalanceSeries()
+        series = self._subtrees.get(account.guid)
+        if series is None:
+            parts = [self.series(account, subtree=False)]
+            parts.extend(self.series(child, subtree=True) for child in account.childs)
+            series = _cumulate(
+                merge(*(part.deltas() for part in parts), key=itemgetter(0))
+            )
+            self._subtrees[account.guid] = series
+        return series
+
+    def balance(
+        self,
+        account: Account,
+        when: datetime | None = None,
+        column: Column = "quantity",
+        subtree: bool = False,
+    ) -> Amount:
+        """Return the balance of `account` including all splits posted at or
+        before `when` (all splits if `when` is None)."""
+        series = self.series(account, subtree)
+        if when is None:
+            if not series.dates:
+                return 0
+            return series.quantities[-1] if column == "quantity" else series.values[-1]
+        return series.at(int(when.timestamp()), column)
+
+    def balances(
+        self,
+        account: Account,
+        dates: Sequence[datetime],
+        column: Column = "quantity",
+        subtree: bool = False,
+    ) -> list[Amount]:
+        series = self.series(account, subtree)
+        return [series.at(int(when.timestamp()), column) for when in dates]
+
+
+def build_balance_index(
+    data: GnuCashData, precision: int | None = None
+) -> BalanceIndex:
+    """Build a BalanceIndex from `data`. The splits must have been loaded with
+    their num/denom amounts (see gnucash.Projection). `precision` defaults to
+    gnucash.amounts.book_precision(data)."""
+    if precision is None:
+        precision = book_precision(data)
+    index = BalanceIndex(precision)
+    for account in data.accounts.values():
+        if not account.splits:
+            continue
+        try:
+            entries = sorted(
+                (
+                    (
+                        split.transaction.post_date_epoch,
+                        split_quantity(split, precision),
+                        split_value(split, precision),
+                    )
+                    for split in account.splits
+                ),
+                key=itemgetter(0),
+            )
+        except ZeroDivisionError:
+            # Splits loaded with Projection(amounts="float") have 0/0.
+            raise ValueError("Balance index requires num/denom amounts") from None
+        index.accounts[account.guid] = _cumulate(entries)
+    return index
@@ -0,0 +1,156 @@
+"""
+Columnar view of the splits in a GnuCashData, backed by NumPy arrays. This
+allows computing balances and rollups vectorized instead of walking Split
+objects. Requires numpy.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from numpy.typing import NDArray
+
+from gnucash import GUID, GnuCashData
+
+
+@dataclass(slots=True)
+class SplitTable:
+    # One entry per split.
+    guids: list[GUID]
+    value_num: NDArray[np.int64]
+    value_denom: NDArray[np.int64]
+    quantity_num: NDArray[np.int64]
+    quantity_denom: NDArray[np.int64]
+    # Seconds since epoch (UTC) of the transaction post_date.
+    post_date: NDArray[np.int64]
+    # Indexes into `accounts`, `transactions` and `commodities`. `commodity` is
+    # the account commodity (unit of the quantity), `currency` the transaction
+    # currency (unit of the value). -1 if there is no commodity.
+    account: NDArray[np.int32]
+    transaction: NDArray[np.int32]
+    commodity: NDArray[np.int32]
+    currency: NDArray[np.int32]
+
+    # GUID <-> index maps.
+    accounts: list[GUID]
+    account_index: dict[GUID, int]
+    transactions: list[GUID]
+    transaction_index: dict[GUID, int]
+    commodities: list[GUID]
+    commodity_index: dict[GUID, int]
+
+    def __len__(self) -> int:
+        return len(self.guids)
+
+    def values(self) -> NDArray[np.float64]:
+        return self.value_num / self.value_denom
+
+    def quantities(self) -> NDArray[np.float64]:
+        return self.quantity_num / self.quantity_denom
+
+    def _amounts(self, column: str) -> NDArray[np.float64]:
+        if column == "value":
+            return self.values()
+        if column == "quantity":
+            return self.quantities()
+        raise ValueError(f"Unknown amount column '{column}'")
+
+    def account_sums(
+        self, column: str = "quantity", until: datetime | None = None
+    ) -> NDArray[np.float64]:
+        """Sum `column` ("value" or "quantity") per account, optionally only
+        for splits posted before `until`. Indexed like `accounts`."""
+        amounts = self._amounts(column)
+        account = self.account
+        if until is not None:
+            mask = self.post_date < int(until.timestamp())
+            amounts = amounts[mask]
+            account = account[mask]
+        sums = np.bincount(account, weights=amounts, minlength=len(self.accounts))
+        return sums.astype(np.float64, copy=False)
+
+    def period_sums(
+        self, boundaries: list[datetime], column: str = "quantity"
+    ) -> NDArray[np.float64]:
+        """Sum `column` per account and period. Period `i` covers
+        [boundaries[i], boundaries[i+1]); splits outside are ignored. Returns
+        an (accounts x periods) matrix."""
+        edges = np.array([int(b.timestamp()) for b in boundaries], dtype=np.int64)
+        n_periods = max(len(edges) - 1, 0)
+        period = np.searchsorted(edges, self.post_date, side="right") - 1
+        mask = (period >= 0) & (period < n_periods)
+        cell = self.account[mask].astype(np.int64) * n_periods + period[mask]
+        sums = np.bincount(
+            cell,
+            weights=self._amounts(column)[mask],
+            minlength=len(self.accounts) * n_periods,
+        )
+        return sums.astype(np.float64, copy=False).reshape(
+            len(self.accounts), n_periods
+        )
+
+
+def build_split_table(data: GnuCashData) -> SplitTable:
+    """Build a SplitTable from `data`. The splits must have been loaded with
+    their num/denom amounts (see gnucash.Projection)."""
+    accounts = list(data.accounts.keys())
+    account_index = {guid: i for i, guid in enumerate(accounts)}
+    transactions = list(data.transactions.keys())
+    transaction_index = {guid: i for i, guid in enumerate(transactions)}
+    commodities = list(data.commodities.keys())
+    commodity_index = {guid: i for i, guid in enumerate(commodities)}
+
+    tx_dates = np.fromiter(
+        (t.post_date_epoch for t in data.transactions.values()),
+        dtype=np.int64,
+        count=len(transactions),
+    )
+    tx_currency = np.fromiter(
+        (commodity_index[t.currency.guid] for t in data.transactions.values()),
+        dtype=np.int32,
+        count=len(transactions),
+    )
+    acc_commodity = np.fromiter(
+        (
+            -1 if a._commodity is None else commodity_index[a._commodity.guid]
+            for a in data.accounts.values()
+        ),
+        dtype=np.int32,
+        count=len(accounts),
+    )
+
+    splits = data.splits.values()
+    count = len(splits)
+    value_num = np.fromiter((s.value_num for s in splits), np.int64, count)
+    value_denom = np.fromiter((s.value_denom for s in splits), np.int64, count)
+    quantity_num = np.fromiter((s.quantity_num for s in splits), np.int64, count)
+    quantity_denom = np.fromiter((s.quantity_denom for s in splits), np.int64, count)
+    if np.any(value_denom == 0) or np.any(quantity_denom == 0):
+        raise ValueError("Split table requires num/denom amounts")
+
+    account = np.fromiter(
+        (account_index[s.account.guid] for s in splits), np.int32, count
+    )
+    transaction = np.fromiter(
+        (transaction_index[s.transaction.guid] for s in splits), np.int32, count
+    )
+    return SplitTable(
+        guids=list(data.splits.keys()),
+        value_num=value_num,
+        value_denom=value_denom,
+        quantity_num=quantity_num,
+        quantity_denom=quantity_denom,
+        post_date=tx_dates[transaction],
+        account=account,
+        transaction=transaction,
+        commodity=acc_commodity[account],
+        currency=tx_currency[transaction],
+        accounts=accounts,
+        account_index=account_index,
+        transactions=transactions,
+        transaction_index=transaction_index,
+        commodities=commodities,
+        commodity_index=commodity_index,
+    )
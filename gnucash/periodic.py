@@ -0,0 +1,181 @@
+"""
+Periodic reports: sums of split amounts per account and month, quarter or
+(fiscal) year, computed in a single pass over the transactions.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Collection
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Literal
+
+from gnucash import GUID, Account, GnuCashData
+from gnucash.amounts import Amount, book_precision, to_fixed
+
+_PERIOD_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+
+
+@dataclass(slots=True, frozen=True)
+class BucketSpec:
+    """How to cut time into buckets. Quarters and years start at month
+    `fiscal_year_start` (1 = January); a fiscal year is named after the
+    calendar year it starts in. Dates are bucketed in UTC."""
+
+    period: Literal["month", "quarter", "year"] = "month"
+    fiscal_year_start: int = 1
+
+    def __post_init__(self) -> None:
+        if self.period not in _PERIOD_MONTHS:
+            raise ValueError(f"Unknown period '{self.period}'")
+        if not 1 <= self.fiscal_year_start <= 12:
+            raise ValueError("fiscal_year_start must be a month (1-12)")
+
+    def bucket(self, when: datetime) -> int:
+        """Return the ordinal of the bucket containing `when`. Consecutive
+        buckets have consecutive ordinals."""
+        when = when.astimezone(UTC)
+        months = when.year * 12 + when.month - self.fiscal_year_start
+        return months // _PERIOD_MONTHS[self.period]
+
+    def start(self, bucket: int) -> datetime:
+        months = bucket * _PERIOD_MONTHS[self.period] + self.fiscal_year_start - 1
+        return datetime(months // 12, months % 12 + 1, 1, tzinfo=UTC)
+
+    def label(self, bucket: int) -> str:
+        if self.period == "month":
+            return self.start(bucket).strftime("%Y-%m")
+        months = bucket * _PERIOD_MONTHS[self.period]
+        year = months // 12
+        if self.period == "year":
+            return f"{year}"
+        return f"{year}Q{months % 12 // 3 + 1}"
+
+
+@dataclass(slots=True)
+class PeriodicReport:
+    """Dense (accounts x buckets) matrix of amounts in units of
+    10**-precision (see gnucash.amounts). Bucket `j` has ordinal
+    `first_bucket + j`."""
+
+    spec: BucketSpec
+    precision: int
+    accounts: list[Account]
+    first_bucket: int
+    matrix: list[list[Amount]]
+    row_index: dict[GUID, int] = field(default_factory=dict)
+
+    @property
+    def buckets(self) -> range:
+        width = len(self.matrix[0]) if self.matrix else 0
+        return range(self.first_bucket, self.first_bucket + width)
+
+    def labels(self) -> list[str]:
+        return [self.spec.label(bucket) for bucket in self.buckets]
+
+    def row(self, account: Account) -> list[Amount]:
+        return self.matrix[self.row_index[account.guid]]
+
+    def totals(self) -> list[Amount]:
+        """Return the sum over all accounts per bucket."""
+        return [sum(column, start=0) for column in zip(*self.matrix, strict=True)]
+
+
+def _ancestor(account: Account, depth: int) -> Account:
+    """Return the ancestor of `account` at `depth` (top-level accounts have
+    depth 1), or `account` if it is not deeper than that."""
+    path = [account]
+    while path[-1].parent is not None:
+        path.append(path[-1].parent)
+    # path[-1] is the root account at depth 0.
+    if len(path) - 1 <= depth:
+        return account
+    return path[-1 - depth]
+
+
+def periodic_report(
+    data: GnuCashData,
+    spec: BucketSpec | None = None,
+    depth: int | None = None,
+    account_types: Collection[str] | None = None,
+    column: Literal["value", "quantity"] = "value",
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    precision: int | None = None,
+) -> PeriodicReport:
+    """Sum `column` of the splits per account and bucket. With `depth`, the
+    splits of deeper accounts are added to their ancestor at that depth.
+    `account_types` restricts the splits to accounts of these types. Only
+    splits with start_date <= post_date < end_date are counted; the report
+    spans these dates if given and the posted splits otherwise. The splits
+    must have been loaded with their num/denom amounts (see
+    gnucash.Projection)."""
+    if spec is None:
+        spec = BucketSpec()
+    if precision is None:
+        precision = book_precision(data)
+    start_epoch = None if start_date is None else int(start_date.timestamp())
+    end_epoch = None if end_date is None else int(end_date.timestamp())
+
+    # Map each account to the row it is reported in. Root accounts hold no
+    # splits and are left out.
+    row_of: dict[GUID, int] = {}
+    row_index: dict[GUID, int] = {}
+    accounts: list[Account] = []
+    for account in data.accounts.values():
+        if account.parent is None:
+            continue
+        if account_types is not None and account.type not in account_types:
+            continue
+        target = account if depth is None else _ancestor(account, depth)
+        row = row_index.get(target.guid)
+        if row is None:
+            row = len(accounts)
+            row_index[target.guid] = row
+            accounts.append(target)
+        row_of[account.guid] = row
+
+    # Single pass: accumulate sparse cells, one bucket lookup per transaction.
+    cells: dict[tuple[int, int], Amount] = {}
+    for trans in data.transactions.values():
+        epoch = trans.post_date_epoch
+        if start_epoch is not None and epoch < start_epoch:
+            continue
+        if end_epoch is not None and epoch >= end_epoch:
+            continue
+        bucket: int | None = None
+        for split in trans.splits:
+            row = row_of.get(split.account.guid)
+            if row is None:
+                continue
+            if bucket is None:
+                bucket = spec.bucket(trans.post_date)
+            if column == "value":
+                amount = to_fixed(split.value_num, split.value_denom, precision)
+            else:
+                amount = to_fixed(split.quantity_num, split.quantity_denom, precision)
+            key = (row, bucket)
+            cells[key] = cells.get(key, 0) + amount
+
+    last = None if end_date is None else spec.bucket(end_date - timedelta(seconds=1))
+    if start_date is not None:
+        first = spec.bucket(start_date)
+    elif cells:
+        first = min(bucket for _, bucket in cells)
+    else:
+        # No splits and no start date: an empty range, not one from year 0.
+        first = 0 if last is None else last + 1
+    if last is None:
+        last = max((bucket for _, bucket in cells), default=first - 1)
+    width = max(last - first + 1, 0)
+    matrix: list[list[Amount]] = [[0] * width for _ in accounts]
+    for (row, bucket), amount in cells.items():
+        matrix[row][bucket - first] = amount
+    return PeriodicReport(
+        spec=spec,
+        precision=precision,
+        accounts=accounts,
+        first_bucket=first,
+        matrix=matrix,
+        row_index=row_index,
+    )
@@ -0,0 +1,97 @@
+"""
+Price index answering as-of, per-day, latest and range queries per
+commodity/currency pair with binary search.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, time
+
+from gnucash import GUID, Commodity, GnuCashData, Price
+
+
+@dataclass(slots=True)
+class PriceSeries:
+    """Prices of one commodity in one currency, sorted by date."""
+
+    dates: list[datetime] = field(default_factory=list)
+    prices: list[Price] = field(default_factory=list)
+
+    def as_of(self, when: datetime) -> Price | None:
+        """Return the latest price at or before `when`."""
+        i = bisect_right(self.dates, when)
+        if i == 0:
+            return None
+        return self.prices[i - 1]
+
+    def on_day(self, day: date) -> Price | None:
+        """Return the first price on `day` (UTC)."""
+        i = bisect_left(self.dates, datetime.combine(day, time.min, tzinfo=UTC))
+        if i < len(self.dates) and self.dates[i].date() == day:
+            return self.prices[i]
+        return None
+
+    def latest(self) -> Price | None:
+        if not self.prices:
+            return None
+        return self.prices[-1]
+
+    def between(self, start: datetime, end: datetime) -> list[Price]:
+        """Return the prices with start <= date < end."""
+        lo = bisect_left(self.dates, start)
+        hi = bisect_left(self.dates, end, lo)
+        return self.prices[lo:hi]
+
+
+@dataclass(slots=True)
+class PriceIndex:
+    series: dict[tuple[GUID, GUID], PriceSeries] = field(default_factory=dict)
+    by_commodity: dict[GUID, list[PriceSeries]] = field(default_factory=dict)
+
+    def get(self, commodity: Commodity, currency: Commodity) -> PriceSeries | None:
+        return self.series.get((commodity.guid, currency.guid))
+
+    def as_of(
+        self, commodity: Commodity, currency: Commodity, when: datetime
+    ) -> Price | None:
+        series = self.get(commodity, currency)
+        return None if series is None else series.as_of(when)
+
+    def on_day(
+        self, commodity: Commodity, currency: Commodity, day: date
+    ) -> Price | None:
+        series = self.get(commodity, currency)
+        return None if series is None else series.on_day(day)
+
+    def latest(
+        self, commodity: Commodity, currency: Commodity | None = None
+    ) -> Price | None:
+        """Return the latest price of `commodity` in `currency`, or in any
+        currency if `currency` is None."""
+        if currency is not None:
+            series = self.get(commodity, currency)
+            return None if series is None else series.latest()
+        latest: Price | None = None
+        for series in self.by_commodity.get(commodity.guid, ()):
+            price = series.latest()
+            if price is not None and (latest is None or price.date >= latest.date):
+                latest = price
+        return latest
+
+
+def build_price_index(data: GnuCashData) -> PriceIndex:
+    index = PriceIndex()
+    for price in data.prices.values():
+        key = (price.commodity.guid, price.currency.guid)
+        series = index.series.get(key)
+        if series is None:
+            series = PriceSeries()
+            index.series[key] = series
+            index.by_commodity.setdefault(key[0], []).append(series)
+        series.prices.append(price)
+    for series in index.series.values():
+        series.prices.sort(key=lambda price: price.date)
+        series.dates = [price.date for price in series.prices]
+    return index
@@ -0,0 +1,340 @@
+"""
+Incremental reload of a book that changed on disk. Each table is split into
+chunks by the first hex digits of the GUIDs. SQLite computes the row count
+and a checksum of the loaded columns of each chunk; only the rows of chunks
+whose checksum changed are read and compared with the loaded objects. When
+the book file did not change at all, nothing is read.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlite3 import Connection, Cursor
+from typing import Any
+
+from gnucash import (
+    GUID,
+    GnuCashData,
+    Projection,
+    _accounts_sql,
+    _check_projection,
+    _commodities_sql,
+    _database_path,
+    _placeholders,
+    _prepare_compact,
+    _prices_sql,
+    _read_accounts,
+    _read_commodities,
+    _read_prices,
+    _read_splits,
+    _read_transactions,
+    _splits_sql,
+    _string_table,
+    _time_format,
+    _transactions_sql,
+    guid_hex,
+    invalidate_account_paths,
+)
+from gnucash.snapshot import SnapshotKey, snapshot_key
+
+# Hex digits of the GUID prefix that selects the chunk of a row.
+_CHUNK_DIGITS = 3
+
+# Parent tables first, so inserted rows find the objects they refer to.
+_TABLES = ("commodities", "accounts", "transactions", "splits", "prices")
+
+# Fields compared to tell updated objects from unchanged ones; lists of
+# child objects are maintained by refresh() itself.
+_STATE_FIELDS = {
+    "commodities": (
+        "fullname",
+        "mnemonic",
+        "namespace",
+        "precision",
+        "quote_flag",
+        "quote_source",
+    ),
+    "accounts": ("name", "parent", "description", "_commodity", "type"),
+    "transactions": ("_currency", "num", "_post_date", "description"),
+    "splits": (
+        "_transaction",
+        "_account",
+        "value_num",
+        "value_denom",
+        "value",
+        "quantity_num",
+        "quantity_denom",
+        "quantity",
+        "memo",
+    ),
+    "prices": ("_commodity", "_currency", "_date", "value_num", "value_denom", "value"),
+}
+
+# Columns that read_data() uses; changes to other columns are ignored.
+_COLUMNS = {
+    "commodities": (
+        "guid",
+        "namespace",
+        "mnemonic",
+        "fullname",
+        "fraction",
+        "quote_flag",
+        "quote_source",
+    ),
+    "accounts": (
+        "guid",
+        "name",
+        "account_type",
+        "commodity_guid",
+        "parent_guid",
+        "description",
+    ),
+    "transactions": ("guid", "currency_guid", "num", "post_date", "description"),
+    "splits": (
+        "guid",
+        "tx_guid",
+        "account_guid",
+        "memo",
+        "value_num",
+        "value_denom",
+        "quantity_num",
+        "quantity_denom",
+    ),
+    "prices": (
+        "guid",
+        "commodity_guid",
+        "currency_guid",
+        "date",
+        "value_num",
+        "value_denom",
+    ),
+}
+
+_Fingerprint = dict[str, tuple[int, int]]
+
+
+@dataclass(slots=True)
+class TableChanges:
+    inserted: list[GUID] = field(default_factory=list)
+    updated: list[GUID] = field(default_factory=list)
+    deleted: list[GUID] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+@dataclass(slots=True)
+class ChangeSet:
+    """GUIDs of the rows refresh() found inserted, updated or deleted."""
+
+    commodities: TableChanges = field(default_factory=TableChanges)
+    accounts: TableChanges = field(default_factory=TableChanges)
+    transactions: TableChanges = field(default_factory=TableChanges)
+    splits: TableChanges = field(default_factory=TableChanges)
+    prices: TableChanges = field(default_factory=TableChanges)
+
+    def table(self, name: str) -> TableChanges:
+        changes: TableChanges = getattr(self, name)
+        return changes
+
+    def __len__(self) -> int:
+        return sum(len(self.table(name)) for name in _TABLES)
+
+
+def _row_hash(*values: object) -> int:
+    # Only compared within this process, so the randomized hash() is fine.
+    return hash(values) & 0xFFFFFFFF
+
+
+def _fingerprint(c: Cursor, table: str) -> _Fingerprint:
+    """Return the row count and the sum of the row hashes per chunk."""
+    return {
+        chunk: (count, checksum)
+        for chunk, count, checksum in c.execute(
+            f"SELECT substr(guid, 1, {_CHUNK_DIGITS}), count(*), "
+            f"sum(_pygnucash_hash({', '.join(_COLUMNS[table])})) "
+            f"FROM {table} GROUP BY 1"
+        )
+    }
+
+
+def _comparable(value: Any) -> Any:
+    # Dates are datetimes or, until first read, epoch ints (see
+    # Projection.lazy_dates), depending on whether they were looked at.
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return getattr(value, "guid", value)
+
+
+def _state(obj: Any, names: tuple[str, ...]) -> tuple[Any, ...]:
+    """Return the fields `names` of `obj` with references replaced by GUIDs
+    and dates by epoch seconds."""
+    return tuple(_comparable(getattr(obj, name)) for name in names)
+
+
+def _remove(objects: list[Any], obj: object) -> None:
+    """Remove `obj` from `objects` by identity (GUIDs of compact books do not
+    support the == of the objects)."""
+    for i, other in enumerate(objects):
+        if other is obj:
+            del objects[i]
+            return
+
+
+def _detach(table: str, obj: Any) -> None:
+    """Remove `obj` from the lists that link it to other objects."""
+    if table == "accounts":
+        if obj.parent is not None:
+            _remove(obj.parent.childs, obj)
+    elif table == "splits":
+        if obj._transaction is not None:
+            _remove(obj._transaction.splits, obj)
+        if obj._account is not None:
+            _remove(obj._account.splits, obj)
+    elif table == "prices" and obj._commodity is not None:
+        _remove(obj._commodity.prices, obj)
+
+
+def _file_key(connection: Connection) -> SnapshotKey | None:
+    """Return the state of the file behind `connection`, or None for
+    in-memory databases and while `connection` has uncommitted writes,
+    which the file does not show yet."""
+    if connection.in_transaction:
+        return None
+    path = _database_path(connection)
+    return None if path is None else snapshot_key(path)
+
+
+def _register_hash(connection: Connection) -> None:
+    connection.create_function("_pygnucash_hash", -1, _row_hash, deterministic=True)
+
+
+def track_changes(data: GnuCashData, connection: Connection) -> None:
+    """Record the book behind `connection` as the state `data` was loaded
+    from, so that the first refresh() does not have to compare every row.
+    Call it right after loading, before the book can change."""
+    _register_hash(connection)
+    # Taken first: a commit in between only causes a needless comparison.
+    data._fingerprints_key = _file_key(connection)
+    c = connection.cursor()
+    for table in _TABLES:
+        data._fingerprints[table] = _fingerprint(c, table)
+
+
+def refresh(
+    data: GnuCashData, connection: Connection, projection: Projection | None = None
+) -> ChangeSet:
+    """Bring `data`, loaded without a LoadFilter and with `projection`, up to
+    date with the book behind `connection`. Objects are updated in place and
+    keep their identity; inserted objects are appended to the splits, prices
+    and childs lists they belong to.
+
+    Only the rows of chunks that changed since the previous call (or since
+    track_changes()) are compared; without either, every row is."""
+    projection = _check_projection(projection)
+    if projection.compact != data._compact:
+        raise ValueError("projection does not match the loaded book")
+    key = _file_key(connection)
+    if key is not None and key == data._fingerprints_key:
+        return ChangeSet()
+    _register_hash(connection)
+    if projection.compact:
+        _prepare_compact(connection)
+    strings = _string_table(projection)
+    c = connection.cursor()
+    tx_format = _time_format(c, "transactions", "post_date")
+    price_format = _time_format(c, "prices", "date")
+    queries: dict[str, Callable[[str], str]] = {
+        "commodities": lambda where: _commodities_sql(projection, where),
+        "accounts": lambda where: _accounts_sql(projection, where),
+        "transactions": lambda where: _transactions_sql(projection, where, tx_format),
+        "splits": lambda where: _splits_sql(projection, where),
+        "prices": lambda where: _prices_sql(projection, where, price_format),
+    }
+    linkers: dict[str, Callable[[Iterable[Any], GnuCashData], None]] = {
+        "commodities": lambda rows, d: _read_commodities(rows, d, strings),
+        "accounts": lambda rows, d: _read_accounts(rows, d, strings),
+        "transactions": lambda rows, d: _read_transactions(
+            rows, d, projection, strings
+        ),
+        "splits": lambda rows, d: _read_splits(rows, d, projection, strings),
+        "prices": lambda rows, d: _read_prices(rows, d, projection),
+    }
+
+    changes = ChangeSet()
+    # Read all tables from the same state of the book.
+    begin = not connection.in_transaction
+    if begin:
+        c.execute("BEGIN")
+    try:
+        for table in _TABLES:
+            objects: dict[GUID, Any] = getattr(data, table)
+            old = data._fingerprints.get(table)
+            new = _fingerprint(c, table)
+            if old is None:
+                chunks = None
+                where = ""
+                params: list[str] = []
+            else:
+                chunks = {
+                    chunk
+                    for chunk in old.keys() | new.keys()
+                    if old.get(chunk) != new.get(chunk)
+                }
+                if not chunks:
+                    continue
+                params = sorted(chunks)
+                where = (
+                    f" WHERE substr(guid, 1, {_CHUNK_DIGITS}) "
+                    f"IN ({_placeholders(params)})"
+                )
+            rows = c.execute(queries[table](where), params).fetchall()
+
+            # Link the rows into a scratch book to compare them with the
+            # loaded objects. The scratch book also holds placeholders for
+            # referenced objects, which are not part of the fetched rows.
+            scratch = GnuCashData()
+            linkers[table](rows, scratch)
+            linked: dict[GUID, Any] = getattr(scratch, table)
+            fetched = {row[0] for row in rows}
+            names = _STATE_FIELDS[table]
+            table_changes = changes.table(table)
+            for guid in fetched:
+                obj = linked[guid]
+                current = objects.get(guid)
+                if current is None:
+                    table_changes.inserted.append(guid)
+                elif _state(current, names) != _state(obj, names):
+                    table_changes.updated.append(guid)
+            for guid in objects:
+                if guid not in fetched and (
+                    chunks is None or guid_hex(guid)[:_CHUNK_DIGITS] in chunks
+                ):
+                    table_changes.deleted.append(guid)
+
+            for guid in table_changes.updated:
+                _detach(table, objects[guid])
+            for guid in table_changes.deleted:
+                _detach(table, objects.pop(guid))
+            upserts = set(table_changes.inserted)
+            upserts.update(table_changes.updated)
+            if upserts:
+                linkers[table]((row for row in rows if row[0] in upserts), data)
+            if table == "prices":
+                commodities = {
+                    id(objects[guid].commodity): objects[guid].commodity
+                    for guid in upserts
+                }
+                for commodity in commodities.values():
+                    commodity.prices.sort(key=lambda price: price.date_epoch)
+            data._fingerprints[table] = new
+        data._fingerprints_key = key
+    finally:
+        if begin:
+            connection.commit()
+
+    if changes.accounts:
+        invalidate_account_paths(data)
+    return changes
@@ -0,0 +1,514 @@
+"""
+Unit of work for writing to a book. A Session collects new accounts,
+transactions, splits and prices and changes to loaded objects. flush()
+checks that every affected transaction balances, writes everything with
+one executemany() per table and statement kind in a single database
+transaction, and only then links the objects into the GnuCashData they
+belong to.
+"""
+
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime
+from fractions import Fraction
+from sqlite3 import Connection
+from types import TracebackType
+from typing import Any, Self
+
+from gnucash import (
+    _TIME_FORMAT_GC3,
+    GUID,
+    Account,
+    Commodity,
+    GnuCashData,
+    Price,
+    Split,
+    Transaction,
+    _from_epoch,
+    _time_format,
+    batch,
+    guid_hex,
+    invalidate_account_paths,
+)
+
+# Fields update() accepts per type, and the slots they are stored in.
+_UPDATABLE: dict[type, dict[str, str]] = {
+    Account: {
+        "name": "name",
+        "parent": "parent",
+        "description": "description",
+        "commodity": "_commodity",
+        "type": "type",
+    },
+    Transaction: {
+        "currency": "_currency",
+        "num": "num",
+        "post_date": "_post_date",
+        "description": "description",
+    },
+    Split: {
+        "transaction": "_transaction",
+        "account": "_account",
+        "memo": "memo",
+        "value_num": "value_num",
+        "value_denom": "value_denom",
+        "quantity_num": "quantity_num",
+        "quantity_denom": "quantity_denom",
+    },
+    Price: {
+        "commodity": "_commodity",
+        "currency": "_currency",
+        "date": "_date",
+        "value_num": "value_num",
+        "value_denom": "value_denom",
+    },
+}
+
+# Table and column names of the slots that update() changes.
+_COLUMNS: dict[type, tuple[str, dict[str, str]]] = {
+    Account: (
+        "accounts",
+        {
+            "name": "name",
+            "parent": "parent_guid",
+            "description": "description",
+            "_commodity": "commodity_guid",
+            "type": "account_type",
+        },
+    ),
+    Transaction: (
+        "transactions",
+        {
+            "_currency": "currency_guid",
+            "num": "num",
+            "_post_date": "post_date",
+            "description": "description",
+        },
+    ),
+    Split: (
+        "splits",
+        {
+            "_transaction": "tx_guid",
+            "_account": "account_guid",
+            "memo": "memo",
+            "value_num": "value_num",
+            "value_denom": "value_denom",
+            "quantity_num": "quantity_num",
+            "quantity_denom": "quantity_denom",
+        },
+    ),
+    Price: (
+        "prices",
+        {
+            "_commodity": "commodity_guid",
+            "_currency": "currency_guid",
+            "_date": "date",
+            "value_num": "value_num",
+            "value_denom": "value_denom",
+        },
+    ),
+}
+
+_Object = Account | Transaction | Split | Price
+
+
+def _ref(obj: Account | Commodity | Transaction | None) -> str | None:
+    return None if obj is None else guid_hex(obj.guid)
+
+
+def _print(time: datetime | int, time_format: str) -> str:
+    if isinstance(time, int):
+        time = _from_epoch(time)
+    return time.astimezone(UTC).strftime(time_format)
+
+
+def _remove(objects: list[Any], obj: object) -> None:
+    for i, other in enumerate(objects):
+        if other is obj:
+            del objects[i]
+            return
+
+
+class Session:
+    """Collects writes to the book behind `connection`, which `data` was
+    loaded from. Use it as a context manager to flush() when the block
+    completes and to discard the pending writes if it raises.
+
+    New objects get their GUID right away so they can refer to each other,
+    but are only added to `data` (and to Account.splits, Transaction.splits,
+    Account.childs and Commodity.prices) by a successful flush(). Likewise
+    update() only changes loaded objects once the changes are committed."""
+
+    def __init__(self, connection: Connection, data: GnuCashData) -> None:
+        self.connection = connection
+        self.data = data
+        self._accounts: list[Account] = []
+        self._transactions: list[Transaction] = []
+        self._splits: list[Split] = []
+        self._prices: list[Price] = []
+        self._new: set[int] = set()
+        # Source and type of new prices, which Price does not hold.
+        self._price_columns: dict[int, tuple[str, str]] = {}
+        # id() of a loaded object -> the object and its pending changes
+        self._changes: dict[int, tuple[_Object, dict[str, Any]]] = {}
+
+    def _guid(self) -> GUID:
+        guid = uuid.uuid4()
+        return guid.bytes if self.data._compact else guid.hex
+
+    def new_account(
+        self,
+        name: str,
+        parent: Account,
+        type: str,
+        commodity: Commodity | None = None,
+        description: str = "",
+    ) -> Account:
+        """Create an account below `parent`; `commodity` defaults to the one
+        of `parent`."""
+        account = Account(
+            guid=self._guid(),
+            name=name,
+            parent=parent,
+            description=description,
+            _commodity=commodity if commodity is not None else parent._commodity,
+            type=type,
+        )
+        self._accounts.append(account)
+        self._new.add(id(account))
+        return account
+
+    def new_transaction(
+        self,
+        currency: Commodity,
+        post_date: datetime,
+        description: str = "",
+        num: str = "",
+    ) -> Transaction:
+        trans = Transaction(
+            guid=self._guid(),
+            _currency=currency,
+            num=num,
+            post_date=post_date,
+            description=description,
+        )
+        self._transactions.append(trans)
+        self._new.add(id(trans))
+        return trans
+
+    def new_split(
+        self,
+        transaction: Transaction,
+        account: Account,
+        value_num: int,
+        value_denom: int,
+        quantity_num: int | None = None,
+        quantity_denom: int | None = None,
+        memo: str = "",
+    ) -> Split:
+        """Create a split of `value_num`/`value_denom` in the currency of
+        `transaction`. The quantity, in the commodity of `account`, defaults
+        to the value."""
+        if quantity_num is None or quantity_denom is None:
+            quantity_num = value_num
+            quantity_denom = value_denom
+        split = Split(
+            guid=self._guid(),
+            _transaction=transaction,
+            _account=account,
+            value_num=value_num,
+            value_denom=value_denom,
+            quantity_num=quantity_num,
+            quantity_denom=quantity_denom,
+            memo=memo,
+        )
+        self._splits.append(split)
+        self._new.add(id(split))
+        return split
+
+    def new_price(
+        self,
+        commodity: Commodity,
+        currency: Commodity,
+        date: datetime,
+        value_num: int,
+        value_denom: int,
+        source: str = "user:price",
+        type: str = "last",
+    ) -> Price:
+        price = Price(
+            guid=self._guid(),
+            _commodity=commodity,
+            _currency=currency,
+            date=date,
+            value_num=value_num,
+            value_denom=value_denom,
+        )
+        self._prices.append(price)
+        self._new.add(id(price))
+        self._price_columns[id(price)] = (source, type)
+        return price
+
+    def update(self, obj: _Object, **changes: Any) -> None:
+        """Change the fields `changes` of `obj`, e.g.
+        update(split, account=other, memo="fee"). Objects created by this
+        session are changed right away, loaded ones on flush()."""
+        fields = _UPDATABLE.get(type(obj))
+        if fields is None:
+            raise TypeError(f"cannot update {type(obj).__name__} objects")
+        unknown = changes.keys() - fields.keys()
+        if unknown:
+            raise ValueError(
+                f"cannot update {', '.join(sorted(unknown))} of {type(obj).__name__}"
+            )
+        slots = {fields[name]: value for name, value in changes.items()}
+        if id(obj) in self._new:
+            for slot, value in slots.items():
+                setattr(obj, slot, value)
+            return
+        self._changes.setdefault(id(obj), (obj, {}))[1].update(slots)
+
+    def _get(self, obj: _Object, slot: str) -> Any:
+        """Return the field `slot` of `obj` as it will be after flush()."""
+        entry = self._changes.get(id(obj))
+        if entry is not None and slot in entry[1]:
+            return entry[1][slot]
+        return getattr(obj, slot)
+
+    def _split_members(self) -> dict[int, tuple[Transaction, list[Split]]]:
+        """Return the splits the affected transactions will have."""
+        members: dict[int, tuple[Transaction, list[Split]]] = {}
+
+        def splits_of(trans: Transaction) -> list[Split]:
+            entry = members.get(id(trans))
+            if entry is None:
+                # New transactions are not linked to any split yet.
+                entry = members[id(trans)] = (trans, list(trans.splits))
+            return entry[1]
+
+        for trans in self._transactions:
+            splits_of(trans)
+        for split in self._splits:
+            splits_of(split.transaction).append(split)
+        for obj, slots in self._changes.values():
+            if isinstance(obj, Split):
+                old = obj.transaction
+                new = slots.get("_transaction", old)
+                if new is not old:
+                    _remove(splits_of(old), obj)
+                    splits_of(new).append(obj)
+                elif slots.keys() & {"value_num", "value_denom", "_account"}:
+                    splits_of(old)
+            elif isinstance(obj, Transaction) and "_currency" in slots:
+                splits_of(obj)
+        return members
+
+    def _validate(self) -> None:
+        for trans, splits in self._split_members().values():
+            name = f"Transaction {guid_hex(trans.guid)} ({trans.description!r})"
+            if not splits:
+                raise ValueError(f"{name} has no splits")
+            total = Fraction(0)
+            currency = self._get(trans, "_currency")
+            for split in splits:
+                value_denom = self._get(split, "value_denom")
+                quantity_denom = self._get(split, "quantity_denom")
+                if value_denom <= 0 or quantity_denom <= 0:
+                    raise ValueError(
+                        f"{name} has a split without a positive denominator"
+                    )
+                value = Fraction(self._get(split, "value_num"), value_denom)
+                total += value
+                account = self._get(split, "_account")
+                quantity = Fraction(self._get(split, "quantity_num"), quantity_denom)
+                if account._commodity is currency and quantity != value:
+                    raise ValueError(
+                        f"{name}: the quantity of a split in "
+                        f"{account.name} differs from its value"
+                    )
+            if total != 0:
+                raise ValueError(f"{name} does not balance: {total}")
+
+    def _write(self) -> None:
+        c = self.connection.cursor()
+        tx_format = _time_format(c, "transactions", "post_date") or _TIME_FORMAT_GC3
+        price_format = _time_format(c, "prices", "date") or _TIME_FORMAT_GC3
+        now = _print(datetime.now(UTC), tx_format)
+        c.executemany(
+            "INSERT INTO accounts(guid, name, account_type, commodity_guid, "
+            "commodity_scu, non_std_scu, parent_guid, code, description, "
+            "hidden, placeholder) VALUES (?,?,?,?,?,0,?,'',?,0,0)",
+            [
+                (
+                    guid_hex(a.guid),
+                    a.name,
+                    a.type,
+                    _ref(a._commodity),
+                    10 ** (a.commodity.precision if a._commodity else 2),
+                    _ref(a.parent),
+                    a.description,
+                )
+                for a in self._accounts
+            ],
+        )
+        c.executemany(
+            "INSERT INTO transactions(guid, currency_guid, num, post_date, "
+            "enter_date, description) VALUES (?,?,?,?,?,?)",
+            [
+                (
+                    guid_hex(t.guid),
+                    _ref(t._currency),
+                    t.num,
+                    _print(t._post_date, tx_format),
+                    now,
+                    t.description,
+                )
+                for t in self._transactions
+            ],
+        )
+        c.executemany(
+            "INSERT INTO splits(guid, tx_guid, account_guid, memo, action, "
+            "reconcile_state, reconcile_date, value_num, value_denom, "
+            "quantity_num, quantity_denom, lot_guid) "
+            "VALUES (?,?,?,?,'','n',NULL,?,?,?,?,NULL)",
+            [
+                (
+                    guid_hex(s.guid),
+                    _ref(s._transaction),
+                    _ref(s._account),
+                    s.memo,
+                    s.value_num,
+                    s.value_denom,
+                    s.quantity_num,
+                    s.quantity_denom,
+                )
+                for s in self._splits
+            ],
+        )
+        c.executemany(
+            "INSERT INTO prices(guid, commodity_guid, currency_guid, date, "
+            "source, type, value_num, value_denom) VALUES (?,?,?,?,?,?,?,?)",
+            [
+                (
+                    guid_hex(p.guid),
+                    _ref(p._commodity),
+                    _ref(p._currency),
+                    _print(p._date, price_format),
+                    *self._price_columns[id(p)],
+                    p.value_num,
+                    p.value_denom,
+                )
+                for p in self._prices
+            ],
+        )
+
+        updates: dict[type, list[tuple[_Object, dict[str, Any]]]] = {}
+        for obj, slots in self._changes.values():
+            updates.setdefault(type(obj), []).append((obj, slots))
+        for kind, entries in updates.items():
+            table, names = _COLUMNS[kind]
+            time_format = price_format if kind is Price else tx_format
+            # One statement per set of changed fields.
+            by_slots: dict[tuple[str, ...], list[list[Any]]] = {}
+            for obj, slots in entries:
+                row: list[Any] = []
+                for slot, value in sorted(slots.items()):
+                    if slot in ("_post_date", "_date"):
+                        value = _print(value, time_format)
+                    elif isinstance(value, Account | Commodity | Transaction):
+                        value = guid_hex(value.guid)
+                    row.append(value)
+                row.append(guid_hex(obj.guid))
+                by_slots.setdefault(tuple(sorted(slots)), []).append(row)
+            for slot_names, rows in by_slots.items():
+                assignments = ", ".join(f"{names[slot]}=?" for slot in slot_names)
+                c.executemany(f"UPDATE {table} SET {assignments} WHERE guid=?", rows)
+
+    def _apply(self) -> None:
+        data = self.data
+        accounts_changed = bool(self._accounts)
+        price_lists: dict[int, list[Price]] = {}
+        for obj, slots in self._changes.values():
+            if isinstance(obj, Account):
+                accounts_changed = True
+                if "parent" in slots and slots["parent"] is not obj.parent:
+                    if obj.parent is not None:
+                        _remove(obj.parent.childs, obj)
+                    slots["parent"].childs.append(obj)
+            elif isinstance(obj, Split):
+                for slot in ("_transaction", "_account"):
+                    if slot in slots and slots[slot] is not getattr(obj, slot):
+                        _remove(getattr(obj, slot).splits, obj)
+                        slots[slot].splits.append(obj)
+            elif isinstance(obj, Price):
+                if "_commodity" in slots and slots["_commodity"] is not obj._commodity:
+                    _remove(obj.commodity.prices, obj)
+                    slots["_commodity"].prices.append(obj)
+                commodity = slots.get("_commodity", obj._commodity)
+                price_lists[id(commodity)] = commodity.prices
+            for slot, value in slots.items():
+                setattr(obj, slot, value)
+            if isinstance(obj, Split):
+                obj.value = obj.value_num / obj.value_denom
+                obj.quantity = obj.quantity_num / obj.quantity_denom
+            elif isinstance(obj, Price):
+                obj.value = obj.value_num / obj.value_denom if obj.value_denom else 0.0
+
+        for account in self._accounts:
+            data.accounts[account.guid] = account
+            if account.parent is not None:
+                account.parent.childs.append(account)
+        for trans in self._transactions:
+            data.transactions[trans.guid] = trans
+        for split in self._splits:
+            split.value = split.value_num / split.value_denom
+            split.quantity = split.quantity_num / split.quantity_denom
+            data.splits[split.guid] = split
+            split.transaction.splits.append(split)
+            split.account.splits.append(split)
+        for price in self._prices:
+            price.value = (
+                price.value_num / price.value_denom if price.value_denom else 0.0
+            )
+            data.prices[price.guid] = price
+            price.commodity.prices.append(price)
+            price_lists[id(price.commodity)] = price.commodity.prices
+        for prices in price_lists.values():
+            prices.sort(key=lambda price: price.date_epoch)
+        if accounts_changed:
+            invalidate_account_paths(data)
+
+    def flush(self) -> None:
+        """Validate and write the pending objects and changes in one database
+        transaction. Raises ValueError, without writing anything, if a
+        transaction does not balance."""
+        self._validate()
+        with batch(self.connection):
+            self._write()
+        self._apply()
+        self.discard()
+
+    def discard(self) -> None:
+        """Forget the pending objects and changes."""
+        self._accounts.clear()
+        self._transactions.clear()
+        self._splits.clear()
+        self._prices.clear()
+        self._new.clear()
+        self._changes.clear()
+        self._price_columns.clear()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
@@ -0,0 +1,546 @@
+"""
+Snapshot cache for sqlite books. A loaded book is written column by column
+to a sidecar file next to the book (BOOK.snapshot): numbers as raw native
+arrays aligned to 8 bytes, which are read in place through mmap, and text
+columns as marshalled lists. Objects refer to each other by their position
+in the columns, so loading a snapshot needs no GUID lookups and no SQL.
+
+A snapshot is keyed by the path, size and mtime of the book and by the
+change counter and schema cookie of the sqlite header; it is ignored and
+rebuilt as soon as any of them changes.
+"""
+
+from __future__ import annotations
+
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from math import nan
+from typing import Any, TypeAlias
+
+from gnucash import (
+    _INVALID_DATETIME,
+    Account,
+    Commodity,
+    GnuCashData,
+    LoadFilter,
+    LoadStats,
+    Price,
+    Projection,
+    Split,
+    Transaction,
+    _check_projection,
+    _decode_time,
+    _FilterMirror,
+    _object_count,
+    _phase,
+    _string_table,
+    guid_hex,
+    open_file,
+    read_data,
+)
+
+SUFFIX = ".snapshot"
+FORMAT_VERSION = 1
+
+_MAGIC = b"PYGCSNAP"
+_ALIGN = 8
+# Stored for missing references and dates.
+_NONE = -(2**63)
+
+_Column: TypeAlias = "array[int] | list[Any]"
+
+
+@dataclass(slots=True, frozen=True)
+class SnapshotKey:
+    path: str
+    size: int
+    mtime_ns: int
+    # Header fields incremented by every commit and every schema change.
+    # PRAGMA data_version cannot be used: it is only meaningful within a
+    # single connection.
+    change_counter: int
+    schema_cookie: int
+    # Commits of a book in WAL mode go to the log first.
+    wal_size: int = 0
+    wal_mtime_ns: int = 0
+    format: int = FORMAT_VERSION
+
+
+def snapshot_key(filename: str) -> SnapshotKey:
+    path = os.path.abspath(filename)
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        header = f.read(100)
+    (change_counter,) = struct.unpack_from(">I", header, 24)
+    (schema_cookie,) = struct.unpack_from(">I", header, 40)
+    try:
+        wal = os.stat(f"{path}-wal")
+    except FileNotFoundError:
+        wal_size = wal_mtime_ns = 0
+    else:
+        wal_size = wal.st_size
+        wal_mtime_ns = wal.st_mtime_ns
+    return SnapshotKey(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        change_counter=change_counter,
+        schema_cookie=schema_cookie,
+        wal_size=wal_size,
+        wal_mtime_ns=wal_mtime_ns,
+    )
+
+
+def snapshot_path(filename: str) -> str:
+    return filename + SUFFIX
+
+
+def _ref(index: dict[int, int], obj: object | None) -> int:
+    return _NONE if obj is None else index[id(obj)]
+
+
+def _epoch(date: datetime | int) -> int:
+    if date is _INVALID_DATETIME:
+        return _NONE
+    return date if isinstance(date, int) else int(date.timestamp())
+
+
+def _positions(objects: Sequence[object]) -> dict[int, int]:
+    return {id(obj): i for i, obj in enumerate(objects)}
+
+
+def _columns(data: GnuCashData) -> dict[str, _Column]:
+    """Flatten `data` into columns. References become positions in the
+    referenced table."""
+    commodities = list(data.commodities.values())
+    accounts = list(data.accounts.values())
+    transactions = list(data.transactions.values())
+    splits = list(data.splits.values())
+    prices = list(data.prices.values())
+    commodity_pos = _positions(commodities)
+    account_pos = _positions(accounts)
+    transaction_pos = _positions(transactions)
+
+    return {
+        "commodity.guid": [guid_hex(c.guid) for c in commodities],
+        "commodity.fullname": [c.fullname for c in commodities],
+        "commodity.mnemonic": [c.mnemonic for c in commodities],
+        "commodity.namespace": [c.namespace for c in commodities],
+        "commodity.precision": array("q", (c.precision for c in commodities)),
+        "commodity.quote_flag": array("q", (c.quote_flag for c in commodities)),
+        "commodity.quote_source": [c.quote_source for c in commodities],
+        "account.guid": [guid_hex(a.guid) for a in accounts],
+        "account.name": [a.name for a in accounts],
+        "account.description": [a.description for a in accounts],
+        "account.type": [a.type for a in accounts],
+        "account.parent": array("q", (_ref(account_pos, a.parent) for a in accounts)),
+        "account.commodity": array(
+            "q", (_ref(commodity_pos, a._commodity) for a in accounts)
+        ),
+        # Children in the order of Account.childs, which need not match the
+        # order of the accounts.
+        "account.childs": array(
+            "q", (account_pos[id(c)] for a in accounts for c in a.childs)
+        ),
+        "transaction.guid": [guid_hex(t.guid) for t in transactions],
+        "transaction.num": [t.num for t in transactions],
+        "transaction.description": [t.description for t in transactions],
+        "transaction.currency": array(
+            "q", (_ref(commodity_pos, t._currency) for t in transactions)
+        ),
+        "transaction.post_date": array(
+            "q", (_epoch(t._post_date) for t in transactions)
+        ),
+        "split.guid": [guid_hex(s.guid) for s in splits],
+        "split.memo": [s.memo for s in splits],
+        "split.transaction": array(
+            "q", (transaction_pos[id(s._transaction)] for s in splits)
+        ),
+        "split.account": array("q", (account_pos[id(s._account)] for s in splits)),
+        "split.value_num": array("q", (s.value_num for s in splits)),
+        "split.value_denom": array("q", (s.value_denom for s in splits)),
+        "split.quantity_num": array("q", (s.quantity_num for s in splits)),
+        "split.quantity_denom": array("q", (s.quantity_denom for s in splits)),
+        "price.guid": [guid_hex(p.guid) for p in prices],
+        "price.commodity": array(
+            "q", (commodity_pos[id(p._commodity)] for p in prices)
+        ),
+        "price.currency": array("q", (commodity_pos[id(p._currency)] for p in prices)),
+        "price.date": array("q", (_epoch(p._date) for p in prices)),
+        "price.value_num": array("q", (p.value_num for p in prices)),
+        "price.value_denom": array("q", (p.value_denom for p in prices)),
+    }
+
+
+def encode_snapshot(data: GnuCashData, key: SnapshotKey) -> bytes:
+    """Serialize `data`, which must be a complete book loaded with the
+    default Projection (no filter, num/denom amounts)."""
+    blobs = []
+    sections = []
+    offset = 0
+    for name, column in _columns(data).items():
+        if isinstance(column, array):
+            blob = column.tobytes()
+            sections.append([name, column.typecode, offset, len(blob)])
+        else:
+            blob = marshal.dumps(column)
+            sections.append([name, "marshal", offset, len(blob)])
+        blobs.append(blob)
+        padding = -len(blob) % _ALIGN
+        blobs.append(b"\0" * padding)
+        offset += len(blob) + padding
+    header = json.dumps(
+        {"key": asdict(key), "byteorder": sys.byteorder, "sections": sections}
+    ).encode()
+    # Sections start at an aligned offset after magic, header size and header.
+    prefix = len(_MAGIC) + 4 + len(header)
+    padding = -prefix % _ALIGN
+    return b"".join(
+        [
+            _MAGIC,
+            struct.pack("<I", len(header) + padding),
+            header,
+            b" " * padding,
+            *blobs,
+        ]
+    )
+
+
+def write_snapshot(filename: str, encoded: bytes) -> None:
+    """Write the snapshot `encoded` of the book `filename`. The file is
+    replaced atomically so concurrent readers never see a partial one. It
+    gets the permission bits of the book, as it holds the same data."""
+    path = snapshot_path(filename)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    mode = os.stat(filename).st_mode & 0o777
+    try:
+        fd = os.open(tmp, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, mode)
+        with open(fd, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class _Columns:
+    """Columns of an encoded snapshot. Number columns are memoryviews into
+    `buffer` and must be released before it is closed."""
+
+    def __init__(self, buffer: Any) -> None:
+        self.views: list[memoryview] = []
+        self.sections: dict[str, tuple[str, int, int]] = {}
+        view = memoryview(buffer)
+        self.views.append(view)
+        try:
+            if bytes(view[: len(_MAGIC)]) != _MAGIC:
+                raise ValueError("not a snapshot")
+            (size,) = struct.unpack_from("<I", view, len(_MAGIC))
+            start = len(_MAGIC) + 4
+            header = json.loads(bytes(view[start : start + size]))
+            self.key = SnapshotKey(**header["key"])
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError("snapshot of another byte order")
+            base = start + size
+            for name, kind, offset, length in header["sections"]:
+                self.sections[name] = (kind, base + offset, length)
+        except BaseException:
+            # A live view keeps the caller from closing the mmap.
+            self.release()
+            raise
+        self.buffer = view
+
+    def __getitem__(self, name: str) -> Sequence[Any]:
+        kind, offset, length = self.sections[name]
+        blob = self.buffer[offset : offset + length]
+        self.views.append(blob)
+        if kind == "marshal":
+            # Written by write_snapshot() next to the book itself.
+            column: list[Any] = marshal.loads(blob)  # noqa: S302
+            return column
+        if kind != "q":
+            raise ValueError(f"unknown column type '{kind}'")
+        view = blob.cast("q")
+        self.views.append(view)
+        return view
+
+    def release(self) -> None:
+        for view in reversed(self.views):
+            view.release()
+        self.views.clear()
+
+
+def _decode(
+    columns: _Columns, filter: LoadFilter | None, projection: Projection
+) -> GnuCashData:
+    data = GnuCashData()
+    compact = projection.compact
+    data._compact = compact
+    strings = _string_table(projection)
+    skip = frozenset(projection.skip)
+    keep_float = projection.amounts != "fraction"
+    keep_fraction = projection.amounts != "float"
+    lazy_dates = projection.lazy_dates
+    mirror = _FilterMirror(filter)
+
+    def guids(name: str) -> Sequence[Any]:
+        column = columns[name]
+        return [bytes.fromhex(guid) for guid in column] if compact else column
+
+    def text(name: str, column: str | None = None) -> Sequence[str]:
+        values = columns[name]
+        if column in skip:
+            return [""] * len(values)
+        if strings is None:
+            return values
+        return [strings.setdefault(value, value) for value in values]
+
+    commodities = [
+        Commodity(
+            guid=guid,
+            fullname=fullname,
+            mnemonic=mnemonic,
+            namespace=namespace,
+            precision=precision,
+            quote_flag=flag != 0,
+            quote_source=source,
+        )
+        for guid, fullname, mnemonic, namespace, precision, flag, source in zip(
+            guids("commodity.guid"),
+            text("commodity.fullname", "Commodity.fullname"),
+            columns["commodity.mnemonic"],
+            text("commodity.namespace"),
+            columns["commodity.precision"],
+            columns["commodity.quote_flag"],
+            text("commodity.quote_source"),
+            strict=True,
+        )
+    ]
+    data.commodities = {c.guid: c for c in commodities}
+
+    accounts = [
+        Account(
+            guid=guid,
+            name=name,
+            description=description,
+            type=type,
+            _commodity=None if commodity == _NONE else commodities[commodity],
+        )
+        for guid, name, description, type, commodity in zip(
+            guids("account.guid"),
+            columns["account.name"],
+            text("account.description", "Account.description"),
+            text("account.type"),
+            columns["account.commodity"],
+            strict=True,
+        )
+    ]
+    data.accounts = {a.guid: a for a in accounts}
+    parents = columns["account.parent"]
+    for account, parent in zip(accounts, parents, strict=True):
+        if parent != _NONE:
+            account.parent = accounts[parent]
+    for child in columns["account.childs"]:
+        account = accounts[child]
+        assert account.parent is not None
+        account.parent.childs.append(account)
+
+    # Transactions matching the filter; all splits of a transaction are
+    # loaded, see LoadFilter.
+    tx_dates = columns["transaction.post_date"]
+    split_tx = columns["split.transaction"]
+    split_account = columns["split.account"]
+    keep = [mirror.in_range(None if date == _NONE else date) for date in tx_dates]
+    if mirror.accounts:
+        touched = [False] * len(keep)
+        for tx, pos in zip(split_tx, split_account, strict=True):
+            if not touched[tx] and mirror.account_matches(accounts[pos]):
+                touched[tx] = True
+        keep = [k and t for k, t in zip(keep, touched, strict=True)]
+
+    transactions: list[Transaction | None] = []
+    for guid, currency, num, date, description, k in zip(
+        guids("transaction.guid"),
+        columns["transaction.currency"],
+        text("transaction.num", "Transaction.num"),
+        tx_dates,
+        text("transaction.description", "Transaction.description"),
+        keep,
+        strict=True,
+    ):
+        if not k:
+            transactions.append(None)
+            continue
+        trans = Transaction(
+            guid,
+            None if currency == _NONE else commodities[currency],
+            num,
+            _decode_time(None if date == _NONE else date, lazy_dates),
+            description,
+        )
+        data.transactions[guid] = trans
+        transactions.append(trans)
+
+    for (
+        guid,
+        tx,
+        pos,
+        memo,
+        value_num,
+        value_denom,
+        quantity_num,
+        quantity_denom,
+    ) in zip(
+        guids("split.guid"),
+        split_tx,
+        split_account,
+        text("split.memo", "Split.memo"),
+        columns["split.value_num"],
+        columns["split.value_denom"],
+        columns["split.quantity_num"],
+        columns["split.quantity_denom"],
+        strict=True,
+    ):
+        trans = transactions[tx]
+        if trans is None:
+            continue
+        acc = accounts[pos]
+        # Positional arguments in field order are the fastest way to fill
+        # in a slots dataclass; most loads keep both kinds of amounts.
+        split = Split(
+            guid,
+            trans,
+            acc,
+            value_num,
+            value_denom,
+            float(value_num) / float(value_denom) if keep_float else nan,
+            quantity_num,
+            quantity_denom,
+            float(quantity_num) / float(quantity_denom) if keep_float else nan,
+            memo,
+        )
+        if not keep_fraction:
+            split.value_num = split.value_denom = 0
+            split.quantity_num = split.quantity_denom = 0
+        data.splits[guid] = split
+        trans.splits.append(split)
+        acc.splits.append(split)
+
+    for guid, commodity, currency, date, value_num, value_denom in zip(
+        guids("price.guid"),
+        columns["price.commodity"],
+        columns["price.currency"],
+        columns["price.date"],
+        columns["price.value_num"],
+        columns["price.value_denom"],
+        strict=True,
+    ):
+        epoch = None if date == _NONE else date
+        comm = commodities[commodity]
+        if not mirror.in_range(epoch) or not mirror.price_matches(comm):
+            continue
+        price = Price(
+            guid=guid,
+            _commodity=comm,
+            _currency=commodities[currency],
+            date=_decode_time(epoch, lazy_dates),
+        )
+        if keep_fraction:
+            price.value_num = value_num
+            price.value_denom = value_denom
+        if keep_float:
+            if value_denom == 0:
+                price.value = 0.0
+            else:
+                price.value = float(value_num) / float(value_denom)
+        data.prices[guid] = price
+        comm.prices.append(price)
+    for comm in commodities:
+        comm.prices.sort(key=lambda price: price.date_epoch)
+    return data
+
+
+def _decode_buffer(
+    buffer: Any,
+    key: SnapshotKey,
+    filter: LoadFilter | None,
+    projection: Projection,
+) -> GnuCashData | None:
+    columns = _Columns(buffer)
+    try:
+        if columns.key != key:
+            return None
+        return _decode(columns, filter, projection)
+    finally:
+        columns.release()
+
+
+def read_snapshot(
+    filename: str,
+    key: SnapshotKey | None = None,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+) -> GnuCashData | None:
+    """Load the book `filename` from its snapshot. Return None if there is
+    no snapshot or if it is stale, i.e. was written for another `key` (by
+    default the current state of the book)."""
+    projection = _check_projection(projection)
+    if key is None:
+        key = snapshot_key(filename)
+    try:
+        with (
+            open(snapshot_path(filename), "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+        ):
+            return _decode_buffer(buffer, key, filter, projection)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, KeyError, TypeError, struct.error):
+        # Unreadable or damaged snapshots are rebuilt.
+        return None
+
+
+def read_cached(
+    filename: str,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+    parallel: bool = False,
+) -> GnuCashData:
+    """Load the sqlite book `filename` from its snapshot, or from the book
+    itself if the snapshot is missing or stale. In that case the complete
+    book is loaded and a new snapshot is written; if the directory is not
+    writable the book is loaded without one. A filtered load of a book
+    without an up to date snapshot only reads the matching rows and does
+    not write a snapshot."""
+    key = snapshot_key(filename)
+    with _phase(stats, GnuCashData(), "snapshot") as phase:
+        data = read_snapshot(filename, key, filter, projection)
+        if data is not None:
+            phase.rows = phase.allocations = _object_count(data)
+            return data
+    with open_file(filename) as connection:
+        if filter is not None:
+            return read_data(connection, filter, projection, stats, parallel)
+        data = read_data(connection, stats=stats, parallel=parallel)
+    with _phase(stats, data, "save"):
+        encoded = encode_snapshot(data, key)
+        # Do not store a load that raced with a write to the book.
+        if snapshot_key(filename) == key:
+            try:
+                write_snapshot(filename, encoded)
+            except OSError:
+                pass
+    if _check_projection(projection) == Projection():
+        return data
+    result = _decode_buffer(encoded, key, None, _check_projection(projection))
+    assert result is not None
+    return result
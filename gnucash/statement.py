@@ -0,0 +1,259 @@
+"""
+Import of bank statements. Statement lines are parsed from CSV or OFX files
+one at a time, matched against the splits already in the book through a
+hash index keyed by account, day and amount, and the unmatched lines are
+added as new transactions through a gnucash.session.Session.
+
+A line matches an existing split of the same account and amount posted
+within `window` days of it; every split matches at most one line, so a
+statement with two equal payments on one day needs two splits to be fully
+matched. Lines whose OFX transaction id is stored as the online_id of a
+split (as written by the GnuCash OFX importer) always match that split.
+"""
+
+from __future__ import annotations
+
+import csv
+import math
+import re
+from collections.abc import Collection, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, time
+from decimal import Decimal, InvalidOperation
+from sqlite3 import Connection
+
+from gnucash import (
+    GUID,
+    Account,
+    Transaction,
+    _epoch_sql,
+    _placeholders,
+    _time_format,
+    guid_hex,
+)
+from gnucash.session import Session
+
+# GnuCash posts transactions entered with a date only at this time, so that
+# they fall on the same day in all time zones.
+_POST_TIME = time(10, 59, tzinfo=UTC)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@dataclass(slots=True, frozen=True)
+class StatementLine:
+    date: date
+    amount: Decimal
+    description: str = ""
+    memo: str = ""
+    # Transaction id assigned by the bank (OFX FITID), if any.
+    id: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class CsvFormat:
+    """Column names and number formats of a CSV export."""
+
+    date_column: str = "Date"
+    amount_column: str = "Amount"
+    description_column: str = "Description"
+    memo_column: str | None = None
+    id_column: str | None = None
+    date_format: str = "%Y-%m-%d"
+    decimal_comma: bool = False
+    delimiter: str = ","
+
+
+def _date(text: str, format: str) -> date:
+    return datetime.strptime(text.strip(), format).replace(tzinfo=UTC).date()
+
+
+def _amount(text: str, decimal_comma: bool = False) -> Decimal:
+    text = text.strip().replace(" ", "")
+    if decimal_comma:
+        text = text.replace(".", "").replace(",", ".")
+    else:
+        text = text.replace(",", "")
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount '{text}'") from None
+
+
+def parse_csv(
+    lines: Iterable[str], format: CsvFormat | None = None
+) -> Iterator[StatementLine]:
+    """Yield the lines of a CSV export with a header row."""
+    if format is None:
+        format = CsvFormat()
+    for row in csv.DictReader(lines, delimiter=format.delimiter):
+        yield StatementLine(
+            date=_date(row[format.date_column], format.date_format),
+            amount=_amount(row[format.amount_column], format.decimal_comma),
+            description=row[format.description_column].strip(),
+            memo="" if format.memo_column is None else row[format.memo_column].strip(),
+            id="" if format.id_column is None else row[format.id_column].strip(),
+        )
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def parse_ofx(lines: Iterable[str]) -> Iterator[StatementLine]:
+    """Yield the STMTTRN records of an OFX file, both of the SGML (OFX 1.x,
+    without closing tags) and the XML (OFX 2.x) flavour. The SGML header is
+    skipped."""
+    record: dict[str, str] | None = None
+    for line in lines:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if record is not None:
+                    yield _ofx_line(record)
+                record = None if closing else {}
+            elif record is not None and not closing:
+                record[tag] = value.strip()
+    if record is not None:
+        yield _ofx_line(record)
+
+
+def _ofx_line(record: dict[str, str]) -> StatementLine:
+    # DTPOSTED is YYYYMMDD, optionally followed by time and time zone.
+    posted = record.get("DTPOSTED", "")
+    try:
+        day = _date(posted[:8], "%Y%m%d")
+    except ValueError:
+        raise ValueError(f"Invalid DTPOSTED '{posted}'") from None
+    name = record.get("NAME") or record.get("PAYEE", "")
+    return StatementLine(
+        date=day,
+        amount=_amount(record.get("TRNAMT", "")),
+        description=name,
+        memo=record.get("MEMO", ""),
+        id=record.get("FITID", ""),
+    )
+
+
+def _fraction(num: int, denom: int) -> tuple[int, int]:
+    """Return num/denom in lowest terms, so equal amounts get equal keys."""
+    gcd = math.gcd(num, denom)
+    return num // gcd, denom // gcd
+
+
+_Key = tuple[str, int, int, int]
+
+
+@dataclass(slots=True)
+class SplitIndex:
+    """Splits of some accounts by (account GUID, day, quantity num, quantity
+    denom), days counted since 1970-01-01 UTC. Every split is matched once."""
+
+    window: int = 3
+    splits: dict[_Key, list[GUID]] = field(default_factory=dict)
+    online_ids: dict[str, GUID] = field(default_factory=dict)
+    matched: set[GUID] = field(default_factory=set)
+
+    def add(self, account: GUID, day: int, num: int, denom: int, split: GUID) -> None:
+        key = (guid_hex(account), day, *_fraction(num, denom))
+        self.splits.setdefault(key, []).append(split)
+
+    def match(self, account: Account, line: StatementLine) -> GUID | None:
+        """Return the split `line` duplicates and take it out of the index,
+        or None if `line` is new. Looks at the day of `line` first, then at
+        the days further and further away within the window."""
+        if line.id:
+            split = self.online_ids.pop(line.id, None)
+            if split is not None and split not in self.matched:
+                self.matched.add(split)
+                return split
+        account_guid = guid_hex(account.guid)
+        num, denom = _fraction(*_quantity(account, line.amount))
+        day = line.date.toordinal() - _EPOCH_ORDINAL
+        for offset in range(self.window + 1):
+            for candidate in (day - offset, day + offset) if offset else (day,):
+                splits = self.splits.get((account_guid, candidate, num, denom))
+                while splits:
+                    split = splits.pop(0)
+                    if split not in self.matched:
+                        self.matched.add(split)
+                        return split
+        return None
+
+
+def build_split_index(
+    connection: Connection, accounts: Collection[GUID], window: int = 3
+) -> SplitIndex:
+    """Index the splits of `accounts`. Only these splits are read, through
+    the index GnuCash keeps on splits.account_guid."""
+    c = connection.cursor()
+    tx_format = _time_format(c, "transactions", "post_date")
+    guids = [guid_hex(guid) for guid in accounts]
+    index = SplitIndex(window)
+    for split, account, post_date, num, denom in c.execute(
+        f"SELECT s.guid, s.account_guid, {_epoch_sql('t.post_date', tx_format)}, "
+        "s.quantity_num, s.quantity_denom FROM splits s "
+        "JOIN transactions t ON t.guid = s.tx_guid "
+        f"WHERE s.account_guid IN ({_placeholders(guids)})",
+        guids,
+    ):
+        if post_date is not None and denom:
+            index.add(account, post_date // 86400, num, denom, split)
+    for split, online_id in c.execute(
+        "SELECT obj_guid, string_val FROM slots "
+        "WHERE name = 'online_id' AND obj_guid IN (SELECT guid FROM splits "
+        f"WHERE account_guid IN ({_placeholders(guids)}))",
+        guids,
+    ):
+        index.online_ids[online_id] = split
+    return index
+
+
+def _quantity(account: Account, amount: Decimal) -> tuple[int, int]:
+    """Return `amount` in the smallest unit of the commodity of `account`."""
+    denom = 10**account.commodity.precision
+    scaled = amount * denom
+    if scaled != scaled.to_integral_value():
+        raise ValueError(
+            f"Amount {amount} has more digits than {account.commodity} allows"
+        )
+    return int(scaled), denom
+
+
+@dataclass(slots=True)
+class ImportResult:
+    new: list[tuple[StatementLine, Transaction]] = field(default_factory=list)
+    duplicates: list[tuple[StatementLine, GUID]] = field(default_factory=list)
+
+
+def import_lines(
+    session: Session,
+    index: SplitIndex,
+    account: Account,
+    offset: Account,
+    lines: Iterable[StatementLine],
+) -> ImportResult:
+    """Add a transaction between `account` and `offset` to `session` for
+    every line of `lines` that does not match a split in `index`. The
+    transactions are written by the next session.flush(). Both accounts
+    must have the same commodity, which becomes the transaction currency:
+    the amounts of the offset splits are not converted."""
+    result = ImportResult()
+    currency = account.commodity
+    if offset.commodity != currency:
+        raise ValueError(
+            f"Offset account '{offset}' is in {offset.commodity}, not in {currency}"
+        )
+    for line in lines:
+        split = index.match(account, line)
+        if split is not None:
+            result.duplicates.append((line, split))
+            continue
+        num, denom = _quantity(account, line.amount)
+        trans = session.new_transaction(
+            currency,
+            datetime.combine(line.date, _POST_TIME),
+            line.description,
+        )
+        session.new_split(trans, account, num, denom, memo=line.memo)
+        session.new_split(trans, offset, -num, denom)
+        result.new.append((line, trans))
+    return result
@@ -0,0 +1,345 @@
+"""
+Reader for the GnuCash XML backend (gzip compressed or plain). The file is
+parsed incrementally and elements are dropped as soon as they have been
+turned into objects, so memory is bounded by the resulting GnuCashData (or
+by the account tree when streaming with iter_xml()).
+
+XML books do not store commodity GUIDs; commodities get a stable GUID
+derived from their namespace and mnemonic, see commodity_guid().
+"""
+
+from __future__ import annotations
+
+import gzip
+import math
+import uuid
+from collections.abc import Iterator
+from datetime import datetime
+from io import BufferedReader
+from typing import Any, TypeAlias
+
+# Books are trusted local files; expat also rejects entity expansion attacks.
+from xml.etree.ElementTree import Element, iterparse  # noqa: S405
+
+from gnucash import (
+    GUID,
+    Account,
+    Commodity,
+    GnuCashData,
+    LoadFilter,
+    LoadStats,
+    Price,
+    Projection,
+    Split,
+    Transaction,
+    _check_projection,
+    _decode_time,
+    _FilterMirror,
+    _phase,
+    _string_table,
+    get_account,
+    get_commodity,
+    get_price,
+    get_split,
+    get_transaction,
+)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+_NAMESPACES = {
+    name: f"http://www.gnucash.org/XML/{name}"
+    for name in ("gnc", "act", "cmdty", "price", "split", "trn", "ts")
+}
+
+# Namespace for the GUIDs of commodities.
+_COMMODITY_NAMESPACE = uuid.UUID("6c4b5d0e-92cb-4f55-9a8c-3c8b4f0e1d2a")
+
+
+def _tag(name: str) -> str:
+    prefix, local = name.split(":")
+    return f"{{{_NAMESPACES[prefix]}}}{local}"
+
+
+_COMMODITY = _tag("gnc:commodity")
+_ACCOUNT = _tag("gnc:account")
+_TRANSACTION = _tag("gnc:transaction")
+# Prices are not namespaced.
+_PRICE = "price"
+
+_CMDTY_SPACE = _tag("cmdty:space")
+_CMDTY_ID = _tag("cmdty:id")
+_CMDTY_NAME = _tag("cmdty:name")
+_CMDTY_FRACTION = _tag("cmdty:fraction")
+_CMDTY_GET_QUOTES = _tag("cmdty:get_quotes")
+_CMDTY_QUOTE_SOURCE = _tag("cmdty:quote_source")
+_ACT_NAME = _tag("act:name")
+_ACT_ID = _tag("act:id")
+_ACT_TYPE = _tag("act:type")
+_ACT_COMMODITY = _tag("act:commodity")
+_ACT_DESCRIPTION = _tag("act:description")
+_ACT_PARENT = _tag("act:parent")
+_TRN_ID = _tag("trn:id")
+_TRN_CURRENCY = _tag("trn:currency")
+_TRN_NUM = _tag("trn:num")
+_TRN_DATE_POSTED = _tag("trn:date-posted")
+_TRN_DESCRIPTION = _tag("trn:description")
+_TRN_SPLIT = f"{_tag('trn:splits')}/{_tag('trn:split')}"
+_SPLIT_ID = _tag("split:id")
+_SPLIT_MEMO = _tag("split:memo")
+_SPLIT_VALUE = _tag("split:value")
+_SPLIT_QUANTITY = _tag("split:quantity")
+_SPLIT_ACCOUNT = _tag("split:account")
+_PRICE_ID = _tag("price:id")
+_PRICE_COMMODITY = _tag("price:commodity")
+_PRICE_CURRENCY = _tag("price:currency")
+_PRICE_TIME = _tag("price:time")
+_PRICE_VALUE = _tag("price:value")
+_TS_DATE = _tag("ts:date")
+
+
+_Source: TypeAlias = gzip.GzipFile | BufferedReader
+
+
+def _open(filename: str) -> _Source:
+    with open(filename, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+def commodity_guid(namespace: str, mnemonic: str, compact: bool = False) -> GUID:
+    """Return the GUID the XML reader assigns to a commodity."""
+    guid = uuid.uuid5(_COMMODITY_NAMESPACE, f"{namespace}::{mnemonic}")
+    return guid.bytes if compact else guid.hex
+
+
+def _text(elem: Element, path: str) -> str:
+    return elem.findtext(path) or ""
+
+
+def _is_template(elem: Element) -> bool:
+    # The sqlite backend stores no commodity for scheduled transaction
+    # templates; do the same.
+    return elem.findtext(_CMDTY_SPACE) == "template"
+
+
+def _fraction(text: str) -> tuple[int, int]:
+    num, _, denom = text.partition("/")
+    return int(num), int(denom or 1)
+
+
+def _epoch(elem: Element, path: str) -> int | None:
+    text = elem.findtext(f"{path}/{_TS_DATE}")
+    if not text:
+        return None
+    return int(datetime.fromisoformat(text).timestamp())
+
+
+class _Reader:
+    def __init__(
+        self,
+        data: GnuCashData,
+        filter: LoadFilter | None,
+        projection: Projection,
+        store: bool,
+    ) -> None:
+        self.data = data
+        self.projection = projection
+        self.store = store
+        self.compact = projection.compact
+        self.strings = _string_table(projection)
+        self.keep_float = projection.amounts != "fraction"
+        self.keep_fraction = projection.amounts != "float"
+        self.skip = frozenset(projection.skip)
+        self.mirror = _FilterMirror(filter)
+        data._compact = self.compact
+
+    def guid(self, text: str | None) -> GUID:
+        assert text
+        return bytes.fromhex(text) if self.compact else text
+
+    def intern(self, text: str) -> str:
+        if self.strings is None:
+            return text
+        return self.strings.setdefault(text, text)
+
+    def commodity_ref(self, elem: Element | None) -> Commodity:
+        assert elem is not None
+        namespace = _text(elem, _CMDTY_SPACE)
+        if namespace == "ISO4217":
+            namespace = "CURRENCY"
+        mnemonic = _text(elem, _CMDTY_ID)
+        commodity = get_commodity(
+            self.data, commodity_guid(namespace, mnemonic, self.compact)
+        )
+        if not commodity.mnemonic:
+            commodity.namespace = self.intern(namespace)
+            commodity.mnemonic = mnemonic
+        return commodity
+
+    def commodity(self, elem: Element) -> Commodity | None:
+        if _is_template(elem):
+            return None
+        commodity = self.commodity_ref(elem)
+        if "Commodity.fullname" not in self.skip:
+            commodity.fullname = _text(elem, _CMDTY_NAME)
+        fraction = elem.findtext(_CMDTY_FRACTION)
+        if fraction:
+            commodity.precision = int(math.log10(int(fraction)))
+        commodity.quote_flag = elem.find(_CMDTY_GET_QUOTES) is not None
+        commodity.quote_source = self.intern(_text(elem, _CMDTY_QUOTE_SOURCE))
+        return commodity
+
+    def account(self, elem: Element) -> Account:
+        data = self.data
+        account = get_account(data, self.guid(elem.findtext(_ACT_ID)))
+        account.name = _text(elem, _ACT_NAME)
+        account.type = self.intern(_text(elem, _ACT_TYPE))
+        commodity = elem.find(_ACT_COMMODITY)
+        if commodity is not None and not _is_template(commodity):
+            account._commodity = self.commodity_ref(commodity)
+        if "Account.description" not in self.skip:
+            account.description = _text(elem, _ACT_DESCRIPTION)
+        parent_guid = elem.findtext(_ACT_PARENT)
+        if parent_guid:
+            parent = get_account(data, self.guid(parent_guid))
+            account.parent = parent
+            parent.childs.append(account)
+        return account
+
+    def price(self, elem: Element) -> Price | None:
+        epoch = _epoch(elem, _PRICE_TIME)
+        if not self.mirror.in_range(epoch):
+            return None
+        commodity = self.commodity_ref(elem.find(_PRICE_COMMODITY))
+        if not self.mirror.price_matches(commodity):
+            return None
+        guid = self.guid(elem.findtext(_PRICE_ID))
+        price = get_price(self.data, guid) if self.store else Price(guid=guid)
+        price._commodity = commodity
+        price._currency = self.commodity_ref(elem.find(_PRICE_CURRENCY))
+        price._date = _decode_time(epoch, self.projection.lazy_dates)
+        num, denom = _fraction(_text(elem, _PRICE_VALUE))
+        if self.keep_fraction:
+            price.value_num = num
+            price.value_denom = denom
+        if self.keep_float:
+            price.value = 0.0 if denom == 0 else num / denom
+        if self.store:
+            commodity.prices.append(price)
+        return price
+
+    def transaction(self, elem: Element) -> Transaction | None:
+        data = self.data
+        epoch = _epoch(elem, _TRN_DATE_POSTED)
+        if not self.mirror.in_range(epoch):
+            return None
+        split_elems = elem.findall(_TRN_SPLIT)
+        accounts = [
+            get_account(data, self.guid(split.findtext(_SPLIT_ACCOUNT)))
+            for split in split_elems
+        ]
+        if self.mirror.accounts and not any(
+            self.mirror.account_matches(account) for account in accounts
+        ):
+            return None
+
+        guid = self.guid(elem.findtext(_TRN_ID))
+        store = self.store
+        trans = get_transaction(data, guid) if store else Transaction(guid=guid)
+        trans._currency = self.commodity_ref(elem.find(_TRN_CURRENCY))
+        if "Transaction.num" not in self.skip:
+            trans.num = self.intern(_text(elem, _TRN_NUM))
+        trans._post_date = _decode_time(epoch, self.projection.lazy_dates)
+        if "Transaction.description" not in self.skip:
+            trans.description = self.intern(_text(elem, _TRN_DESCRIPTION))
+        keep_memo = "Split.memo" not in self.skip
+        for split_elem, account in zip(split_elems, accounts, strict=True):
+            split_guid = self.guid(split_elem.findtext(_SPLIT_ID))
+            split = get_split(data, split_guid) if store else Split(guid=split_guid)
+            split._transaction = trans
+            split._account = account
+            value_num, value_denom = _fraction(_text(split_elem, _SPLIT_VALUE))
+            quantity_num, quantity_denom = _fraction(_text(split_elem, _SPLIT_QUANTITY))
+            if self.keep_fraction:
+                split.value_num = value_num
+                split.value_denom = value_denom
+                split.quantity_num = quantity_num
+                split.quantity_denom = quantity_denom
+            if self.keep_float:
+                split.value = value_num / value_denom
+                split.quantity = quantity_num / quantity_denom
+            if keep_memo:
+                split.memo = self.intern(_text(split_elem, _SPLIT_MEMO))
+            trans.splits.append(split)
+            if store:
+                account.splits.append(split)
+        return trans
+
+    def parse(self, source: _Source) -> Iterator[Any]:
+        """Yield the objects in file order, dropping parsed elements."""
+        handlers = {
+            _COMMODITY: self.commodity,
+            _ACCOUNT: self.account,
+            _PRICE: self.price,
+            _TRANSACTION: self.transaction,
+        }
+        stack: list[Element] = []
+        for event, elem in iterparse(source, events=("start", "end")):  # noqa: S314
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            handler = handlers.get(elem.tag)
+            if handler is None:
+                continue
+            obj = handler(elem)
+            # Drop the element so the tree does not grow with the file.
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+            if obj is not None:
+                yield obj
+
+
+def read_xml(
+    filename: str,
+    filter: LoadFilter | None = None,
+    projection: Projection | None = None,
+    stats: LoadStats | None = None,
+) -> GnuCashData:
+    """Load an XML book into a GnuCashData, like gnucash.read_data()."""
+    projection = _check_projection(projection)
+    data = GnuCashData()
+    reader = _Reader(data, filter, projection, store=True)
+    with _open(filename) as source, _phase(stats, data, "parse") as phase:
+        for _ in reader.parse(source):
+            pass
+        phase.rows = (
+            len(data.commodities)
+            + len(data.accounts)
+            + len(data.transactions)
+            + len(data.splits)
+            + len(data.prices)
+        )
+    with _phase(stats, data, "sort") as phase:
+        for commodity in data.commodities.values():
+            commodity.prices.sort(key=lambda price: price.date_epoch)
+        phase.rows = len(data.prices)
+    return data
+
+
+def iter_xml(
+    filename: str, data: GnuCashData, filter: LoadFilter | None = None
+) -> Iterator[Price | Transaction]:
+    """Yield the prices and transactions of an XML book in file order, like
+    gnucash.iter_prices() and gnucash.iter_transactions(). Commodities and
+    accounts are added to `data` as they are parsed (GnuCash writes them
+    before the objects referring to them). Prices and transactions are not
+    stored in `data` or added to Commodity.prices and Account.splits."""
+    reader = _Reader(data, filter, Projection(), store=False)
+    with _open(filename) as source:
+        for obj in reader.parse(source):
+            if isinstance(obj, Price | Transaction):
+                yield obj
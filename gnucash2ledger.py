@@ -5,10 +5,13 @@ Converts gnucash3 sqlite files to ledger format.
 
 from __future__ import annotations
 
+import argparse
 import sys
+from collections.abc import Iterable
+from typing import TextIO
 
 import gnucash
-from gnucash import Account, Commodity
+from gnucash import Commodity, GnuCashData, Price, Transaction, account_path
 
 
 def format_commodity(commodity: Commodity) -> str:
@@ -21,29 +24,11 @@ def format_commodity(commodity: Commodity) -> str:
     return f'"{mnemonic}"'  # TODO: escape " char in mnemonic
 
 
-def full_acc_name(acc: Account) -> str:
-    result = ""
-    parent = acc.parent
-    assert parent is not None
-    parent_parent = parent.parent
-    if parent_parent is not None:
-        result = full_acc_name(parent) + ":"
-    result += acc.name
-    return result
-
-
 def no_nl(string: str) -> str:
     return string.replace("\n", " ")
 
 
-def _main() -> None:
-    out = sys.stdout
-    if len(sys.argv) == 1:
-        sys.stderr.write(f"Invocation: {sys.argv[0]} gnucash_filename\n")
-        sys.exit(1)
-    data = gnucash.read_file(sys.argv[1])
-
-    commodities = data.commodities.values()
+def write_commodities(out: TextIO, commodities: Iterable[Commodity]) -> None:
     for commodity in commodities:
         if not commodity.mnemonic:
             continue
@@ -52,15 +37,15 @@ def _main() -> None:
             out.write(f"\tnote {no_nl(commodity.fullname)}\n")
     out.write("\n")
 
-    accounts = list(data.accounts.values())
-    accounts.sort(key=lambda acc: acc.guid)
-    for acc in accounts:
+
+def write_accounts(out: TextIO, data: GnuCashData) -> None:
+    for acc in sorted(data.accounts.values(), key=lambda acc: acc.guid):
         # ignore "dummy" accounts
         if acc.type is None or acc.type == "ROOT":
             continue
         if str(acc.commodity) == "template":
             continue
-        out.write(f"account {full_acc_name(acc)}\n")
+        out.write(f"account {account_path(data, acc)}\n")
         if acc.description != "":
             out.write(f"\tnote {no_nl(acc.description)}\n")
         formated_commodity = format_commodity(acc.commodity)
@@ -68,51 +53,119 @@ def _main() -> None:
         out.write(f'\tcheck commodity == "{formated_commodity}"\n')
         out.write("\n")
 
-    # Prices
+
+def write_price(out: TextIO, price: Price) -> None:
+    date = price.date.strftime("%Y/%m/%d %H:%M:%S")
+    price_commodity = format_commodity(price.commodity)
+    price_currency = format_commodity(price.currency)
+    out.write(f"P {date} {price_commodity} {price.value} {price_currency}\n")
+
+
+def write_transaction(out: TextIO, data: GnuCashData, trans: Transaction) -> None:
+    date = trans.post_date.strftime("%Y/%m/%d")
+    code = f"({no_nl(trans.num.replace(')', ''))}) " if trans.num else ""
+    description = no_nl(trans.description)
+    out.write(f"{date} * {code}{description}\n")
+    for split in trans.splits:
+        # Ensure 2 spaces after account name
+        out.write(f"\t{account_path(data, split.account):<40s}  ")
+        trans_currency = format_commodity(trans.currency)
+        if split.account.commodity != trans.currency:
+            commodity_precision = split.account.commodity.precision
+            split_acc_commodity = format_commodity(split.account.commodity)
+            quantity = split.quantity
+            value = abs(split.value)
+            out.write(
+                "%10.*f %s @@ %.2f %s"  # noqa: UP031
+                % (
+                    commodity_precision,
+                    quantity,
+                    split_acc_commodity,
+                    value,
+                    trans_currency,
+                )
+            )
+        else:
+            commodity_precision = trans.currency.precision
+            out.write(
+                "%10.*f %s" % (commodity_precision, split.value, trans_currency)  # noqa: UP031
+            )
+        if split.memo:
+            out.write(f"  ; {no_nl(split.memo)}")
+        out.write("\n")
+    out.write("\n")
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("gnucash_file")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream prices and transactions in SQL order instead of loading "
+        "the whole book first (bounded memory)",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="read the transactions, splits and prices tables concurrently",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="keep GUIDs as bytes to reduce the memory used by large books",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="load through the snapshot cache next to the book, which is "
+        "(re)built when it is missing or stale",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each load phase to stderr",
+    )
+    args = parser.parse_args()
+    out = sys.stdout
+    stats = gnucash.LoadStats() if args.profile else None
+
+    if args.stream:
+        with gnucash.open_file(args.gnucash_file) as conn:
+            data = gnucash.read_accounts(conn, stats=stats)
+            if stats is not None:
+                sys.stderr.write(str(stats))
+            write_commodities(out, data.commodities.values())
+            write_accounts(out, data)
+            for price in gnucash.iter_prices(conn, data):
+                write_price(out, price)
+            out.write("\n")
+            for trans in gnucash.iter_transactions(conn, data):
+                write_transaction(out, data, trans)
+        return
+
+    data = gnucash.read_file(
+        args.gnucash_file,
+        projection=gnucash.Projection(compact=args.compact),
+        stats=stats,
+        parallel=args.parallel,
+        snapshot=args.snapshot,
+    )
+    if stats is not None:
+        sys.stderr.write(str(stats))
+    write_commodities(out, data.commodities.values())
+    write_accounts(out, data)
+
     prices = list(data.prices.values())
     prices.sort(key=lambda price: price.date)
     for price in prices:
-        date = price.date.strftime("%Y/%m/%d %H:%M:%S")
-        price_commodity = format_commodity(price.commodity)
-        price_currency = format_commodity(price.currency)
-        out.write(f"P {date} {price_commodity} {price.value} {price_currency}\n")
+        write_price(out, price)
     out.write("\n")
 
     transactions = list(data.transactions.values())
     transactions.sort(key=lambda transaction: transaction.post_date)
     for trans in transactions:
-        date = trans.post_date.strftime("%Y/%m/%d")
-        code = f"({no_nl(trans.num.replace(')', ''))}) " if trans.num else ""
-        description = no_nl(trans.description)
-        out.write(f"{date} * {code}{description}\n")
-        for split in trans.splits:
-            # Ensure 2 spaces after account name
-            out.write(f"\t{full_acc_name(split.account):<40s}  ")
-            trans_currency = format_commodity(trans.currency)
-            if split.account.commodity != trans.currency:
-                commodity_precision = split.account.commodity.precision
-                split_acc_commodity = format_commodity(split.account.commodity)
-                quantity = split.quantity
-                value = abs(split.value)
-                out.write(
-                    "%10.*f %s @@ %.2f %s"  # noqa: UP031
-                    % (
-                        commodity_precision,
-                        quantity,
-                        split_acc_commodity,
-                        value,
-                        trans_currency,
-                    )
-                )
-            else:
-                commodity_precision = trans.currency.precision
-                out.write(
-                    "%10.*f %s" % (commodity_precision, split.value, trans_currency)  # noqa: UP031
-                )
-            if split.memo:
-                out.write(f"  ; {no_nl(split.memo)}")
-            out.write("\n")
-        out.write("\n")
+        write_transaction(out, data, trans)
 
 
 if __name__ == "__main__":
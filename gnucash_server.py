@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Serve account, balance, price and transaction queries for a GnuCash book
+over HTTP with JSON responses. The book is loaded once and kept in memory;
+the file is watched and reloaded in the background when it changes, while
+requests keep being answered from the previous state.
+
+Endpoints (all GET):
+  /status
+  /accounts
+  /balance?account=PATH[&date=ISO][&subtree=1]
+  /price?commodity=MNEMONIC[&currency=MNEMONIC][&date=ISO]
+  /transactions?account=PATH[&start=ISO][&end=ISO][&limit=N]
+Accounts may be given by path or GUID; commodities as MNEMONIC or
+NAMESPACE:MNEMONIC.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import traceback
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import gnucash
+from gnucash import Account, Commodity, GnuCashData, Transaction
+from gnucash.amounts import book_precision, to_float
+from gnucash.balances import BalanceIndex, build_balance_index
+from gnucash.prices import PriceIndex, build_price_index
+from gnucash.snapshot import SnapshotKey, snapshot_key
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(slots=True, frozen=True)
+class BookState:
+    """Everything a request needs. A state is never modified after it has
+    been built; reloads build a new one and swap it in."""
+
+    data: GnuCashData
+    precision: int
+    balances: BalanceIndex
+    prices: PriceIndex
+    commodities: dict[str, Commodity]
+    loaded_at: datetime
+    generation: int
+
+
+def build_state(filename: str, generation: int, snapshot: bool) -> BookState:
+    data = gnucash.read_file(filename, snapshot=snapshot)
+    commodities: dict[str, Commodity] = {}
+    for commodity in data.commodities.values():
+        commodities[f"{commodity.namespace}:{commodity.mnemonic}"] = commodity
+        commodities.setdefault(commodity.mnemonic, commodity)
+    return BookState(
+        data=data,
+        precision=book_precision(data),
+        balances=build_balance_index(data),
+        prices=build_price_index(data),
+        commodities=commodities,
+        loaded_at=datetime.now(UTC),
+        generation=generation,
+    )
+
+
+@dataclass(slots=True)
+class Book:
+    """The current BookState of `filename` and the thread reloading it."""
+
+    filename: str
+    interval: float
+    snapshot: bool = False
+    state: BookState | None = None
+    reloading: bool = False
+    _key: SnapshotKey | None = None
+    _stop: threading.Event = field(default_factory=threading.Event)
+
+    def reload(self) -> None:
+        key = snapshot_key(self.filename)
+        generation = 1 if self.state is None else self.state.generation + 1
+        self.reloading = True
+        try:
+            state = build_state(self.filename, generation, self.snapshot)
+        finally:
+            self.reloading = False
+        # Only now: a change during the load triggers another reload.
+        self._key = key
+        self.state = state
+
+    def watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if snapshot_key(self.filename) == self._key:
+                    continue
+                self.reload()
+            except (OSError, sqlite3.Error) as e:
+                # The book may be in the middle of being written; keep the
+                # current state and try again.
+                sys.stderr.write(f"Warning: reloading {self.filename} failed: {e}\n")
+            except Exception:
+                # Keep watching: a book that cannot be loaded now may be
+                # fixed by the next change.
+                sys.stderr.write(f"Warning: reloading {self.filename} failed:\n")
+                traceback.print_exc()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.watch, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _when(text: str | None) -> datetime | None:
+    if text is None:
+        return None
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        raise RequestError(400, f"Invalid date '{text}'") from None
+    return when if when.tzinfo is not None else when.replace(tzinfo=UTC)
+
+
+def _account(state: BookState, text: str | None) -> Account:
+    if text is None:
+        raise RequestError(400, "Missing parameter 'account'")
+    account = gnucash.lookup_account(state.data, text)
+    if account is None:
+        raise RequestError(404, f"Unknown account '{text}'")
+    return account
+
+
+def _commodity(state: BookState, text: str | None, name: str) -> Commodity:
+    if text is None:
+        raise RequestError(400, f"Missing parameter '{name}'")
+    commodity = state.commodities.get(text)
+    if commodity is None:
+        raise RequestError(404, f"Unknown commodity '{text}'")
+    return commodity
+
+
+def _account_json(state: BookState, account: Account) -> dict[str, Any]:
+    commodity = account._commodity
+    return {
+        "guid": account.guid,
+        "path": gnucash.account_path(state.data, account),
+        "type": account.type,
+        "commodity": None if commodity is None else commodity.mnemonic,
+    }
+
+
+def _transaction_json(state: BookState, trans: Transaction) -> dict[str, Any]:
+    return {
+        "guid": trans.guid,
+        "date": trans.post_date.isoformat(),
+        "num": trans.num,
+        "description": trans.description,
+        "currency": trans.currency.mnemonic,
+        "splits": [
+            {
+                "account": gnucash.account_path(state.data, split.account),
+                "memo": split.memo,
+                "value": split.value,
+                "quantity": split.quantity,
+            }
+            for split in trans.splits
+        ],
+    }
+
+
+Params = dict[str, str]
+
+
+def status(book: Book, state: BookState, _params: Params) -> Any:
+    data = state.data
+    return {
+        "book": book.filename,
+        "generation": state.generation,
+        "loaded_at": state.loaded_at.isoformat(),
+        "reloading": book.reloading,
+        "accounts": len(data.accounts),
+        "transactions": len(data.transactions),
+        "splits": len(data.splits),
+        "prices": len(data.prices),
+    }
+
+
+def accounts(_book: Book, state: BookState, _params: Params) -> Any:
+    return [
+        _account_json(state, account)
+        for account in state.data.accounts.values()
+        if account.parent is not None
+    ]
+
+
+def balance(_book: Book, state: BookState, params: Params) -> Any:
+    account = _account(state, params.get("account"))
+    when = _when(params.get("date"))
+    subtree = params.get("subtree", "0") not in ("", "0", "false")
+    precision = state.precision
+    quantity = state.balances.balance(account, when, "quantity", subtree)
+    value = state.balances.balance(account, when, "value", subtree)
+    return {
+        **_account_json(state, account),
+        "date": None if when is None else when.isoformat(),
+        "subtree": subtree,
+        "quantity": to_float(quantity, precision),
+        "value": to_float(value, precision),
+    }
+
+
+def price(_book: Book, state: BookState, params: Params) -> Any:
+    commodity = _commodity(state, params.get("commodity"), "commodity")
+    currency = None
+    if "currency" in params:
+        currency = _commodity(state, params["currency"], "currency")
+    when = _when(params.get("date"))
+    if when is None:
+        found = state.prices.latest(commodity, currency)
+    elif currency is not None:
+        found = state.prices.as_of(commodity, currency, when)
+    else:
+        found = None
+        for series in state.prices.by_commodity.get(commodity.guid, ()):
+            candidate = series.as_of(when)
+            if candidate is not None and (found is None or candidate.date > found.date):
+                found = candidate
+    if found is None:
+        raise RequestError(404, f"No price for '{commodity.mnemonic}'")
+    return {
+        "commodity": commodity.mnemonic,
+        "currency": found.currency.mnemonic,
+        "date": found.date.isoformat(),
+        "value": found.value,
+    }
+
+
+def transactions(_book: Book, state: BookState, params: Params) -> Any:
+    account = _account(state, params.get("account"))
+    start = _when(params.get("start"))
+    end = _when(params.get("end"))
+    try:
+        limit = int(params.get("limit", "0"))
+    except ValueError:
+        raise RequestError(400, "Invalid limit") from None
+    found: dict[int, Transaction] = {}
+    for split in account.splits:
+        trans = split.transaction
+        if start is not None and trans.post_date < start:
+            continue
+        if end is not None and trans.post_date >= end:
+            continue
+        found[id(trans)] = trans
+    result = sorted(found.values(), key=lambda trans: trans.post_date)
+    if limit > 0:
+        result = result[-limit:]
+    return [_transaction_json(state, trans) for trans in result]
+
+
+ENDPOINTS: dict[str, Callable[[Book, BookState, Params], Any]] = {
+    "/status": status,
+    "/accounts": accounts,
+    "/balance": balance,
+    "/price": price,
+    "/transactions": transactions,
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    book: Book
+    verbose: bool = False
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlsplit(self.path)
+        endpoint = ENDPOINTS.get(url.path)
+        if endpoint is None:
+            self.reply(404, {"error": f"Unknown endpoint '{url.path}'"})
+            return
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        # Read the state once: a reload may swap it during the request.
+        state = self.book.state
+        assert state is not None
+        try:
+            body = endpoint(self.book, state, params)
+        except RequestError as e:
+            self.reply(e.status, {"error": str(e)})
+            return
+        except Exception:
+            sys.stderr.write(f"Error: {self.path} failed:\n")
+            traceback.print_exc()
+            self.reply(500, {"error": "Internal server error"})
+            return
+        self.reply(200, body)
+
+    def reply(self, code: int, body: Any) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: object) -> None:
+        if self.verbose:
+            sys.stderr.write(f"{self.log_date_time_string()} {format % args}\n")
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("gnucash_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, default=8765, help="TCP port, 0 picks a free one"
+    )
+    parser.add_argument("--socket", help="listen on this Unix socket instead")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="seconds between checks of the book for changes",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="load through the snapshot cache next to the book, which is "
+        "(re)built when it is missing or stale",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests")
+    args = parser.parse_args()
+
+    book = Book(args.gnucash_file, args.interval, snapshot=args.snapshot)
+    book.reload()
+    handler = type("BookHandler", (Handler,), {"book": book, "verbose": args.verbose})
+    server: ThreadingHTTPServer | UnixHTTPServer
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, handler)
+        address = f"unix:{args.socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        host, port = server.server_address[:2]
+        address = f"http://{host!s}:{port}"
+    book.start()
+    sys.stdout.write(f"{address}\n")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        book.stop()
+        server.server_close()
+        if args.socket:
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Import a bank statement (CSV or OFX) into an account of a GnuCash book.
+Lines that match an existing split of the account (same amount, posted
+within --window days) are skipped; the others are added as transactions
+against the --offset account in a single commit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from sys import exit, stderr
+
+import gnucash
+from gnucash.session import Session
+from gnucash.statement import (
+    CsvFormat,
+    build_split_index,
+    import_lines,
+    parse_csv,
+    parse_ofx,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("gnucash_file")
+    parser.add_argument("account", help="account the statement belongs to")
+    parser.add_argument("statement")
+    parser.add_argument(
+        "--offset",
+        metavar="ACCOUNT",
+        help="account of the other side of new transactions "
+        "(default: Imbalance-CURRENCY)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("csv", "ofx"),
+        help="statement format (default: from the file extension)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=3,
+        help="days an existing split may be off to match a line (default: 3)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report what would be imported"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="list the lines")
+    csv_options = parser.add_argument_group("CSV columns and formats")
+    csv_format = CsvFormat()
+    csv_options.add_argument("--date-column", default=csv_format.date_column)
+    csv_options.add_argument("--amount-column", default=csv_format.amount_column)
+    csv_options.add_argument(
+        "--description-column", default=csv_format.description_column
+    )
+    csv_options.add_argument("--memo-column")
+    csv_options.add_argument("--id-column")
+    csv_options.add_argument("--date-format", default=csv_format.date_format)
+    csv_options.add_argument("--decimal-comma", action="store_true")
+    csv_options.add_argument("--delimiter", default=csv_format.delimiter)
+    args = parser.parse_args()
+
+    statement_format = args.format
+    if statement_format is None:
+        statement_format = "ofx" if args.statement.lower().endswith(".ofx") else "csv"
+
+    with gnucash.open_file(args.gnucash_file, writable=True) as conn:
+        # New transactions only need the account tree.
+        data = gnucash.read_accounts(conn)
+        account = gnucash.lookup_account(data, args.account)
+        if account is None:
+            stderr.write(f"There is no account '{args.account}'\n")
+            exit(1)
+        session = Session(conn, data)
+        if args.offset is not None:
+            offset = gnucash.lookup_account(data, args.offset)
+            if offset is None:
+                stderr.write(f"There is no account '{args.offset}'\n")
+                exit(1)
+        else:
+            name = f"Imbalance-{account.commodity.mnemonic}"
+            offset = gnucash.find_account(data, name)
+            if offset is None:
+                root = next(
+                    a
+                    for a in data.accounts.values()
+                    if a.type == "ROOT" and a.name != "Template Root"
+                )
+                offset = session.new_account(name, root, "BANK", account.commodity)
+
+        index = build_split_index(conn, [account.guid], args.window)
+        with open(args.statement, encoding="utf-8-sig", newline="") as f:
+            if statement_format == "ofx":
+                lines = parse_ofx(f)
+            else:
+                lines = parse_csv(
+                    f,
+                    CsvFormat(
+                        date_column=args.date_column,
+                        amount_column=args.amount_column,
+                        description_column=args.description_column,
+                        memo_column=args.memo_column,
+                        id_column=args.id_column,
+                        date_format=args.date_format,
+                        decimal_comma=args.decimal_comma,
+                        delimiter=args.delimiter,
+                    ),
+                )
+            try:
+                result = import_lines(session, index, account, offset, lines)
+            except ValueError as e:
+                stderr.write(f"Error: {e}\n")
+                exit(1)
+
+        if args.verbose:
+            out = sys.stdout
+            for line, split in result.duplicates:
+                out.write(
+                    f"duplicate {line.date} {line.amount:>12} {line.description} "
+                    f"(split {gnucash.guid_hex(split)})\n"
+                )
+            for line, _trans in result.new:
+                out.write(
+                    f"new       {line.date} {line.amount:>12} {line.description}\n"
+                )
+        if args.dry_run:
+            session.discard()
+        else:
+            session.flush()
+    action = "Would import" if args.dry_run else "Imported"
+    stderr.write(
+        f"{action} {len(result.new)} new lines, "
+        f"{len(result.duplicates)} duplicates skipped\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
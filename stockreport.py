@@ -10,44 +10,63 @@ time.
 from __future__ import annotations
 
 import argparse
+import io
 import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from typing import TextIO
 
 import gnucash
-from gnucash import Account, Commodity, Transaction
-from gnucashutil import full_acc_name
-
-
+from gnucash import (
+    GUID,
+    Account,
+    Commodity,
+    GnuCashData,
+    LoadFilter,
+    LoadStats,
+    Projection,
+    Transaction,
+)
+from gnucash.amounts import (
+    Amount,
+    book_precision,
+    split_quantity,
+    split_value,
+    to_float,
+)
+from gnucash.periodic import BucketSpec, periodic_report
+from gnucash.prices import PriceIndex, build_price_index
+
+
+# Amounts are exact fixed-point values at the book precision (see
+# gnucash.amounts), so the balance checks below need no tolerance.
 @dataclass(slots=True)
 class Details:
-    activa_changes: float = 0
-    income: float = 0
-    expenses: float = 0
-    dividends: float = 0
-    shares: float = 0
-    shares_value: float = 0
-    shares_moved: float = 0
-    shares_moved_value: float = 0
-    shares_other: float = 0
-    shares_other_value: float = 0
-    realized_gain: float = 0
+    activa_changes: Amount = 0
+    income: Amount = 0
+    expenses: Amount = 0
+    dividends: Amount = 0
+    shares: Amount = 0
+    shares_value: Amount = 0
+    shares_moved: Amount = 0
+    shares_moved_value: Amount = 0
+    shares_other: Amount = 0
+    shares_other_value: Amount = 0
+    realized_gain: Amount = 0
 
     def verify(self) -> None:
         assert (
-            abs(
-                self.income
-                + self.dividends
-                + self.realized_gain
-                - self.activa_changes
-                - self.expenses
-                - self.shares_value
-                - self.shares_moved_value
-                - self.shares_other_value
-            )
-            < 0.001
-        )
+            self.income
+            + self.dividends
+            + self.realized_gain
+            - self.activa_changes
+            - self.expenses
+            - self.shares_value
+            - self.shares_moved_value
+            - self.shares_other_value
+        ) == 0
 
     def __add__(self, other: object) -> Details:
         assert isinstance(other, Details)
@@ -60,42 +79,43 @@ class Details:
 
 
 def analyze_transaction(
-    out: TextIO, acc: Account, transaction: Transaction
+    out: TextIO, acc: Account, transaction: Transaction, precision: int
 ) -> tuple[Details, Commodity | None]:
     # Analyze the transaction splits.
     d = Details()
     other_commodity: Commodity | None = None
     for ssplit in transaction.splits:
+        value = split_value(ssplit, precision)
         if ssplit.account == acc:
-            d.shares += ssplit.quantity
-            d.shares_value += ssplit.value
+            d.shares += split_quantity(ssplit, precision)
+            d.shares_value += value
             continue
 
         acctype = ssplit.account.type
         if acctype == "EXPENSE":
-            d.expenses += ssplit.value
+            d.expenses += value
         elif acctype in ("BANK", "ASSET", "EQUITY", "CREDIT"):
-            d.activa_changes += ssplit.value
+            d.activa_changes += value
         elif acctype == "INCOME":
-            d.income += -ssplit.value
+            d.income += -value
         elif acctype in ("STOCK", "MUTUAL"):
             other_account = ssplit.account
             if other_account.commodity == acc.commodity:
-                d.shares_moved += ssplit.quantity
-                d.shares_moved_value += ssplit.value
+                d.shares_moved += split_quantity(ssplit, precision)
+                d.shares_moved_value += value
             else:
-                d.shares_other += ssplit.quantity
-                d.shares_other_value += ssplit.value
+                d.shares_other += split_quantity(ssplit, precision)
+                d.shares_other_value += value
                 if other_commodity is None:
                     other_commodity = other_account.commodity
         else:
             date = transaction.post_date
             descr = transaction.description
-            value = ssplit.value
-            quant = ssplit.quantity
+            fvalue = to_float(value, precision)
+            quant = to_float(split_quantity(ssplit, precision), precision)
             out.write(f"Unexpected account type: {acctype} (acc {acc})\n")
             out.write(
-                f"\t{date} {descr:<30}   value {value:.2f} quantity {quant:.2f}\n"
+                f"\t{date} {descr:<30}   value {fvalue:.2f} quantity {quant:.2f}\n"
             )
             sys.exit(1)
     d.verify()
@@ -136,16 +156,21 @@ def categorize_transaction(analysis_details: Details) -> str | None:
 
 @dataclass(slots=True, frozen=True)
 class AccountAggregate:
-    realized_gain: float
-    shares_value: float
-    expenses: float
-    dividends: float
-    shares: float
+    realized_gain: Amount
+    shares_value: Amount
+    expenses: Amount
+    dividends: Amount
+    shares: Amount
     realized_days: float
     period_begin: datetime | None
 
 
-def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate:
+def analyze_account(
+    out: TextIO, verbose: int, acc: Account, precision: int
+) -> AccountAggregate:
+    def f(amount: Amount) -> float:
+        return to_float(amount, precision)
+
     sum = Details()
     realized_days = 0.0
     period_begin: datetime | None = None
@@ -164,18 +189,18 @@ def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate
         curr = trans.currency
 
         # Analyze the transaction splits.
-        d, other_commodity = analyze_transaction(out, acc, trans)
+        d, other_commodity = analyze_transaction(out, acc, trans, precision)
         tx_type = categorize_transaction(d)
         if tx_type is None:
             out.write("Error: Could not categorize transaction\n")
             out.write(f"{date} account {acc}\n")
             out.write(
-                f"Activa Changes {d.activa_changes} "
-                f"Income {d.income} "
-                f"Expenses {d.expenses} "
-                f"Shares {d.shares} (val {d.shares_value}) "
-                f"Shares Moved {d.shares_moved} (val {d.shares_moved_value}) "
-                f"Shares Other {d.shares_other} (val {d.shares_other_value})\n"
+                f"Activa Changes {f(d.activa_changes)} "
+                f"Income {f(d.income)} "
+                f"Expenses {f(d.expenses)} "
+                f"Shares {f(d.shares)} (val {f(d.shares_value)}) "
+                f"Shares Moved {f(d.shares_moved)} (val {f(d.shares_moved_value)}) "
+                f"Shares Other {f(d.shares_other)} (val {f(d.shares_other_value)})\n"
             )
             continue
 
@@ -183,10 +208,10 @@ def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate
         sum.verify()
         d.verify()
         sum += d
-        if d.shares != 0 and abs(sum.shares - d.shares) < 0.001:
+        if d.shares != 0 and sum.shares == d.shares:
             assert period_begin is None
             period_begin = trans.post_date
-        if abs(sum.shares) < 0.001:
+        if sum.shares == 0:
             # End a period when moving from non-0 to 0 shares.
             if d.shares != 0:
                 period_end = trans.post_date
@@ -201,17 +226,17 @@ def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate
         if verbose >= 2:
             out.write(f"\t{date} {tx_type} ")
             if tx_type == "DIV ":
-                out.write(f"{d.dividends:9.2f} {curr}, fees {d.expenses:7.2f}\n")
+                out.write(f"{f(d.dividends):9.2f} {curr}, fees {f(d.expenses):7.2f}\n")
             elif tx_type == "FEE ":
-                out.write(f"{d.activa_changes:0.2f} {curr}\n")
+                out.write(f"{f(d.activa_changes):0.2f} {curr}\n")
             else:
                 out.write(
-                    f"{-d.shares_value:9.2f} {curr}"
-                    f", fees {d.expenses:7.2f}"
-                    f", {d.shares:+5.1f} shares"
+                    f"{-f(d.shares_value):9.2f} {curr}"
+                    f", fees {f(d.expenses):7.2f}"
+                    f", {f(d.shares):+5.1f} shares"
                 )
                 if d.shares != 0:
-                    share_price = d.shares_value / d.shares
+                    share_price = float(d.shares_value / d.shares)
                     assert share_price >= 0
                     out.write(f" (@{share_price:3.2f})")
                 out.write("\n")
@@ -219,7 +244,7 @@ def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate
                 direction = "<-" if d.shares_other == 0 else "->"
                 spin_shares = d.shares if d.shares_other == 0 else d.shares_other
                 out.write(
-                    f"\t {direction} {spin_shares:+7.f} shares {other_commodity}\n"
+                    f"\t {direction} {f(spin_shares):+7.f} shares {other_commodity}\n"
                 )
 
     realized_gain = sum.realized_gain
@@ -236,53 +261,224 @@ def analyze_account(out: TextIO, verbose: int, acc: Account) -> AccountAggregate
     )
 
 
-def get_latest_price(commodity: Commodity) -> tuple[float | None, datetime | None]:
-    prices = commodity.prices
-    if len(prices) == 0:
+def get_latest_price(
+    prices: PriceIndex, commodity: Commodity, currency: Commodity
+) -> tuple[float | None, datetime | None]:
+    price = prices.latest(commodity, currency)
+    if price is None:
+        price = prices.latest(commodity)
+    if price is None:
         return (None, None)
-    return (prices[-1].value, prices[-1].date)
+    return (price.value, price.date)
+
+
+def write_yearly(
+    out: TextIO, data: GnuCashData, precision: int, fiscal_year_start: int
+) -> None:
+    """Write dividends, fees/taxes and net share purchases per year."""
+    report = periodic_report(
+        data,
+        BucketSpec("year", fiscal_year_start),
+        account_types=("INCOME", "EXPENSE", "STOCK", "MUTUAL"),
+        precision=precision,
+    )
+    width = len(report.buckets)
+    dividends: list[Amount] = [0] * width
+    expenses: list[Amount] = [0] * width
+    purchases: list[Amount] = [0] * width
+    for acc, row in zip(report.accounts, report.matrix, strict=True):
+        if acc.type == "INCOME":
+            column, sign = dividends, -1
+        elif acc.type == "EXPENSE":
+            column, sign = expenses, 1
+        else:
+            column, sign = purchases, 1
+        for i, amount in enumerate(row):
+            column[i] += sign * amount
+
+    out.write("-----------\n")
+    out.write(f"{'Year':<8} {'Dividends':>10} {'Fees/Tax':>10} {'Net buys':>10}\n")
+    for i, label in enumerate(report.labels()):
+        if dividends[i] == 0 and expenses[i] == 0 and purchases[i] == 0:
+            continue
+        out.write(
+            f"{label:<8} {to_float(dividends[i], precision):10.2f}"
+            f" {to_float(expenses[i], precision):10.2f}"
+            f" {to_float(purchases[i], precision):10.2f}\n"
+        )
+
+
+def load(
+    filename: str,
+    stats: LoadStats | None = None,
+    snapshot: bool = False,
+    compact: bool = False,
+) -> GnuCashData:
+    # Only transactions touching securities accounts matter for the report.
+    return gnucash.read_file(
+        filename,
+        LoadFilter(account_types=("STOCK", "MUTUAL")),
+        Projection(
+            skip=("Account.description", "Commodity.fullname", "Split.memo"),
+            compact=compact,
+        ),
+        stats,
+        snapshot=snapshot,
+    )
+
+
+# Book loaded by each worker process of analyze_accounts_parallel().
+_worker_data: GnuCashData | None = None
+
+
+def _init_worker(filename: str, snapshot: bool, compact: bool) -> None:
+    global _worker_data
+    _worker_data = load(filename, snapshot=snapshot, compact=compact)
+
+
+def _analyze_account_job(
+    job: tuple[GUID, int],
+) -> tuple[str, AccountAggregate | None]:
+    guid, verbose = job
+    data = _worker_data
+    assert data is not None
+    out = io.StringIO()
+    try:
+        aggregate = analyze_account(
+            out, verbose, data.accounts[guid], book_precision(data)
+        )
+    except SystemExit:
+        return out.getvalue(), None
+    return out.getvalue(), aggregate
+
+
+def analyze_accounts_parallel(
+    filename: str,
+    verbose: int,
+    accounts: list[Account],
+    jobs: int,
+    snapshot: bool = False,
+    compact: bool = False,
+) -> Iterator[tuple[str, AccountAggregate | None]]:
+    """Run analyze_account() for `accounts` on a pool of `jobs` processes.
+    Yields the output and aggregate of each account in the order of
+    `accounts`; the aggregate is None if the analysis aborted."""
+    chunksize = max(1, len(accounts) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(filename, snapshot, compact),
+    ) as executor:
+        yield from executor.map(
+            _analyze_account_job,
+            [(acc.guid, verbose) for acc in accounts],
+            chunksize=chunksize,
+        )
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("gnucash_file")
     parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="analyze accounts on N worker processes",
+    )
+    parser.add_argument(
+        "--yearly", action="store_true", help="add a per-year breakdown"
+    )
+    parser.add_argument(
+        "--fiscal-year-start",
+        type=int,
+        default=1,
+        metavar="MONTH",
+        help="month the fiscal year starts in for --yearly (default: 1)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="keep GUIDs as bytes to reduce the memory used by large books",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="load from the snapshot cache next to the book if it is up to "
+        "date; only unfiltered loads such as gnucash2ledger.py --snapshot "
+        "build it",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each load phase to stderr",
+    )
     args = parser.parse_args()
 
-    data = gnucash.read_file(args.gnucash_file)
+    stats = LoadStats() if args.profile else None
+    data = load(args.gnucash_file, stats, snapshot=args.snapshot, compact=args.compact)
+    if stats is not None:
+        sys.stderr.write(str(stats))
+    prices = build_price_index(data)
+    precision = book_precision(data)
 
     out = sys.stdout
     verbose = args.verbose
 
+    accounts = [
+        acc for acc in data.accounts.values() if acc.type in {"STOCK", "MUTUAL"}
+    ]
+    results: Iterator[tuple[str, AccountAggregate | None]] | None = None
+    if args.jobs > 1:
+        results = analyze_accounts_parallel(
+            args.gnucash_file,
+            verbose,
+            accounts,
+            args.jobs,
+            args.snapshot,
+            args.compact,
+        )
+
     # Report
-    gdividends = 0.0
-    gexpenses = 0.0
-    grealized_gain = 0.0
+    gdividends: Amount = 0
+    gexpenses: Amount = 0
+    grealized_gain: Amount = 0
     gunrealized_gain = 0.0
-    for acc in data.accounts.values():
-        if acc.type != "STOCK" and acc.type != "MUTUAL":
-            continue
-        name = full_acc_name(acc, 3)
+    for acc in accounts:
+        name = gnucash.account_path(data, acc, 3)
         if verbose >= 1:
             out.write(f"== {name} ({acc.commodity.mnemonic}) ==\n")
 
-        aggregate = analyze_account(out, verbose, acc)
-        realized_gain = aggregate.realized_gain
-        shares_value = aggregate.shares_value
-        expenses = aggregate.expenses
-        dividends = aggregate.dividends
-        shares = aggregate.shares
+        if results is None:
+            aggregate = analyze_account(out, verbose, acc, precision)
+        else:
+            text, maybe_aggregate = next(results)
+            out.write(text)
+            if maybe_aggregate is None:
+                sys.exit(1)
+            aggregate = maybe_aggregate
+        realized_gain = to_float(aggregate.realized_gain, precision)
+        shares_value = to_float(aggregate.shares_value, precision)
+        expenses = to_float(aggregate.expenses, precision)
+        dividends = to_float(aggregate.dividends, precision)
+        shares = to_float(aggregate.shares, precision)
 
         if verbose >= 2:
             out.write("\t-------------\n")
-        gexpenses += expenses
-        gdividends += dividends
+        gexpenses += aggregate.expenses
+        gdividends += aggregate.dividends
 
         if shares == 0.0:
             share_price: float = 0.0
             price_date: datetime | None = None
         else:
-            share_price_n, price_date = get_latest_price(acc.commodity)
+            # Prefer prices in the currency the account was last traded in.
+            last_split = max(acc.splits, key=lambda x: x.transaction.post_date)
+            currency = last_split.transaction.currency
+            share_price_n, price_date = get_latest_price(
+                prices, acc.commodity, currency
+            )
             assert share_price_n is not None
             assert price_date is not None
             share_price = share_price_n
@@ -307,17 +503,20 @@ def main() -> None:
                 )
             out.write("\n")
 
-        grealized_gain += realized_gain
+        grealized_gain += aggregate.realized_gain
         gunrealized_gain += unrealized_gain
-    complete_gain = grealized_gain + gunrealized_gain
+    complete_gain = to_float(grealized_gain, precision) + gunrealized_gain
     out.write("-----------\n")
-    out.write(f"{gexpenses:9.2f} Fees and Taxes\n")
-    out.write(f"{gdividends:9.2f} Dividends\n")
-    out.write(f"{grealized_gain:9.2f} gain realized\n")
+    out.write(f"{to_float(gexpenses, precision):9.2f} Fees and Taxes\n")
+    out.write(f"{to_float(gdividends, precision):9.2f} Dividends\n")
+    out.write(f"{to_float(grealized_gain, precision):9.2f} gain realized\n")
     out.write(f"{gunrealized_gain:9.2f} gain unrealized\n")
     out.write("----\n")
     out.write(f"{complete_gain:9.2f} EUR complete gain\n")
 
+    if args.yearly:
+        write_yearly(out, data, precision, args.fiscal_year_start)
+
 
 if __name__ == "__main__":
     main()
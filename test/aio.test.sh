@@ -0,0 +1,4 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/aio.gnucash
+cp Inputs/brokerage.gnucash $BOOK
+./aio_check.py $BOOK
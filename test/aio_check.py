@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Used by aio.test.sh: loads a book through gnucash.aio while another task
+keeps running on the event loop, streams its transactions and prices,
+cancels a long running query and adds prices.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+from sqlite3 import Connection
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gnucash
+from gnucash.aio import (
+    AsyncConnection,
+    aadd_prices,
+    aiter_prices,
+    aiter_transactions,
+    aopen_file,
+    aread_accounts,
+    aread_data,
+)
+
+# Never finishes unless interrupted.
+_ENDLESS = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+    "SELECT count(*) FROM c"
+)
+
+
+def _count(connection: Connection, sql: str) -> int:
+    count: int = connection.execute(sql).fetchone()[0]
+    return count
+
+
+async def _ticker(ticks: list[int]) -> None:
+    while True:
+        ticks.append(1)
+        await asyncio.sleep(0)
+
+
+async def _stream(connection: AsyncConnection) -> None:
+    accounts = await aread_accounts(connection)
+    transactions = 0
+    splits = 0
+    async for trans in aiter_transactions(connection, accounts, chunk_size=4):
+        transactions += 1
+        splits += len(trans.splits)
+    sys.stdout.write(f"streamed {transactions} transactions, {splits} splits\n")
+    async for price in aiter_prices(connection, accounts, chunk_size=4):
+        sys.stdout.write(
+            f"first price {price.commodity.mnemonic} {price.date:%Y-%m-%d}\n"
+        )
+        break
+
+
+async def main() -> None:
+    book = sys.argv[1]
+    ticks: list[int] = []
+    ticker = asyncio.create_task(_ticker(ticks))
+    async with await aopen_file(book, writable=True) as connection:
+        data = await aread_data(connection)
+        sys.stdout.write(
+            f"loaded {len(data.transactions)} transactions, {len(data.prices)} prices\n"
+        )
+        await _stream(connection)
+
+        try:
+            async with asyncio.timeout(0.2):
+                await connection.run(_count, _ENDLESS)
+        except TimeoutError:
+            sys.stdout.write("query timed out\n")
+        sys.stdout.write(
+            f"after timeout: {await connection.run(_count, 'SELECT 42')}\n"
+        )
+
+        usd = next(c for c in data.commodities.values() if c.mnemonic == "USD")
+        aapl = next(c for c in data.commodities.values() if c.mnemonic == "AAPL")
+        new = gnucash.NewPrice(
+            commodity_guid=aapl.guid,
+            currency_guid=usd.guid,
+            date=datetime(2024, 1, 2, tzinfo=UTC),
+            source="user:price",
+            type="last",
+            value_num=18500,
+            value_denom=100,
+        )
+        guids = await aadd_prices(connection, [new])
+        sys.stdout.write(f"added {len(guids)} price\n")
+    ticker.cancel()
+    sys.stdout.write(f"event loop kept running: {len(ticks) > 10}\n")
+    with gnucash.open_file(book) as check:
+        sys.stdout.write(
+            f"prices in book: {_count(check, 'SELECT count(*) FROM prices')}\n"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
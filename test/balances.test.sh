@@ -0,0 +1,2 @@
+export LANG="en_US.UTF-8"
+./balances_check.py Inputs/brokerage.gnucash
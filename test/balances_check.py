@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Used by balances.test.sh: builds a BalanceIndex from a book and prints the
+balances of some accounts and subtrees at a few dates, and the error for a
+book loaded without num/denom amounts.
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gnucash
+from gnucash.amounts import to_float
+from gnucash.balances import Column, build_balance_index
+
+DATES = [
+    datetime(2000, 1, 1, tzinfo=UTC),
+    # Exactly the post date of a transaction, which is included.
+    datetime(2008, 6, 12, 10, 59, tzinfo=UTC),
+    datetime(2010, 1, 1, tzinfo=UTC),
+    datetime(2012, 1, 1, tzinfo=UTC),
+    datetime(2016, 1, 1, tzinfo=UTC),
+]
+
+QUERIES: list[tuple[str, Column, bool]] = [
+    ("Assets:Investments:Brokerage Account", "quantity", False),
+    ("Assets:Investments:Brokerage Account:Stock:AAPL", "quantity", False),
+    ("Assets:Investments:Brokerage Account:Stock:AAPL", "value", False),
+    # Stocks have different commodities: only the values add up.
+    ("Assets:Investments:Brokerage Account:Stock", "value", True),
+    ("Assets:Investments", "value", True),
+    ("Income", "quantity", True),
+    ("Expenses", "quantity", True),
+]
+
+
+def main() -> None:
+    book = sys.argv[1]
+    data = gnucash.read_file(book)
+    index = build_balance_index(data)
+    precision = index.precision
+    sys.stdout.write(
+        f"{'account':<56} {'column':<8} "
+        + " ".join(f"{when:%Y-%m-%d}" for when in DATES)
+        + f" {'all':>10}\n"
+    )
+    for path, column, subtree in QUERIES:
+        account = gnucash.find_account(data, path)
+        assert account is not None
+        balances = index.balances(account, DATES, column, subtree)
+        total = index.balance(account, None, column, subtree)
+        name = f"{path} (subtree)" if subtree else path
+        sys.stdout.write(
+            f"{name:<56} {column:<8} "
+            + " ".join(f"{to_float(b, precision):10.2f}" for b in balances)
+            + f" {to_float(total, precision):10.2f}\n"
+        )
+        # balance() at a date agrees with balances().
+        for when, balance in zip(DATES, balances, strict=True):
+            assert index.balance(account, when, column, subtree) == balance
+
+    floats = gnucash.read_file(book, projection=gnucash.Projection(amounts="float"))
+    try:
+        build_balance_index(floats)
+    except ValueError as e:
+        sys.stdout.write(f"ValueError: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+export LANG="en_US.UTF-8"
+./columnar_check.py Inputs/gen/stuff.gnucash
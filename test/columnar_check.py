@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Used by columnar.test.sh: builds a SplitTable from a book and prints the
+per-account sums, the sums per year and the error for a book loaded without
+num/denom amounts.
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gnucash
+from gnucash.columnar import build_split_table
+
+
+def main() -> None:
+    book = sys.argv[1]
+    data = gnucash.read_file(book)
+    table = build_split_table(data)
+    sys.stdout.write(f"{len(table)} splits\n")
+
+    # Root accounts have an empty path.
+    paths = [
+        gnucash.account_path(data, data.accounts[guid]) or data.accounts[guid].type
+        for guid in table.accounts
+    ]
+    quantities = table.account_sums()
+    values = table.account_sums("value")
+    until = datetime(2012, 1, 1, tzinfo=UTC)
+    before = table.account_sums(until=until)
+    sys.stdout.write(f"{'account':<20} {'quantity':>10} {'value':>10} {'<2012':>10}\n")
+    for i, path in enumerate(paths):
+        sys.stdout.write(
+            f"{path:<20} {quantities[i]:10.2f} {values[i]:10.2f} {before[i]:10.2f}\n"
+        )
+
+    years = [datetime(year, 1, 1, tzinfo=UTC) for year in (2011, 2012, 2013)]
+    periods = table.period_sums(years, "value")
+    sys.stdout.write(f"{'account':<20} {'2011':>10} {'2012':>10}\n")
+    for i, path in enumerate(paths):
+        row = " ".join(f"{amount:10.2f}" for amount in periods[i])
+        sys.stdout.write(f"{path:<20} {row}\n")
+
+    try:
+        table.account_sums("memo")
+    except ValueError as e:
+        sys.stdout.write(f"ValueError: {e}\n")
+    floats = gnucash.read_file(book, projection=gnucash.Projection(amounts="float"))
+    try:
+        build_split_table(floats)
+    except ValueError as e:
+        sys.stdout.write(f"ValueError: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
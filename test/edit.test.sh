@@ -0,0 +1,41 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/edit.gnucash
+cp Inputs/brokerage.gnucash $BOOK
+splits() {
+    sqlite3 $BOOK "SELECT a.name, count(*), total(s.value_num * 1.0 / s.value_denom) FROM splits s JOIN accounts a ON a.guid = s.account_guid WHERE a.name IN ('Commissions', 'Taxes') GROUP BY a.name ORDER BY a.name"
+}
+../edit.py $BOOK accountlist | grep -E "Commissions|Taxes|Microsoft"
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --description 'AAPL$' --min-amount 5 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --start 2009-01-01 --end 2011-01-01 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --max-amount 0 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --memo . 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --counterpart "Assets:Investments:Brokerage Account:Stock:Microsoft" 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --memo . 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions f40db71e150f40d189b8549c7ae70c79 \
+    --description 'AAPL$' --min-amount 5 2>&1
+splits
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes \
+    --counterpart "Assets:Investments:Brokerage Account:Stock:Microsoft" 2>&1
+splits
+../edit.py $BOOK journal | awk '{$2 = $3 = "-"; print}'
+../edit.py $BOOK undo 2>&1
+splits
+../edit.py $BOOK undo 1 2>&1
+splits
+../edit.py $BOOK undo 2>&1
+../edit.py $BOOK journal
+# Amount bounds are inclusive and exact: 1.1 * 100 is not 110 in floats.
+cp Inputs/brokerage.gnucash $BOOK
+sqlite3 $BOOK "UPDATE splits SET value_num = 110 WHERE value_num = -400 AND value_denom = 100"
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes \
+    --min-amount 1.1 --max-amount 1.1 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --min-amount 1.10 --max-amount 1.10 2>&1
+../edit.py $BOOK switchacc Expenses:Commissions Expenses:Taxes --dry-run \
+    --min-amount 1.x 2>&1 | tail -1
@@ -0,0 +1,2 @@
+export LANG="en_US.UTF-8"
+./periodic_check.py Inputs/brokerage.gnucash
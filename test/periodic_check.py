@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Used by periodic.test.sh: prints yearly reports of a book with and without a
+date range, and the buckets of reports over accounts without splits.
+"""
+
+from __future__ import annotations
+
+import sys
+from collections.abc import Collection
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gnucash
+from gnucash.amounts import to_float
+from gnucash.periodic import BucketSpec, periodic_report
+
+START = datetime(2011, 1, 1, tzinfo=UTC)
+END = datetime(2013, 1, 1, tzinfo=UTC)
+
+
+def write_report(
+    data: gnucash.GnuCashData,
+    account_types: Collection[str],
+    start_date: datetime | None,
+    end_date: datetime | None,
+) -> None:
+    report = periodic_report(
+        data,
+        BucketSpec("year"),
+        account_types=account_types,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    types = ",".join(account_types)
+    since = "-" if start_date is None else f"{start_date:%Y-%m-%d}"
+    until = "-" if end_date is None else f"{end_date:%Y-%m-%d}"
+    sys.stdout.write(
+        f"{types} from {since} until {until}: {len(report.buckets)} buckets\n"
+    )
+    if not report.buckets:
+        return
+    sys.stdout.write(
+        f"{'account':<20} "
+        + " ".join(f"{label:>10}" for label in report.labels())
+        + "\n"
+    )
+    for account, row in zip(report.accounts, report.matrix, strict=True):
+        amounts = " ".join(f"{to_float(a, report.precision):10.2f}" for a in row)
+        sys.stdout.write(f"{account.name:<20} {amounts}\n")
+
+
+def main() -> None:
+    data = gnucash.read_file(sys.argv[1])
+    write_report(data, ("INCOME", "EXPENSE"), None, None)
+    write_report(data, ("INCOME", "EXPENSE"), START, END)
+    # The ASSET accounts hold no splits.
+    write_report(data, ("ASSET",), None, None)
+    write_report(data, ("ASSET",), None, END)
+    write_report(data, ("ASSET",), START, END)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for the polygon.io previous-day aggregates endpoint, used by
+quotes.test.sh. Prints the port it listens on. The first request for every
+ticker is answered with a rate limit error to exercise the retry logic.
+Tickers given on the command line have no results.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "/v2/aggs/ticker/"
+SUFFIX = "/prev"
+
+seen: set[str] = set()
+seen_lock = threading.Lock()
+unknown: set[str] = set()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        path = self.path
+        if not path.startswith(PREFIX) or not path.endswith(SUFFIX):
+            self.reply(404, {"status": "NOT_FOUND"})
+            return
+        if self.headers.get("Authorization") != "Bearer " + "0" * 32:
+            self.reply(401, {"status": "ERROR"})
+            return
+        ticker = path[len(PREFIX) : -len(SUFFIX)]
+        with seen_lock:
+            first = ticker not in seen
+            seen.add(ticker)
+        if first:
+            self.reply(
+                429,
+                {
+                    "status": "ERROR",
+                    "error": "You've exceeded the maximum requests per minute",
+                },
+            )
+            return
+        if ticker in unknown:
+            self.reply(200, {"status": "OK", "ticker": ticker})
+            return
+        close = round(sum(map(ord, ticker)) / 3, 2)
+        result = {
+            "c": close,
+            "h": close + 1,
+            "l": close - 1,
+            "o": close,
+            "t": 1738357200000,  # 2025-01-31 21:00 UTC
+        }
+        self.reply(200, {"status": "OK", "ticker": ticker, "results": [result]})
+
+    def reply(self, code: int, body: dict[str, object]) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def main() -> None:
+    unknown.update(sys.argv[1:])
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    sys.stdout.write(f"{server.server_address[1]}\n")
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# Timings vary, only compare the phases and counts.
+../gnucash2ledger.py --profile Inputs/gen/stuff.gnucash 2>&1 >/dev/null \
+    | awk '{print $1, $3, $4}'
@@ -0,0 +1,22 @@
+BOOK=Inputs/gen/quotes.gnucash
+cp Inputs/brokerage.gnucash $BOOK
+sqlite3 $BOOK "UPDATE commodities SET quote_flag=1 WHERE quote_source='yahoo'"
+printf '%032d\n' 0 > Inputs/gen/polygon_key.txt
+mkfifo Inputs/gen/stub_port
+./polygon_stub.py PTTAX > Inputs/gen/stub_port &
+STUB=$!
+read PORT < Inputs/gen/stub_port
+rm Inputs/gen/stub_port
+# A failing symbol does not keep the others from being stored.
+{
+    ../get_quotes.py --key-file Inputs/gen/polygon_key.txt \
+        --base-url "http://127.0.0.1:$PORT" --rate 6000 --backoff 0.01 $BOOK
+    echo "exit code $?"
+} | sort
+kill $STUB
+sqlite3 $BOOK "SELECT c.mnemonic, p.date, p.source, p.type, p.value_num, p.value_denom FROM prices p JOIN commodities c ON c.guid = p.commodity_guid WHERE p.date >= '2025' ORDER BY c.mnemonic"
+# With every price fresh there is nothing to fetch and no key is needed.
+sqlite3 $BOOK "UPDATE prices SET date = datetime('now') WHERE date >= '2025'"
+sqlite3 $BOOK "UPDATE commodities SET quote_flag=0 WHERE mnemonic='PTTAX'"
+../get_quotes.py --key-file Inputs/gen/missing_key.txt $BOOK
+echo "exit code $?"
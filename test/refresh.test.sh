@@ -0,0 +1,16 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/refresh.gnucash
+cp Inputs/gen/stuff.gnucash $BOOK
+./refresh_check.py $BOOK \
+    "UPDATE splits SET memo = 'edited' WHERE guid = 'a52ad22f84761a63f6e23425bf800d87'" \
+    "UPDATE accounts SET parent_guid = 'a6c170dc935630c8fd8249b07e9628ab' WHERE name = 'Taxes'" \
+    "DELETE FROM splits WHERE tx_guid = '3b11058d312816673bf3d75def31d734'" \
+    "DELETE FROM transactions WHERE guid = '3b11058d312816673bf3d75def31d734'" \
+    "INSERT INTO transactions VALUES ('00000000000000000000000000000001', 'a8e71003563f3a753af1fa30628dd5b8', '', '20130101105900', '20130101105900', 'Inserted')" \
+    "INSERT INTO splits VALUES ('00000000000000000000000000000002', '00000000000000000000000000000001', 'faf269b82570de314625c7d6d887c472', '', '', 'n', NULL, 100, 100, 100, 100, NULL)" \
+    "INSERT INTO splits VALUES ('00000000000000000000000000000003', '00000000000000000000000000000001', 'a6c170dc935630c8fd8249b07e9628ab', '', '', 'n', NULL, -100, 100, -100, 100, NULL)"
+# Dates read since the load are compared with the book by their epoch.
+cp Inputs/gen/stuff.gnucash $BOOK
+./refresh_check.py --lazy-dates $BOOK \
+    "UPDATE splits SET memo = 'edited' WHERE guid = 'a52ad22f84761a63f6e23425bf800d87'" \
+    | grep -E "^[a-z]"
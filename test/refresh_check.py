@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Used by refresh.test.sh: loads a book, runs the SQL statements given on the
+command line against it and refreshes the loaded data. Prints the change set
+and whether the refreshed data matches a fresh load of the book, and what
+a second refresh without changes did. With
+--lazy-dates the book is loaded with Projection(lazy_dates=True) and all
+dates are read before the refresh.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gnucash
+from gnucash.refresh import refresh, track_changes
+
+
+def _dump(data: gnucash.GnuCashData) -> list[list[tuple[Any, ...]]]:
+    """Return the contents of `data` independent of list order."""
+    return [
+        sorted(
+            (
+                a.guid,
+                a.name,
+                a.parent and a.parent.guid,
+                sorted(c.guid for c in a.childs),
+            )
+            for a in data.accounts.values()
+        ),
+        sorted(
+            (t.guid, t.description, t.post_date, sorted(s.guid for s in t.splits))
+            for t in data.transactions.values()
+        ),
+        sorted(
+            (s.guid, s.memo, s.value_num, s.value, s.account.guid)
+            for s in data.splits.values()
+        ),
+        sorted(
+            (p.guid, p.date, p.value_num, p.commodity.guid)
+            for p in data.prices.values()
+        ),
+    ]
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    lazy_dates = args[0] == "--lazy-dates"
+    if lazy_dates:
+        del args[0]
+    book = args[0]
+    projection = gnucash.Projection(lazy_dates=lazy_dates)
+    with gnucash.open_file(book, writable=True) as connection:
+        data = gnucash.read_data(connection, projection=projection)
+        if lazy_dates:
+            for trans in data.transactions.values():
+                trans.post_date  # noqa: B018
+            for price in data.prices.values():
+                price.date  # noqa: B018
+        else:
+            track_changes(data, connection)
+        for statement in args[1:]:
+            connection.execute(statement)
+        connection.commit()
+        changes = refresh(data, connection, projection)
+        for table in ("commodities", "accounts", "transactions", "splits", "prices"):
+            table_changes = changes.table(table)
+            for kind in ("inserted", "updated", "deleted"):
+                for guid in sorted(getattr(table_changes, kind)):
+                    sys.stdout.write(f"{table} {kind} {guid}\n")
+        statements: list[str] = []
+        connection.set_trace_callback(statements.append)
+        changes = refresh(data, connection, projection)
+        connection.set_trace_callback(None)
+        sys.stdout.write(
+            f"unchanged book: {len(changes)} changes, {len(statements)} statements\n"
+        )
+        fresh = gnucash.read_data(connection)
+    matches = _dump(data) == _dump(fresh)
+    sys.stdout.write(f"matches fresh load: {matches}\n")
+    for account in data.accounts.values():
+        sys.stdout.write(f"{gnucash.account_path(data, account)}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/server.gnucash
+cp Inputs/brokerage.gnucash $BOOK
+rm -f Inputs/gen/server_url
+mkfifo Inputs/gen/server_url
+../gnucash_server.py --port 0 --interval 0.1 $BOOK > Inputs/gen/server_url &
+SERVER=$!
+read URL < Inputs/gen/server_url
+rm Inputs/gen/server_url
+get() {
+    curl -s -w ' %{http_code}\n' "$URL$1" | sed 's/"loaded_at": "[^"]*"/"loaded_at": "-"/'
+}
+get "/status"
+get "/accounts"
+get "/balance?account=Assets:Investments:Brokerage%20Account&subtree=1"
+get "/balance?account=Assets:Investments:Brokerage%20Account:Stock:AAPL&date=2010-01-01"
+get "/price?commodity=AAPL"
+get "/price?commodity=NASDAQ:AAPL&currency=USD&date=2010-01-01"
+get "/transactions?account=Income:Dividend%20Income&start=2017-01-01&limit=2"
+get "/balance?account=Nope"
+get "/balance?account=Assets&date=yesterday"
+get "/price"
+get "/nope"
+# The book changes on disk: the server reloads it in the background.
+sqlite3 $BOOK "UPDATE transactions SET description = 'Changed' WHERE description = 'Dividends MSFT'"
+for i in $(seq 100); do
+    curl -s "$URL/status" | grep -q '"generation": 2' && break
+    sleep 0.1
+done
+get "/status"
+get "/transactions?account=Income:Dividend%20Income&start=2017-01-01&limit=2"
+kill $SERVER
+# Requests over a Unix socket.
+rm -f Inputs/gen/server_sock
+mkfifo Inputs/gen/server_sock
+../gnucash_server.py --socket Inputs/gen/server.sock $BOOK > Inputs/gen/server_sock &
+SERVER=$!
+read ADDRESS < Inputs/gen/server_sock
+rm Inputs/gen/server_sock
+echo $ADDRESS
+curl -s --unix-socket Inputs/gen/server.sock "http://localhost/balance?account=Expenses:Commissions"
+echo
+kill $SERVER
@@ -0,0 +1,8 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/session.gnucash
+cp Inputs/brokerage.gnucash $BOOK
+./session_check.py $BOOK
+../gnucash2ledger.py $BOOK > Inputs/gen/session.ledger
+grep "^P 2024" Inputs/gen/session.ledger
+grep -A 2 -E "Fee (1|30)$" Inputs/gen/session.ledger
+grep -B 3 reclassified Inputs/gen/session.ledger
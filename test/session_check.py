@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Used by session.test.sh: creates accounts, transactions, splits and prices
+and changes loaded objects through a gnucash.session.Session. Prints what
+was written and whether the data in memory matches a fresh load.
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from refresh_check import _dump
+
+import gnucash
+from gnucash.session import Session
+
+
+def main() -> None:
+    book = sys.argv[1]
+    with gnucash.open_file(book, writable=True) as connection:
+        data = gnucash.read_data(connection)
+        usd = next(c for c in data.commodities.values() if c.mnemonic == "USD")
+        aapl = next(c for c in data.commodities.values() if c.mnemonic == "AAPL")
+        bank = gnucash.find_account(data, "Assets:Investments:Brokerage Account")
+        expenses = gnucash.find_account(data, "Expenses")
+        commissions = gnucash.find_account(data, "Expenses:Commissions")
+        assert bank is not None and expenses is not None and commissions is not None
+
+        # An unbalanced transaction is rejected before anything is written.
+        session = Session(connection, data)
+        trans = session.new_transaction(
+            usd, datetime(2024, 3, 1, 10, 59, tzinfo=UTC), "Unbalanced"
+        )
+        session.new_split(trans, bank, -500, 100)
+        session.new_split(trans, commissions, 400, 100)
+        try:
+            session.flush()
+        except ValueError as e:
+            sys.stdout.write(f"rejected: {str(e).split(' ', 2)[2]}\n")
+        session.discard()
+
+        with Session(connection, data) as session:
+            fees = session.new_account("Bank Fees", expenses, "EXPENSE")
+            for day in range(1, 31):
+                trans = session.new_transaction(
+                    usd,
+                    datetime(2024, 4, day, 10, 59, tzinfo=UTC),
+                    f"Fee {day}",
+                )
+                session.new_split(trans, bank, -day * 10, 100)
+                session.new_split(trans, fees, day * 10, 100, memo="monthly")
+            session.new_price(aapl, usd, datetime(2024, 4, 30, tzinfo=UTC), 17000, 100)
+            # Move the commission of the first loaded transaction to the new
+            # account and rename an existing account.
+            first = min(commissions.splits, key=lambda s: s.transaction.post_date)
+            session.update(first, account=fees, memo="reclassified")
+            session.update(commissions, name="Broker Commissions")
+            sys.stdout.write(f"before flush: {len(data.transactions)} transactions\n")
+        sys.stdout.write(f"after flush: {len(data.transactions)} transactions\n")
+        sys.stdout.write(
+            f"{gnucash.account_path(data, fees)}: {len(fees.splits)} splits, "
+            f"{sum(s.value for s in fees.splits):.2f}\n"
+        )
+        sys.stdout.write(f"{gnucash.account_path(data, commissions)}\n")
+        sys.stdout.write(f"AAPL prices: {len(aapl.prices)}\n")
+        sys.stdout.write(f"changes: {connection.total_changes}\n")
+        fresh = gnucash.read_data(connection)
+    sys.stdout.write(f"matches fresh load: {_dump(data) == _dump(fresh)}\n")
+
+
+if __name__ == "__main__":
+    main()
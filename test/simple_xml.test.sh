@@ -0,0 +1,2 @@
+gzip -c Inputs/simple.xml > Inputs/gen/simple_xml.gnucash
+../gnucash2ledger.py Inputs/gen/simple_xml.gnucash
@@ -0,0 +1,34 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/snapshot.gnucash
+cp Inputs/gen/stuff.gnucash $BOOK
+rm -f $BOOK.snapshot
+# The first run builds the snapshot, the second one only loads it.
+../gnucash2ledger.py --snapshot --profile $BOOK 2>&1 >$BOOK.first | awk '{print $1, $3}'
+../gnucash2ledger.py --snapshot --profile $BOOK 2>&1 >$BOOK.second | awk '{print $1, $3}'
+cmp $BOOK.first $BOOK.second && echo "same output"
+# A changed book invalidates the snapshot.
+sqlite3 $BOOK "UPDATE transactions SET description = 'Changed'"
+../gnucash2ledger.py --snapshot --profile $BOOK 2>&1 >$BOOK.third | awk '{print $1}'
+grep -c Changed $BOOK.third
+# The snapshot is only as readable as the book.
+chmod 600 $BOOK
+rm -f $BOOK.snapshot
+../gnucash2ledger.py --snapshot $BOOK >/dev/null
+stat -c %a $BOOK.snapshot
+# Filtered loads of a book without snapshot read from SQL and build none.
+rm -f $BOOK.snapshot
+../stockreport.py --snapshot --profile $BOOK 2>&1 >/dev/null | awk '{print $1}'
+test -e $BOOK.snapshot || echo "no snapshot"
+# Damaged snapshots are rebuilt.
+../gnucash2ledger.py --snapshot $BOOK > $BOOK.third
+head -c 40 $BOOK.snapshot > $BOOK.truncated
+for damage in garbage header truncated; do
+    case $damage in
+    garbage) echo "not a snapshot" > $BOOK.snapshot ;;
+    header) printf 'PYGCSNAP\004\000\000\000{bad' > $BOOK.snapshot ;;
+    truncated) cp $BOOK.truncated $BOOK.snapshot ;;
+    esac
+    ../gnucash2ledger.py --snapshot $BOOK | cmp - $BOOK.third && echo "$damage: same output"
+    head -c 8 $BOOK.snapshot
+    echo
+done
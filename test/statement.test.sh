@@ -0,0 +1,21 @@
+export LANG="en_US.UTF-8"
+BOOK=Inputs/gen/statement.gnucash
+ACCOUNT="Assets:Investments:Brokerage Account"
+cp Inputs/brokerage.gnucash $BOOK
+# Split GUIDs of imported transactions are random.
+run_import() {
+    ../import_statement.py $BOOK "$ACCOUNT" "$@" 2>&1 | sed -E 's/split [0-9a-f]{32}/split -/'
+}
+run_import Inputs/statement.csv -v --dry-run
+run_import Inputs/statement.csv -v
+# Importing the same statement again adds nothing.
+run_import Inputs/statement.csv
+# Lines also in the CSV statement posted a day apart match as well.
+run_import Inputs/statement.ofx -v --offset Expenses:Commissions
+run_import Inputs/statement.ofx
+# Accounts are given by path or GUID; the offset account must have the
+# commodity of the account.
+run_import Inputs/statement.ofx --offset 442d25cfdd5631e74514ac90734c6e12
+run_import Inputs/statement.ofx --offset "$ACCOUNT:Stock:AAPL"
+run_import Inputs/statement.ofx --offset Nope
+../gnucash2ledger.py $BOOK | grep -A 2 -E "^2024/"
@@ -0,0 +1 @@
+../stockreport.py --compact -v Inputs/brokerage.gnucash
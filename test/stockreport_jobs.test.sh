@@ -0,0 +1 @@
+../stockreport.py -vv --jobs 2 Inputs/brokerage.gnucash
@@ -0,0 +1 @@
+../stockreport.py --yearly --fiscal-year-start 7 Inputs/brokerage.gnucash
@@ -0,0 +1,2 @@
+export LANG="en_US.UTF-8"
+../gnucash2ledger.py --compact Inputs/gen/stuff.gnucash